@@ -0,0 +1,65 @@
+"""Compare log polling with log following on a synthetic log.
+
+The polling strategy mirrors the former `Compose.log_stream`: the whole log is re-read on every iteration and new
+lines are detected via a list scan. The following strategy reads the log once via `LogFollower`.
+
+Usage: python benchmarks/log_stream.py [--lines 100000] [--polls 5]
+"""
+import argparse
+import pathlib
+import subprocess
+import tempfile
+import time
+from typing import List
+
+from wafp.logs import LogFollower
+
+READY_LINE = b"web_1  | Application is ready"
+
+
+def generate(path: pathlib.Path, lines: int) -> None:
+    with path.open("wb") as fd:
+        for idx in range(lines):
+            fd.write(f"web_1  | 2021-01-01T00:00:00.{idx:09d}Z GET /api/items/{idx} 200\n".encode())
+        fd.write(READY_LINE + b"\n")
+
+
+def poll(path: pathlib.Path, polls: int) -> int:
+    streamed: List[bytes] = []
+    for _ in range(polls):
+        output = subprocess.run(["cat", str(path)], stdout=subprocess.PIPE, check=True).stdout
+        for line in output.splitlines():
+            if line not in streamed:
+                streamed.append(line)
+    return len(streamed)
+
+
+def follow(path: pathlib.Path) -> int:
+    count = 0
+    for line in LogFollower(["cat", str(path)]).follow(deadline=time.time() + 600):
+        count += 1
+        if line == READY_LINE:
+            break
+    return count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=100_000)
+    parser.add_argument("--polls", type=int, default=5, help="How many times the log is re-read by polling")
+    parser.add_argument("--skip-polling", action="store_true", help="Polling is quadratic and may take minutes")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        path = pathlib.Path(directory) / "target.log"
+        generate(path, args.lines)
+        start = time.perf_counter()
+        count = follow(path)
+        print(f"follow: {count} lines in {time.perf_counter() - start:.3f}s")
+        if not args.skip_polling:
+            start = time.perf_counter()
+            count = poll(path, args.polls)
+            print(f"poll:   {count} lines in {time.perf_counter() - start:.3f}s ({args.polls} polls)")
+
+
+if __name__ == "__main__":
+    main()
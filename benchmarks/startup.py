@@ -0,0 +1,55 @@
+"""Measure the startup cost of a WAFP worker process.
+
+Every campaign cell is executed by a new `python -m wafp` process, so its fixed startup cost is paid for every run.
+
+Usage: python benchmarks/startup.py [--repeat 10]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List
+
+from wafp.docker import ensure_docker_version
+
+CLI_ARGS = "['schemathesis:Default', 'httpbin', '--output-dir=artifacts']"
+PARSE_ARGS = f"from wafp.__main__ import CliArguments; CliArguments.from_all_args({CLI_ARGS})"
+SCENARIOS = {
+    "interpreter": "pass",
+    "import": "import wafp.__main__",
+    # Without the index, all fuzzer & target packages are imported to build the list of choices
+    "CLI arguments (no index)": "from wafp.loader import INDEX_FILENAME; from wafp.utils import get_cache_dir; "
+    f"(get_cache_dir() / INDEX_FILENAME).unlink(missing_ok=True); {PARSE_ARGS}",
+    "CLI arguments (index)": PARSE_ARGS,
+    "version check (uncached)": "from wafp.docker import ensure_docker_version; ensure_docker_version(cached=False)",
+    "version check (cached)": "from wafp.docker import ensure_docker_version; ensure_docker_version()",
+}
+
+
+def measure(func: Callable[[], None], repeat: int) -> List[float]:
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def run_scenarios(scenarios: Dict[str, str], repeat: int) -> None:
+    for name, code in scenarios.items():
+        durations = measure(lambda: subprocess.run([sys.executable, "-c", code], check=True), repeat)
+        print(f"{name:<28} median {statistics.median(durations) * 1000:8.1f}ms  max {max(durations) * 1000:8.1f}ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    # Populate the on-disk cache
+    ensure_docker_version()
+    run_scenarios(SCENARIOS, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,31 @@
 import argparse
 import os
 import pathlib
-from typing import Generator, Optional, Tuple
+import socket
+from typing import Dict, Generator, Iterable, List, Optional, Tuple
 
+import attr
 import structlog
 from dotenv import load_dotenv
 
-from wafp.__main__ import main as run
+from wafp.campaign import (
+    Cell,
+    CellQueue,
+    History,
+    Journal,
+    Resources,
+    Scheduler,
+    Shard,
+    get_group,
+    get_startup_costs,
+    prebuild,
+)
+from wafp.campaign.harvest import DEFAULT_ORGANIZATION, Harvester
+from wafp.docker import ensure_docker_version
 from wafp.fuzzers import loader as fuzzers_loader
+from wafp.targets import Isolation, Language
 from wafp.targets import loader as targets_loader
+from wafp.utils import parse_size
 
 logger = structlog.get_logger()
 load_dotenv()
@@ -153,6 +170,13 @@ def expand_options(options: Generator[str, None, None]) -> list[str]:
     return output
 
 
+def parse_shard(value: str) -> Shard:
+    try:
+        return Shard.parse(value)
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError(str(exc)) from None
+
+
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser()
     parser.add_argument(
@@ -169,27 +193,145 @@ def parse_args() -> argparse.Namespace:
     )
     parser.add_argument("--fuzzer", choices=expand_options(fuzzers_loader.get_all_variants()), help="Fuzzer to run")
     parser.add_argument("--target", choices=expand_options(targets_loader.get_all_variants()), help="Target to run")
+    parser.add_argument(
+        "--language",
+        choices=[language.name.lower() for language in Language],
+        help="Run only targets written in this language",
+    )
+    parser.add_argument(
+        "--jobs",
+        action="store",
+        default=1,
+        type=int,
+        help="Maximum number of runs executed concurrently",
+    )
+    parser.add_argument(
+        "--cpu-budget",
+        action="store",
+        type=float,
+        help="CPUs available to the whole campaign. Defaults to all host CPUs",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        action="store",
+        type=parse_size,
+        help="Memory available to the whole campaign, e.g. `64G`. Defaults to all host memory",
+    )
+    parser.add_argument("--cpus-per-run", action="store", default=1.0, type=float, help="CPUs reserved for a run")
+    parser.add_argument(
+        "--memory-per-run", action="store", default="2G", type=parse_size, help="Memory reserved for a run"
+    )
+    parser.add_argument(
+        "--pin-cpus",
+        action="store_true",
+        default=False,
+        help="Pin every run to its own CPUs from the CPU budget and limit each of its containers to "
+        "`--cpus-per-run` & `--memory-per-run`, so concurrent runs do not interfere with each other",
+    )
+    parser.add_argument(
+        "--warm-runs",
+        action="store",
+        default=1,
+        type=int,
+        help="Run up to this many fuzzers against the same target instance, resetting it in between. "
+        "Applies only to targets that are fully isolated by a reset and are run without Sentry",
+    )
+    parser.add_argument(
+        "--shard",
+        action="store",
+        type=parse_shard,
+        help="Run only the i-th of n parts of the campaign, e.g. `2/4`. "
+        "All hosts should use the same `--history-dir` to get the same partitioning",
+    )
+    parser.add_argument(
+        "--queue",
+        action="store",
+        type=str,
+        help="Path to an SQLite database on shared storage. Workers pull runs from it instead of a fixed shard",
+    )
+    parser.add_argument(
+        "--worker-id",
+        action="store",
+        default=socket.gethostname(),
+        type=str,
+        help="Worker name in the shared queue. Defaults to the host name",
+    )
+    parser.add_argument(
+        "--history-dir",
+        action="store",
+        type=str,
+        help="Directory with artifacts of previous campaigns. Durations of their runs are used to balance the load. "
+        "Defaults to the output directory",
+    )
+    parser.add_argument(
+        "--artifact-store",
+        action="store",
+        type=str,
+        help="Store artifacts compressed & deduplicated in this directory, e.g. `<output-dir>/.blobs`. "
+        "Run directories then contain only `metadata.json` and `manifest.json`",
+    )
+    parser.add_argument(
+        "--pack",
+        action="store_true",
+        default=False,
+        help="Store every run as a single `<run>.zip` archive instead of a directory",
+    )
+    parser.add_argument(
+        "--meter",
+        action="store_true",
+        default=False,
+        help="Record requests of every run with a metering proxy and add throughput & latencies to `metadata.json`",
+    )
+    parser.add_argument(
+        "--resource-interval",
+        action="store",
+        type=float,
+        help="Sample CPU, memory & I/O of containers of every run every N seconds",
+    )
+    parser.add_argument(
+        "--sentry-url",
+        action="store",
+        default=os.getenv("SENTRY_URL"),
+        type=str,
+        help="Sentry instance URL. Events of all runs are collected at the end of the campaign. "
+        "Runs do not query Sentry themselves",
+    )
+    parser.add_argument("--sentry-token", action="store", default=os.getenv("SENTRY_TOKEN"), type=str)
+    parser.add_argument(
+        "--sentry-organization",
+        action="store",
+        default=DEFAULT_ORGANIZATION,
+        type=str,
+        help="The slug of the Sentry organization. Each target reports to a project named after it",
+    )
+    parser.add_argument(
+        "--sentry-harvest-interval",
+        action="store",
+        type=float,
+        help="Also collect Sentry events in the background every N seconds while the campaign is running",
+    )
+    parser.add_argument(
+        "--sentry-sink",
+        action="store_true",
+        default=False,
+        help="Receive Sentry events of targets without a Sentry DSN via a built-in sink in each worker",
+    )
+    parser.add_argument(
+        "--no-prebuild",
+        action="store_true",
+        default=False,
+        help="Do not build all needed images before fuzzing. Workers will build missing images on their own",
+    )
     return parser.parse_args()
 
 
-def run_single(fuzzer: str, target: str, iteration: int, output_dir: pathlib.Path, sentry_dsn: Optional[str]) -> None:
-    final_dir = output_dir / f"{fuzzer}-{target}-{iteration}"
-    if final_dir.exists():
-        print("The output directory exists! Skipping", final_dir)
-        return
-    args = [fuzzer, target, "--build", f"--output-dir={final_dir}"]
-    if sentry_dsn is not None:
-        args.append(f"--sentry-dsn={sentry_dsn}")
-    run(args)
-
-
-def main() -> None:
-    args = parse_args()
-    assert args.iterations >= 0, "The number of iterations should be a positive integer"
-    output_dir = pathlib.Path(args.output_dir).absolute()
+def collect_cells(args: argparse.Namespace) -> List[Cell]:
+    cells = []
     for target, data in COMBINATIONS.items():
         if args.target and not is_match(target, args.target):
             continue
+        if args.language and not is_language(target, args.language):
+            continue
         sentry_dsn = get_sentry_dsn(target)
         for fuzzer in data.get("fuzzers", ()):
             if args.fuzzer and not is_match(fuzzer, args.fuzzer):
@@ -199,7 +341,133 @@ def main() -> None:
             else:
                 logger.warn("Sentry is not installed")
             for iteration in range(1, args.iterations + 1):
-                run_single(fuzzer, target, iteration, output_dir, sentry_dsn)
+                cells.append(Cell(fuzzer=fuzzer, target=target, iteration=iteration, sentry_dsn=sentry_dsn))
+    return cells
+
+
+def main() -> None:
+    args = parse_args()
+    assert args.iterations >= 0, "The number of iterations should be a positive integer"
+    # Workers find the result in the on-disk cache instead of spawning `docker` & `docker-compose` again
+    ensure_docker_version()
+    output_dir = pathlib.Path(args.output_dir).absolute()
+    export_run_options(args)
+    host = Resources.host()
+    journal = Journal.in_directory(output_dir)
+    scheduler = Scheduler(
+        output_dir=output_dir,
+        jobs=args.jobs,
+        budget=Resources(
+            cpus=args.cpu_budget if args.cpu_budget is not None else host.cpus,
+            memory=args.memory_budget if args.memory_budget is not None else host.memory,
+        ),
+        demand=Resources(cpus=args.cpus_per_run, memory=args.memory_per_run),
+        journal=journal,
+        pin_cpus=args.pin_cpus,
+    )
+    harvester = get_harvester(args, output_dir)
+    try:
+        pending, history = collect_pending_cells(args, output_dir, journal)
+        if not args.no_prebuild:
+            prebuild(pending, jobs=args.jobs)
+        scheduler.estimate = history.estimate
+        scheduler.warm_runs = args.warm_runs
+        scheduler.can_reuse = can_reuse
+        if harvester is not None:
+            harvester.start()
+        if args.queue is not None:
+            run_from_queue(scheduler, pathlib.Path(args.queue), args.worker_id, pending, history)
+        else:
+            scheduler.run(history.order(pending))
+        if harvester is not None:
+            # All runs are finished - a single scan for events that were not collected in the background
+            harvester.stop()
+            harvester.harvest()
+    finally:
+        if harvester is not None:
+            harvester.stop()
+        journal.close()
+
+
+def export_run_options(args: argparse.Namespace) -> None:
+    """Pass options to all runs via environment variables, which are inherited by all workers."""
+    if args.artifact_store is not None:
+        os.environ["WAFP_ARTIFACT_STORE"] = str(pathlib.Path(args.artifact_store).absolute())
+    if args.pack:
+        os.environ["WAFP_PACK_RUNS"] = "1"
+    if args.sentry_sink:
+        os.environ["WAFP_SENTRY_SINK"] = "1"
+    if args.meter:
+        os.environ["WAFP_METER"] = "1"
+    if args.resource_interval is not None:
+        os.environ["WAFP_RESOURCE_INTERVAL"] = str(args.resource_interval)
+
+
+def get_harvester(args: argparse.Namespace, output_dir: pathlib.Path) -> Optional[Harvester]:
+    if not (args.sentry_url and args.sentry_token):
+        return None
+    return Harvester(
+        output_dir,
+        url=args.sentry_url,
+        token=args.sentry_token,
+        organization=args.sentry_organization,
+        interval=args.sentry_harvest_interval,
+    )
+
+
+def collect_pending_cells(
+    args: argparse.Namespace, output_dir: pathlib.Path, journal: Journal
+) -> Tuple[List[Cell], History]:
+    """Cells of this host that are not finished yet & the history to estimate their durations."""
+    cells = collect_cells(args)
+    groups = get_target_groups({cell.target for cell in cells})
+    costs = get_startup_costs(cells)
+    history = History.from_directory(pathlib.Path(args.history_dir or output_dir), groups=groups, costs=costs)
+    if args.shard is not None:
+        # Partitioning should not depend on the progress of individual hosts
+        shard_history = history if args.history_dir else History(groups=groups, costs=costs)
+        cells = args.shard.select(cells, shard_history.estimate)
+    pending = journal.filter_pending(cells, output_dir)
+    logger.info("Resume campaign", finished=len(cells) - len(pending), pending=len(pending))
+    return pending, history
+
+
+def can_reuse(cell: Cell) -> bool:
+    """Whether the cell's target can be kept running across fuzzing runs."""
+    # Sentry events are attributed to runs via IDs that are fixed when the target starts
+    if cell.sentry_dsn is not None or os.environ.get("WAFP_SENTRY_SINK"):
+        return False
+    cls = targets_loader.by_name(cell.target)
+    return cls is not None and cls.reset_isolation == Isolation.FULL
+
+
+def is_language(target: str, language: str) -> bool:
+    metadata = targets_loader.get_metadata(target)
+    return metadata is not None and metadata.language.name.lower() == language
+
+
+def get_target_groups(targets: Iterable[str]) -> Dict[str, str]:
+    """Group targets by their metadata to estimate durations of combinations without history."""
+    groups = {}
+    for target in targets:
+        metadata = targets_loader.get_metadata(target)
+        if metadata is not None:
+            groups[target] = get_group(metadata)
+    return groups
+
+
+def run_from_queue(
+    scheduler: Scheduler, path: pathlib.Path, worker_id: str, cells: List[Cell], history: History
+) -> None:
+    queue = CellQueue(path, worker=worker_id)
+    scheduler.queue = queue
+    try:
+        queue.release()
+        queue.populate(cells, history.estimate)
+        # Sentry DSNs are host-specific and are not stored in the queue
+        scheduler.run(attr.evolve(cell, sentry_dsn=get_sentry_dsn(cell.target)) for cell in queue.claim())
+    finally:
+        queue.close()
 
 
 if __name__ == "__main__":
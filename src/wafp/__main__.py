@@ -1,12 +1,22 @@
 import argparse
 import json
+import os
 import pathlib
 import sys
 from dataclasses import dataclass
 from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
 
-from wafp import fuzzers, targets
+import requests
+import yaml
+
+from wafp import archive, build, coverage, engine, fuzzers, monitor, proxy, targets, tracing
+from wafp.base import Component
+from wafp.constants import DOCKER_BACKEND, METADATA_FILENAME
 from wafp.docker import ensure_docker_version
+from wafp.limits import Limits, parse_cpuset
+from wafp.store import ArtifactStore
+from wafp.utils import exit_on_sigterm, parse_size
 
 
 @dataclass
@@ -19,6 +29,13 @@ class CliArguments(targets.cli.SharedCliArguments, fuzzers.cli.SharedCliArgument
     build: bool
     output_dir: str
     fuzzer_skip_ssl_verify: bool
+    artifact_store: Optional[str]
+    pack: bool
+    meter: bool
+    resource_interval: Optional[float]
+    cpuset: Optional[str]
+    cpus: Optional[float]
+    memory: Optional[int]
 
     @classmethod
     def from_all_args(
@@ -53,30 +70,194 @@ class CliArguments(targets.cli.SharedCliArguments, fuzzers.cli.SharedCliArgument
             required=True,
             type=str,
         )
+        parser.add_argument(
+            "--artifact-store",
+            action="store",
+            required=False,
+            type=str,
+            default=os.environ.get("WAFP_ARTIFACT_STORE"),
+            help="Directory of a compressed, deduplicated artifact store shared by multiple runs. "
+            "Artifacts are moved there after the run, and the output directory keeps only a manifest",
+        )
+        parser.add_argument(
+            "--pack",
+            action="store_true",
+            required=False,
+            default=bool(os.environ.get("WAFP_PACK_RUNS")),
+            help="Replace the output directory with a single `<output-dir>.zip` archive after the run",
+        )
+        parser.add_argument(
+            "--meter",
+            action="store_true",
+            required=False,
+            default=bool(os.environ.get("WAFP_METER")),
+            help="Send fuzzer requests through a proxy that records them in `proxy/requests.bin` and adds "
+            "throughput, latency percentiles & statuses to `metadata.json`",
+        )
+        parser.add_argument(
+            "--resource-interval",
+            action="store",
+            required=False,
+            type=float,
+            default=float(os.environ["WAFP_RESOURCE_INTERVAL"]) if os.environ.get("WAFP_RESOURCE_INTERVAL") else None,
+            help="Sample CPU, memory, network & block I/O of the target's and the fuzzer's containers every N seconds. "
+            "Samples are stored in `resources.json`, and their summary in `metadata.json`",
+        )
+        parser.add_argument(
+            "--cpuset",
+            action="store",
+            required=False,
+            type=validate_cpuset,
+            help="Run all containers of the target and the fuzzer only on these CPUs, e.g. `0-3,8`",
+        )
+        parser.add_argument(
+            "--cpus",
+            action="store",
+            required=False,
+            type=float,
+            help="CPU time of the run, e.g. `1.5`. "
+            "It is split evenly between all containers of the target and the fuzzer",
+        )
+        parser.add_argument(
+            "--memory",
+            action="store",
+            required=False,
+            type=parse_size,
+            help="Memory limit of the run, e.g. `2G`. "
+            "It is split evenly between all containers of the target and the fuzzer",
+        )
+
+    def get_limits(self) -> Optional[Limits]:
+        if self.cpuset is None and self.cpus is None and self.memory is None:
+            return None
+        return Limits(cpuset=self.cpuset, cpus=self.cpus, memory=self.memory)
 
     def get_target_kwargs(self) -> Dict[str, Any]:
         kwargs = super().get_target_kwargs()
         kwargs["force_build"] = self.build
+        if self.sentry_sink:
+            kwargs["sentry_sink_dir"] = pathlib.Path(self.output_dir) / "target"
         return kwargs
 
 
+def validate_cpuset(value: str) -> str:
+    try:
+        parse_cpuset(value)
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError(str(exc)) from None
+    return value
+
+
 def main(
     args: Optional[List[str]] = None, *, fuzzers_catalog: Optional[str] = None, targets_catalog: Optional[str] = None
 ) -> int:
+    exit_on_sigterm()
+    tracing.tracer.clear()
     ensure_docker_version()
     cli_args = CliArguments.from_all_args(args, fuzzers_catalog=fuzzers_catalog, targets_catalog=targets_catalog)
     target = cli_args.get_target(catalog=targets_catalog)
     fuzzer = cli_args.get_fuzzer(catalog=fuzzers_catalog)
-    output_dir = pathlib.Path(cli_args.output_dir)
+    apply_limits(cli_args.get_limits(), target, [fuzzer])
     with target.run(cli_args.no_cleanup, extra_env={"WAFP_FUZZER_ID": cli_args.fuzzer}) as context:
+        result = fuzz(cli_args, target, fuzzer, context)
+    if DOCKER_BACKEND == "engine":
+        target.logger.msg("Docker Engine API usage", **engine.get_usage_report())
+    # Finished after the target is stopped, so packed artifacts include Sentry events sent on exit
+    finish_run(cli_args, target, result, context)
+    return result.completed_process.returncode
+
+
+def finish_run(
+    cli_args: CliArguments,
+    target: targets.BaseTarget,
+    result: fuzzers.core.FuzzResult,
+    context: targets.core.TargetContext,
+) -> None:
+    """Store the trace & metadata of a finished run and pack its artifacts."""
+    output_dir = pathlib.Path(cli_args.output_dir)
+    # Stored before packing, so the trace is packed together with other artifacts
+    tracing.tracer.flush(output_dir / tracing.TRACE_FILENAME)
+    if cli_args.artifact_store is not None:
+        ArtifactStore(cli_args.artifact_store).pack(output_dir)
+    store_metadata(
+        output_dir,
+        cli_args.fuzzer,
+        cli_args.target,
+        # Warm runs share the target, but each of them has its own ID
+        cli_args.run_id if cli_args.run_id is not None else target.run_id,
+        result.duration,
+        traffic=result.traffic,
+        resources=result.resources,
+        startup=context.startup,
+    )
+    if cli_args.pack:
+        archive.pack(output_dir)
+
+
+def apply_limits(
+    limits: Optional[Limits], target: targets.BaseTarget, fuzzers_to_run: List[fuzzers.BaseFuzzer]
+) -> None:
+    """Split the CPU time & memory of a run evenly between all containers of the target and the fuzzer.
+
+    The target may serve multiple fuzzers one after another. Then its share is computed for the largest fuzzer.
+    """
+    if limits is None:
+        return
+    containers = count_containers(target) + max(map(count_containers, fuzzers_to_run))
+    target.limits = limits.split(containers)
+    for fuzzer in fuzzers_to_run:
+        fuzzer.limits = target.limits
+
+
+def count_containers(component: Component) -> int:
+    return max(len(build.get_services(component.path, component.get_docker_compose_filename())), 1)
+
+
+def fuzz(
+    cli_args: CliArguments,
+    target: targets.BaseTarget,
+    fuzzer: fuzzers.BaseFuzzer,
+    context: targets.core.TargetContext,
+) -> fuzzers.core.FuzzResult:
+    """Run the fuzzer against a running target and store artifacts of both."""
+    output_dir = pathlib.Path(cli_args.output_dir)
+    meter = None
+    operations = None
+    if cli_args.meter:
+        with tracing.span("coverage.schema"):
+            operations = get_coverage(target, context)
+        meter = proxy.MeteringProxy(
+            context.base_url,
+            output_dir / "proxy" / proxy.LOG_FILENAME,
+            get_template=operations.get_template if operations is not None else proxy.get_template,
+        )
+        meter.start()
+    resources = None
+    if cli_args.resource_interval:
+        resources = monitor.ResourceMonitor(
+            {target.project_name: "target", fuzzer.project_name: "fuzzer"}, interval=cli_args.resource_interval
+        )
+        resources.start()
+    try:
         with fuzzer.run(
             schema=context.schema_location,
-            base_url=context.base_url,
+            base_url=meter.base_url if meter is not None else context.base_url,
             headers=context.headers,
             ssl_insecure=cli_args.fuzzer_skip_ssl_verify or context.fuzzer_skip_ssl_verify,
             build=cli_args.build,
             target=cli_args.target,
         ) as result:
+            if meter is not None:
+                # The fuzzer is finished, all its requests are recorded
+                meter.stop()
+                result.traffic = meter.log.summary()
+                if operations is not None:
+                    operations.store(output_dir / "proxy" / coverage.REPORT_FILENAME)
+                    result.traffic["coverage"] = operations.summary()
+            if resources is not None:
+                resources.stop()
+                resources.store(output_dir / monitor.RESOURCES_FILENAME)
+                result.resources = resources.summary()
             output_dir.mkdir(exist_ok=True, parents=True)
             fuzzer.process_artifacts(result, output_dir / "fuzzer")
             target.process_artifacts(
@@ -87,15 +268,49 @@ def main(
                 sentry_organization=cli_args.sentry_organization,
             )
             result.cleanup()
-    store_metadata(output_dir, cli_args.fuzzer, cli_args.target, target.run_id, result.duration)
-    return result.completed_process.returncode
+    finally:
+        if meter is not None:
+            meter.stop()
+        if resources is not None:
+            resources.stop()
+    return result
+
+
+def get_coverage(target: targets.BaseTarget, context: targets.core.TargetContext) -> Optional[coverage.Coverage]:
+    """Operations of the target's API schema. Requests are counted against them by the metering proxy."""
+    try:
+        return coverage.Coverage.from_location(
+            context.schema_location, headers=context.headers, base_paths=[urlsplit(context.base_url).path]
+        )
+    except (OSError, ValueError, requests.RequestException, yaml.YAMLError) as exc:
+        target.logger.warning("API schema is not available, coverage is not computed", error=str(exc))
+        return None
 
 
-def store_metadata(output_dir: pathlib.Path, fuzzer: str, target: str, run_id: str, duration: float) -> None:
-    data = {"fuzzer": fuzzer, "target": target, "run_id": run_id, "duration": duration}
-    with (output_dir / "metadata.json").open("w") as fd:
+def store_metadata(
+    output_dir: pathlib.Path,
+    fuzzer: str,
+    target: str,
+    run_id: str,
+    duration: float,
+    *,
+    traffic: Optional[Dict[str, Any]] = None,
+    resources: Optional[Dict[str, Any]] = None,
+    startup: Optional[Dict[str, float]] = None,
+) -> None:
+    data: Dict[str, Any] = {"fuzzer": fuzzer, "target": target, "run_id": run_id, "duration": duration}
+    if traffic is not None:
+        # Requests sent by the fuzzer, as recorded by the metering proxy
+        data["traffic"] = traffic
+    if resources is not None:
+        # Usage of the target's and the fuzzer's containers during fuzzing
+        data["resources"] = resources
+    if startup:
+        # Seconds until the target was available & ready after it was started or reset
+        data["startup"] = startup
+    with (output_dir / METADATA_FILENAME).open("w") as fd:
         json.dump(data, fd)
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
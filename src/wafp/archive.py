@@ -0,0 +1,124 @@
+"""Single-file run archives.
+
+A finished run directory can be packed into `<run directory>.zip`. Members are stored without compression, and
+the ZIP central directory at the end of the file works as an index, so individual artifacts are read without
+extracting or scanning the whole archive. The archive is written atomically after `metadata.json`, therefore its
+existence marks the run as finished, the same as `metadata.json` does for plain directories.
+
+Usage: python -m wafp.archive extract IN-DIRECTORY OUT-DIRECTORY
+"""
+import argparse
+import json
+import os
+import pathlib
+import shutil
+import sys
+import zipfile
+from typing import IO, Any, Dict, Generator, List, Optional, Union
+
+import attr
+
+from .constants import METADATA_FILENAME
+
+ARCHIVE_SUFFIX = ".zip"
+
+
+def get_archive_path(run_dir: pathlib.Path) -> pathlib.Path:
+    return run_dir.parent / f"{run_dir.name}{ARCHIVE_SUFFIX}"
+
+
+def is_finished(run_dir: pathlib.Path) -> bool:
+    """Whether the run stored all its artifacts, either as a directory or as an archive."""
+    return (run_dir / METADATA_FILENAME).exists() or get_archive_path(run_dir).exists()
+
+
+def pack(run_dir: pathlib.Path) -> pathlib.Path:
+    """Replace a run directory with an archive."""
+    archive_path = get_archive_path(run_dir)
+    temporary = archive_path.with_name(f".{archive_path.name}.tmp")
+    with zipfile.ZipFile(temporary, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for path in sorted(run_dir.rglob("*")):
+            relative = path.relative_to(run_dir).as_posix()
+            # Metadata is written last, so incomplete archives can not be mistaken for finished runs
+            if path.is_file() and relative != METADATA_FILENAME:
+                archive.write(path, relative)
+        archive.write(run_dir / METADATA_FILENAME, METADATA_FILENAME)
+    os.replace(temporary, archive_path)
+    shutil.rmtree(run_dir)
+    return archive_path
+
+
+def add(archive_path: pathlib.Path, members: Dict[str, bytes]) -> None:
+    """Add files to an existing archive, e.g. Sentry events collected after the run. Existing members are kept."""
+    temporary = archive_path.with_name(f".{archive_path.name}.tmp")
+    # Appending in place could corrupt the whole archive if interrupted, hence the copy
+    shutil.copyfile(archive_path, temporary)
+    with zipfile.ZipFile(temporary, "a", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        existing = set(archive.namelist())
+        for name, data in members.items():
+            if name not in existing:
+                archive.writestr(name, data)
+    os.replace(temporary, archive_path)
+
+
+@attr.s()
+class RunArchive:
+    """Read-only access to a packed run."""
+
+    path: pathlib.Path = attr.ib()
+    _zip: zipfile.ZipFile = attr.ib(init=False, repr=False)
+
+    def __attrs_post_init__(self) -> None:
+        self._zip = zipfile.ZipFile(self.path)
+
+    def __enter__(self) -> "RunArchive":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._zip.close()
+
+    @property
+    def name(self) -> str:
+        """Run name, e.g. `schemathesis:Default-httpbin-1`."""
+        return self.path.name[: -len(ARCHIVE_SUFFIX)]
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        return json.loads(self.read(METADATA_FILENAME))
+
+    def names(self) -> List[str]:
+        return [info.filename for info in self._zip.infolist() if not info.is_dir()]
+
+    def open(self, name: str) -> IO[bytes]:
+        return self._zip.open(name)
+
+    def read(self, name: str) -> bytes:
+        return self._zip.read(name)
+
+    def extract(self, destination: pathlib.Path) -> None:
+        self._zip.extractall(destination)
+
+
+def iter_runs(directory: Union[str, pathlib.Path]) -> Generator[RunArchive, None, None]:
+    """Iterate over all packed runs in a directory. Each archive is closed after it is processed."""
+    for path in sorted(pathlib.Path(directory).glob(f"*{ARCHIVE_SUFFIX}")):
+        with RunArchive(path) as archive:
+            yield archive
+
+
+def main(args: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m wafp.archive")
+    parser.add_argument("command", choices=["extract"])
+    parser.add_argument("in_directory", type=pathlib.Path, help="Directory with run archives")
+    parser.add_argument("out_directory", type=pathlib.Path)
+    parsed = parser.parse_args(args)
+    for archive in iter_runs(parsed.in_directory):
+        archive.extract(parsed.out_directory / archive.name)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
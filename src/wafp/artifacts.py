@@ -2,10 +2,12 @@ import enum
 import json
 import pathlib
 import shutil
-from typing import Any, Dict
+from typing import Any, Dict, Union
 
 import attr
 
+SENTRY_EVENT_FILENAME = "sentry_event_{event_id}.json"
+
 
 class ArtifactType(enum.Enum):
     STDOUT = enum.auto()
@@ -19,7 +21,8 @@ class Artifact:
     type: ArtifactType = attr.ib()
 
     @classmethod
-    def stdout(cls, value: bytes) -> "Artifact":
+    def stdout(cls, value: Union[bytes, pathlib.Path]) -> "Artifact":
+        """Output as bytes or a path to a file with it. Large outputs should be passed as files."""
         return cls(value=value, type=ArtifactType.STDOUT)
 
     @classmethod
@@ -40,6 +43,10 @@ class Artifact:
             self._save_sentry_event(output_dir)
 
     def _save_stdout(self, output_dir: pathlib.Path) -> None:
+        if isinstance(self.value, pathlib.Path):
+            # Copied in chunks - the output is never fully loaded into memory
+            shutil.copyfile(self.value, output_dir / "stdout.txt")
+            return
         with (output_dir / "stdout.txt").open("wb") as fd:
             fd.write(self.value)
 
@@ -52,5 +59,5 @@ class Artifact:
 
     def _save_sentry_event(self, output_dir: pathlib.Path) -> None:
         event_id = self.value["eventID"]
-        with (output_dir / f"sentry_event_{event_id}.json").open("w") as fd:
+        with (output_dir / SENTRY_EVENT_FILENAME.format(event_id=event_id)).open("w") as fd:
             json.dump(self.value, fd)
@@ -3,16 +3,19 @@ import inspect
 import os
 import pathlib
 import subprocess
-import time
-from typing import Any, Callable, Dict, Generator, List, Optional, Tuple, Union
+from typing import IO, Any, Callable, Dict, Generator, List, Optional, Set, Tuple, Union
 
 import attr
 import structlog
 
-from .constants import COMPOSE_PROJECT_NAME_PREFIX, DEFAULT_DOCKER_COMPOSE_FILENAME
-from .docker import compose, docker
+from . import build as image_build
+from . import engine, tracing
+from .constants import COMPOSE_PROJECT_NAME_PREFIX, DEFAULT_DOCKER_COMPOSE_FILENAME, DOCKER_BACKEND
+from .docker import compose, compose_command, docker
+from .limits import Limits
 from .loader import COLLECTION_ATTRIBUTE_NAME
-from .utils import NOT_SET, NotSet, classproperty
+from .logs import LogFollower
+from .utils import NOT_SET, NotSet, classproperty, get_cache_dir
 
 structlog.configure(
     processors=[
@@ -26,6 +29,8 @@ structlog.configure(
 )
 
 logger = structlog.get_logger()
+# `docker-compose logs` pads container names to the longest service name plus this width
+LOG_PREFIX_INDEX_WIDTH = 3
 
 
 class ComponentMeta(abc.ABCMeta):
@@ -56,6 +61,9 @@ class ComponentMeta(abc.ABCMeta):
 
 @attr.s(init=False)
 class Component(metaclass=ComponentMeta):
+    # CPU & memory limits of every container of the component
+    limits: Optional[Limits] = None
+
     def __init__(self, **kwargs: Any) -> None:
         self.kwargs = kwargs
 
@@ -86,7 +94,8 @@ class Component(metaclass=ComponentMeta):
         """Project name for docker-compose."""
         return f"{COMPOSE_PROJECT_NAME_PREFIX}{self.name}"
 
-    def get_docker_compose_filename(self) -> str:
+    @classmethod
+    def get_docker_compose_filename(cls) -> str:
         """Compose file name."""
         return DEFAULT_DOCKER_COMPOSE_FILENAME
 
@@ -101,26 +110,74 @@ class Component(metaclass=ComponentMeta):
     @property
     def compose(self) -> "Compose":
         """Namespace for docker-compose."""
+        if DOCKER_BACKEND == "engine":
+            return EngineCompose(self)
         return Compose(self)
 
+    def get_build_images(self) -> Dict[str, str]:
+        """Content-addressed image names of services that are built from sources. See `wafp.build`."""
+        return image_build.get_images(
+            self.name, self.path, self.get_docker_compose_filename(), self.get_environment_variables()
+        )
+
+    def get_compose_overrides(self) -> List[str]:
+        """Compose files that are merged on top of the main one."""
+        overrides = []
+        images = self.get_build_images()
+        if images:
+            overrides.append(
+                image_build.get_overrides_path(get_cache_dir(), self.path, self.get_docker_compose_filename(), images)
+            )
+        if self.limits is not None:
+            overrides.append(
+                self.limits.get_overrides_path(get_cache_dir(), self.path, self.get_docker_compose_filename())
+            )
+        return overrides
+
+    def is_built(self) -> bool:
+        """Whether images of all services are already built from the current sources."""
+        images = self.get_build_images()
+        if not images:
+            return True
+        try:
+            docker(["image", "inspect", "--format", "{{.Id}}", *images.values()])
+            return True
+        except subprocess.CalledProcessError:
+            return False
+
     def build(self) -> None:
         """Build docker-compose stack."""
         self.logger.msg("Build")
-        self.compose.build()
+        with tracing.span("build", component=self.full_name):
+            self.compose.build()
+
+    def ensure_built(self) -> bool:
+        """Build docker-compose stack unless it is already built from the current sources.
+
+        Returns whether anything was built.
+        """
+        if self.is_built():
+            self.logger.msg("Build is up to date")
+            return False
+        self.build()
+        return True
 
     def stop(self) -> None:
         """Stop docker-compose stack."""
         self.logger.msg("Stop")
-        self.compose.stop()
+        with tracing.span("compose.stop", component=self.full_name):
+            self.compose.stop()
 
     def cleanup(self) -> None:
         """Remove resources."""
         self.logger.msg("Clean up")
-        self.compose.rm()
+        with tracing.span("compose.rm", component=self.full_name):
+            self.compose.rm()
         # There could be other networks, but delete only the one created by default for simplicity (for now)
         network = f"{self.project_name}_default"
         try:
-            docker(["network", "rm", network])
+            with tracing.span("network.remove", component=self.full_name):
+                self.compose.remove_network(network)
         except subprocess.CalledProcessError as exc:
             # Ignore if network does not exist
             if exc.stdout.decode("utf8") in (
@@ -146,6 +203,14 @@ def on_error(message: str) -> Callable:
     return wrapper
 
 
+def _get_values(output: bytes) -> List[str]:
+    """Values printed one per line by `docker-compose`.
+
+    Warnings (e.g. about unset variables) are printed to the same output, but they always contain spaces.
+    """
+    return [line for line in output.decode().splitlines() if line and " " not in line]
+
+
 @attr.s()
 class Compose:
     """Namespace for docker-compose API."""
@@ -157,6 +222,7 @@ class Compose:
             "path": str(self.component.path),
             "project": self.component.project_name,
             "file": self.component.get_docker_compose_filename(),
+            "overrides": self.component.get_compose_overrides(),
         }
 
     @on_error("Failed to execute `docker-compose build`")
@@ -185,7 +251,9 @@ class Compose:
         services: Optional[List[str]] = None,
         timeout: Optional[int] = None,
         build: bool = False,
+        no_start: bool = False,
         extra_env: Optional[Dict[str, str]] = None,
+        overrides: Optional[List[str]] = None,
     ) -> subprocess.CompletedProcess:
         """Build / create / start containers for a docker-compose service."""
         command = [
@@ -194,8 +262,9 @@ class Compose:
             # Besides better isolation, `docker-compose` won't expect user's input if a relevant image was manually
             # removed, e.g. via `docker rmi`
             "--renew-anon-volumes",
-            "-d",
         ]
+        # `docker-compose` does not allow combining these options
+        command.append("--no-start" if no_start else "-d")
         if build:
             command.append("--build")
         if services is not None:
@@ -203,12 +272,37 @@ class Compose:
         env = self.component.get_environment_variables()
         if extra_env is not None:
             env.update(extra_env)
+        kwargs = self._get_common_kwargs()
+        kwargs["overrides"] = [*kwargs["overrides"], *(overrides or ())]
         return compose(
             command,
             timeout=timeout,
             env=env,
-            **self._get_common_kwargs(),
+            **kwargs,
+        )
+
+    @on_error("Failed to start docker-compose")
+    def start(self, *, timeout: Optional[int] = None) -> subprocess.CompletedProcess:
+        """Start existing containers."""
+        return compose(
+            ["start"], timeout=timeout, env=self.component.get_environment_variables(), **self._get_common_kwargs()
+        )
+
+    def services(self) -> List[str]:
+        """Names of all services defined in the compose file."""
+        completed = compose(
+            ["config", "--services"], env=self.component.get_environment_variables(), **self._get_common_kwargs()
         )
+        return _get_values(completed.stdout)
+
+    def containers(self) -> Dict[str, str]:
+        """Map service names to IDs of their existing containers."""
+        containers = {}
+        for service in self.services():
+            ids = _get_values(compose(["ps", "-q", service], **self._get_common_kwargs()).stdout)
+            if ids:
+                containers[service] = ids[0]
+        return containers
 
     def run(
         self,
@@ -217,8 +311,12 @@ class Compose:
         timeout: Optional[int] = None,
         entrypoint: Union[str, NotSet] = NOT_SET,
         volumes: Optional[List[str]] = None,
+        stdout: Optional[IO[bytes]] = None,
     ) -> subprocess.CompletedProcess:
-        """Run a single command on a service."""
+        """Run a single command on a service.
+
+        If `stdout` is passed, the output is written there instead of being kept in memory.
+        """
         command = ["run"]
         if not isinstance(entrypoint, NotSet):
             command.extend(["--entrypoint", entrypoint])
@@ -227,12 +325,15 @@ class Compose:
                 command.extend(["-v", volume])
         command.append(service)
         command.extend(args)
+        kwargs = self._get_common_kwargs()
+        if stdout is not None:
+            kwargs["stdout"] = stdout
         return compose(
             command,
             timeout=timeout,
             check=False,
             env=self.component.get_environment_variables(),
-            **self._get_common_kwargs(),
+            **kwargs,
         )
 
     @on_error("Failed to get docker-compose logs")
@@ -240,23 +341,34 @@ class Compose:
         """Get project's logs available at the moment."""
         return compose(["logs", "--no-color", "--timestamps"], **self._get_common_kwargs())
 
-    def log_stream(self, deadline: float, timeout: float = 0.5) -> Generator[bytes, None, None]:
-        """Yield all available target logs repeatedly.
+    def log_stream(self, deadline: float, seen: Optional[Set[bytes]] = None) -> Generator[bytes, None, None]:
+        """Yield target log lines as they appear until the deadline.
 
-        All logs may not be immediately available after the target becomes available on its URL.
-        Using `-f` is not an option, as it will require setting a timeout and unconditionally waiting for
-        the output - retrying is simpler and more responsive.
+        All logs may not be immediately available after the target becomes available on its URL, therefore they are
+        followed by a single `docker-compose logs -f` process. Lines from multiple services are not ordered,
+        and the follower may be restarted, so every line is yielded only once. Lines in `seen` are skipped.
         """
-        streamed: List[bytes] = []
-        while True:
-            for line in self.logs().stdout.splitlines():
-                # Lines from multiple services are not ordered
-                if line not in streamed:
-                    streamed.append(line)
-                    yield line
-            if time.time() >= deadline:
-                return
-            time.sleep(timeout)
+        common = self._get_common_kwargs()
+        command = compose_command(
+            ["logs", "-f", "--no-color", "--timestamps"],
+            project=common["project"],
+            file=common["file"],
+            overrides=common["overrides"],
+        )
+        streamed = set(seen or ())
+        yield from LogFollower(command, kwargs={"cwd": common["path"]}).follow(deadline, streamed)
+        # The follower might not catch up with everything printed before the deadline
+        for line in self.logs().stdout.splitlines():
+            if line and line not in streamed:
+                streamed.add(line)
+                yield line
+
+    @on_error("Failed to restart docker-compose")
+    def restart(self, *, timeout: Optional[int] = None) -> subprocess.CompletedProcess:
+        """Restart all containers. Containers are not re-created, therefore their data is kept."""
+        return compose(
+            ["restart"], timeout=timeout, env=self.component.get_environment_variables(), **self._get_common_kwargs()
+        )
 
     @on_error("Failed to stop docker-compose")
     def stop(self) -> subprocess.CompletedProcess:
@@ -273,3 +385,88 @@ class Compose:
             ],
             **self._get_common_kwargs(),
         )
+
+    def remove_network(self, name: str) -> None:
+        docker(["network", "rm", name])
+
+
+def get_log_prefix(container: Dict[str, Any], width: int) -> bytes:
+    """Prefix of the container's lines in the `docker-compose logs` output, e.g. `web_1  | `."""
+    name = container["Names"][0].lstrip("/")
+    labels = container["Labels"]
+    service = labels.get(engine.SERVICE_LABEL, "")
+    if name.startswith(f"{labels.get(engine.PROJECT_LABEL)}_{service}"):
+        name = f"{service}_{labels.get(engine.NUMBER_LABEL)}"
+    return f"{name.ljust(width)} | ".encode()
+
+
+def _completed(command: str, stdout: bytes = b"") -> subprocess.CompletedProcess:
+    return subprocess.CompletedProcess(["docker-compose", command], 0, stdout=stdout)
+
+
+class EngineCompose(Compose):
+    """Operations on existing containers go through the Docker Engine API instead of `docker-compose` processes.
+
+    Parsing compose files, building images and creating containers is still done by `docker-compose`.
+    """
+
+    @property
+    def client(self) -> engine.EngineClient:
+        client = engine.get_client()
+        client.operations += 1
+        return client
+
+    def _containers(self, client: engine.EngineClient, service: Optional[str] = None) -> List[Dict[str, Any]]:
+        containers = client.containers(self.component.project_name, service)
+        return sorted(containers, key=lambda c: (c["Labels"].get(engine.SERVICE_LABEL, ""), c["Names"][0]))
+
+    def containers(self) -> Dict[str, str]:
+        containers: Dict[str, str] = {}
+        for container in self._containers(self.client):
+            containers.setdefault(container["Labels"][engine.SERVICE_LABEL], container["Id"])
+        return containers
+
+    @on_error("Failed to start docker-compose")
+    def start(self, *, timeout: Optional[int] = None) -> subprocess.CompletedProcess:
+        client = self.client
+        for container in self._containers(client):
+            client.start(container["Id"])
+        return _completed("start")
+
+    @on_error("Failed to get docker-compose logs")
+    def logs(self) -> subprocess.CompletedProcess:
+        # The output is identical to `docker-compose logs`, as lines are matched against the ones followed by
+        # `log_stream`, which is not overridden
+        client = self.client
+        services = image_build.get_services(self.component.path, self.component.get_docker_compose_filename())
+        width = max(map(len, services), default=0) + LOG_PREFIX_INDEX_WIDTH
+        output = []
+        for container in self._containers(client):
+            prefix = get_log_prefix(container, width)
+            for line in client.logs(container["Id"]).splitlines():
+                output.append(prefix + line)
+        return _completed("logs", b"\n".join(output))
+
+    @on_error("Failed to restart docker-compose")
+    def restart(self, *, timeout: Optional[int] = None) -> subprocess.CompletedProcess:
+        client = self.client
+        for container in self._containers(client):
+            client.restart(container["Id"])
+        return _completed("restart")
+
+    @on_error("Failed to stop docker-compose")
+    def stop(self) -> subprocess.CompletedProcess:
+        client = self.client
+        for container in self._containers(client):
+            client.stop(container["Id"])
+        return _completed("stop")
+
+    @on_error("Failed to remove stopped containers")
+    def rm(self) -> subprocess.CompletedProcess:
+        client = self.client
+        for container in self._containers(client):
+            client.remove(container["Id"])
+        return _completed("rm")
+
+    def remove_network(self, name: str) -> None:
+        self.client.remove_network(name)
@@ -0,0 +1,142 @@
+"""Content-addressed images for services that are built from sources.
+
+Every service with a `build` section gets an image tag derived from the content of its build context, the compose file,
+and the resolved build arguments. Therefore, `docker-compose` builds an image only if its sources have changed,
+and images are shared by all compose projects, e.g. concurrent campaign workers.
+"""
+import hashlib
+import json
+import os
+import pathlib
+import re
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, Mapping, Tuple
+
+import yaml
+
+IMAGE_PREFIX = "wafp-build"
+OVERRIDES_DIRECTORY = "builds"
+IGNORED_PARTS = {"__pycache__"}
+VARIABLE_RE = re.compile(r"\$(?:\{(?P<braced>\w+)(?:(?P<colon>:?)-(?P<default>[^}]*))?\}|(?P<named>\w+))")
+
+
+def get_context_hash(path: pathlib.Path, compose_file: str) -> str:
+    """Hash of all files in the target directory.
+
+    It contains the compose file and the build context of local images. Remote build contexts are pinned in the
+    compose file itself.
+    """
+    digest = hashlib.sha256(compose_file.encode())
+    for item in sorted(path.rglob("*")):
+        relative = item.relative_to(path)
+        if not item.is_file() or IGNORED_PARTS.intersection(relative.parts) or item.suffix == ".pyc":
+            continue
+        digest.update(b"\0" + relative.as_posix().encode() + b"\0")
+        digest.update(item.read_bytes())
+    return digest.hexdigest()
+
+
+def get_compose_version(path: pathlib.Path) -> str:
+    """Override files should have the same version as the main compose file."""
+    match = re.search(r"^version:\s*['\"]?([\d.]+)", path.read_text(), re.MULTILINE)
+    if match is None:
+        return "3"
+    return match.group(1)
+
+
+def interpolate(value: str, env: Mapping[str, str]) -> str:
+    """Substitute environment variables the same way `docker-compose` does in the compose file."""
+
+    def replace(match: "re.Match[str]") -> str:
+        name = match.group("braced") or match.group("named")
+        default = match.group("default")
+        # `${VAR:-default}` is used if VAR is unset or empty, `${VAR-default}` only if VAR is unset
+        if default is not None and (name not in env or (match.group("colon") and not env[name])):
+            return default
+        return env.get(name, "")
+
+    return VARIABLE_RE.sub(replace, value)
+
+
+def normalize_build(build: Any, env: Mapping[str, str]) -> Dict[str, Any]:
+    if isinstance(build, str):
+        build = {"context": build}
+    args = build.get("args") or {}
+    if isinstance(args, list):
+        args = dict((item.split("=", 1) + [""])[:2] for item in args)
+    return {
+        "context": interpolate(build.get("context", "."), env),
+        "dockerfile": interpolate(build.get("dockerfile", "Dockerfile"), env),
+        "target": build.get("target"),
+        "args": {key: interpolate(str(value), env) for key, value in sorted(args.items())},
+    }
+
+
+def is_remote(context: str) -> bool:
+    return "://" in context or context.startswith("git@")
+
+
+@lru_cache()
+def _get_images(
+    name: str, path: pathlib.Path, compose_file: str, env: FrozenSet[Tuple[str, str]]
+) -> Tuple[Tuple[str, str], ...]:
+    definition = yaml.safe_load((path / compose_file).read_text()) or {}
+    images = []
+    for service, config in sorted((definition.get("services") or {}).items()):
+        if not config or "build" not in config:
+            continue
+        build = normalize_build(config["build"], dict(env))
+        digest = hashlib.sha256(json.dumps(build, sort_keys=True).encode())
+        if not is_remote(build["context"]):
+            context = (path / build["context"]).resolve()
+            digest.update(get_context_hash(context, compose_file).encode())
+        images.append((service, f"{IMAGE_PREFIX}/{name}-{service}:{digest.hexdigest()[:16]}"))
+    return tuple(images)
+
+
+@lru_cache()
+def get_services(path: pathlib.Path, compose_file: str) -> Tuple[str, ...]:
+    """Names of all services defined in the compose file."""
+    definition = yaml.safe_load((path / compose_file).read_text()) or {}
+    return tuple(definition.get("services") or ())
+
+
+def get_images(name: str, path: pathlib.Path, compose_file: str, env: Mapping[str, str]) -> Dict[str, str]:
+    """Content-addressed image names for all services that are built from sources."""
+    return dict(_get_images(name, path, compose_file, frozenset(env.items())))
+
+
+def get_service_images(name: str, path: pathlib.Path, compose_file: str, env: Mapping[str, str]) -> Dict[str, str]:
+    """Image names of all services - content-addressed ones for built services and resolved `image` for the rest."""
+    definition = yaml.safe_load((path / compose_file).read_text()) or {}
+    images = {
+        service: interpolate(str(config["image"]), env)
+        for service, config in (definition.get("services") or {}).items()
+        if config and "image" in config
+    }
+    images.update(get_images(name, path, compose_file, env))
+    return images
+
+
+def get_overrides_path(cache_dir: pathlib.Path, path: pathlib.Path, compose_file: str, images: Dict[str, str]) -> str:
+    """Compose file that sets image names for built services. It is stored once per unique set of images."""
+    override = {
+        "version": get_compose_version(path / compose_file),
+        "services": {service: {"image": image} for service, image in images.items()},
+    }
+    return store_overrides(cache_dir, override)
+
+
+def store_overrides(cache_dir: pathlib.Path, override: Dict[str, Any]) -> str:
+    """Store a compose override file named by its content & return its path."""
+    content = json.dumps(override, sort_keys=True)
+    key = hashlib.sha256(content.encode()).hexdigest()[:16]
+    target = cache_dir / OVERRIDES_DIRECTORY / f"{key}.yml"
+    if not target.exists():
+        target.parent.mkdir(parents=True, exist_ok=True)
+        temporary = target.with_suffix(f".{os.getpid()}.tmp")
+        # JSON is valid YAML
+        temporary.write_text(content)
+        # Concurrent workers may write the same file. Replacing is atomic
+        os.replace(temporary, target)
+    return str(target)
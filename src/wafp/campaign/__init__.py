@@ -0,0 +1,5 @@
+from .core import Cell, CellResult, CpuPool, Resources, Scheduler
+from .history import History, get_group, get_startup_costs
+from .journal import CellState, Journal
+from .prebuild import prebuild
+from .sharding import CellQueue, Shard
@@ -0,0 +1,468 @@
+import math
+import os
+import pathlib
+import shutil
+import subprocess
+import sys
+import time
+import uuid
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Set, Sized
+
+import attr
+import structlog
+
+from ..archive import get_archive_path, is_finished
+from ..constants import CAMPAIGN_DIRECTORY_NAME
+from ..limits import Limits, format_cpuset
+from ..targets.network import release_port, reserve_port
+
+if TYPE_CHECKING:
+    from .journal import Journal
+    from .sharding import CellQueue
+
+logger = structlog.get_logger()
+
+# How often the scheduler checks running cells, in seconds
+POLL_INTERVAL = 1.0
+DEFAULT_CELL_CPUS = 1.0
+DEFAULT_CELL_MEMORY = 2 * 1024**3
+
+
+@attr.s(slots=True, frozen=True)
+class Cell:
+    """A single fuzzer run against a target within a campaign."""
+
+    fuzzer: str = attr.ib()
+    target: str = attr.ib()
+    iteration: int = attr.ib()
+    sentry_dsn: Optional[str] = attr.ib(default=None, eq=False)
+
+    @property
+    def key(self) -> str:
+        """Unique cell identifier that is also the name of its output directory."""
+        return f"{self.fuzzer}-{self.target}-{self.iteration}"
+
+    def get_args(
+        self,
+        output_dir: pathlib.Path,
+        port: Optional[int] = None,
+        limits: Optional[Limits] = None,
+        run_id: Optional[str] = None,
+    ) -> List[str]:
+        """Arguments for the `wafp` CLI."""
+        # Images are not built unconditionally - they are tagged by the content of their sources. See `wafp.build`
+        args = [self.fuzzer, self.target, f"--output-dir={output_dir / self.key}"]
+        if port is not None:
+            args.append(f"--port={port}")
+        if run_id is not None:
+            args.append(f"--run-id={run_id}")
+        if self.sentry_dsn is not None:
+            args.append(f"--sentry-dsn={self.sentry_dsn}")
+        if limits is not None:
+            args.extend(limits.to_args())
+        return args
+
+    def generate_run_id(self) -> str:
+        """Run ID that is unique even for iterations of the same cell started at the same time on multiple hosts.
+
+        Sentry events are attributed to runs only by this ID.
+        """
+        return f"{self.key}-{uuid.uuid4().hex}"
+
+
+# Expected cell duration in seconds
+Estimate = Callable[[Cell], float]
+
+
+@attr.s(slots=True, frozen=True)
+class Resources:
+    """CPU & memory amount - either available to the whole campaign or required by a single cell."""
+
+    cpus: float = attr.ib()
+    # In bytes
+    memory: int = attr.ib()
+
+    @classmethod
+    def host(cls) -> "Resources":
+        """All resources of the current machine."""
+        memory = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+        return cls(cpus=float(os.cpu_count() or 1), memory=memory)
+
+    def __add__(self, other: "Resources") -> "Resources":
+        return Resources(cpus=self.cpus + other.cpus, memory=self.memory + other.memory)
+
+    def __sub__(self, other: "Resources") -> "Resources":
+        return Resources(cpus=self.cpus - other.cpus, memory=self.memory - other.memory)
+
+    def fits(self, other: "Resources") -> bool:
+        """Whether `other` can be allocated from these resources."""
+        return other.cpus <= self.cpus and other.memory <= self.memory
+
+    def capacity(self, demand: "Resources") -> int:
+        """How many times `demand` can be allocated from these resources."""
+        counts = []
+        if demand.cpus > 0:
+            counts.append(int(self.cpus // demand.cpus))
+        if demand.memory > 0:
+            counts.append(self.memory // demand.memory)
+        return min(counts, default=sys.maxsize)
+
+
+def sort_cpus(cpus: Iterable[int]) -> List[int]:
+    return sorted(cpus)
+
+
+@attr.s()
+class CpuPool:
+    """CPUs that are not used by running cells.
+
+    Every cell gets CPUs of its own, so concurrent cells do not compete for them.
+    """
+
+    cpus: List[int] = attr.ib(converter=sort_cpus)
+    _free: Set[int] = attr.ib(init=False)
+
+    def __attrs_post_init__(self) -> None:
+        self._free = set(self.cpus)
+
+    @classmethod
+    def host(cls, count: Optional[int] = None) -> "CpuPool":
+        """The first `count` CPUs the current process may run on."""
+        if hasattr(os, "sched_getaffinity"):
+            cpus = sorted(os.sched_getaffinity(0))
+        else:
+            cpus = list(range(os.cpu_count() or 1))
+        return cls(cpus[:count])
+
+    @property
+    def available(self) -> int:
+        return len(self._free)
+
+    def acquire(self, count: int) -> List[int]:
+        """Take `count` free CPUs.
+
+        The smallest range of adjacent free CPUs that fits is preferred, so larger ranges remain for other cells.
+        """
+        if count > len(self._free):
+            raise ValueError(f"Requested {count} CPUs, but only {len(self._free)} are available")
+        ranges: List[List[int]] = []
+        for cpu in sorted(self._free):
+            if ranges and ranges[-1][-1] == cpu - 1:
+                ranges[-1].append(cpu)
+            else:
+                ranges.append([cpu])
+        fitting = [item for item in ranges if len(item) >= count]
+        if fitting:
+            cpus = min(fitting, key=len)[:count]
+        else:
+            cpus = sorted(self._free)[:count]
+        self._free.difference_update(cpus)
+        return cpus
+
+    def release(self, cpus: List[int]) -> None:
+        self._free.update(cpus)
+
+
+@attr.s()
+class RunningBatch:
+    """Cells executed by the same worker process one after another."""
+
+    cells: List[Cell] = attr.ib()
+    process: subprocess.Popen = attr.ib()
+    port: int = attr.ib()
+    started_at: float = attr.ib()
+    # Pinned CPUs
+    cpus: List[int] = attr.ib(factory=list)
+
+    @property
+    def name(self) -> str:
+        return self.cells[0].key
+
+
+@attr.s()
+class CellResult:
+    cell: Cell = attr.ib()
+    returncode: int = attr.ib()
+    # Wall-clock time in seconds, including target startup & artifacts processing
+    duration: float = attr.ib()
+    # Whether the run stored all its artifacts. Fuzzers may exit with non-zero codes when they find failures
+    completed: bool = attr.ib()
+
+
+@attr.s()
+class Scheduler:
+    """Run campaign cells concurrently, each in a separate worker process.
+
+    Every cell gets its own compose project name and target port, therefore concurrent cells do not clash.
+    A cell is started only when the campaign budget has enough resources for it.
+
+    With `warm_runs` > 1, up to that many cells for the same target are executed by a single worker that starts
+    the target once and resets it between cells. It applies only to cells accepted by `can_reuse`.
+
+    With `pin_cpus`, every worker gets a disjoint set of CPUs from the budget, and all containers it starts are pinned
+    to them and limited to the CPU time & memory of `demand`. Then concurrent cells do not interfere with each other.
+    """
+
+    output_dir: pathlib.Path = attr.ib()
+    jobs: int = attr.ib(default=1)
+    budget: Resources = attr.ib(factory=Resources.host)
+    demand: Resources = attr.ib(factory=lambda: Resources(cpus=DEFAULT_CELL_CPUS, memory=DEFAULT_CELL_MEMORY))
+    poll_interval: float = attr.ib(default=POLL_INTERVAL)
+    journal: Optional["Journal"] = attr.ib(default=None)
+    queue: Optional["CellQueue"] = attr.ib(default=None)
+    estimate: Optional[Estimate] = attr.ib(default=None)
+    warm_runs: int = attr.ib(default=1)
+    can_reuse: Callable[[Cell], bool] = attr.ib(default=lambda cell: False)
+    pin_cpus: bool = attr.ib(default=False)
+    _cpus: Optional[CpuPool] = attr.ib(default=None, init=False)
+    _running: Dict[int, RunningBatch] = attr.ib(factory=dict, init=False)
+    _results: List[CellResult] = attr.ib(factory=list, init=False)
+    _started_at: float = attr.ib(default=0.0, init=False)
+    # Estimated duration of cells that are not started yet. Unknown if cells are pulled from a queue
+    _pending_work: Optional[float] = attr.ib(default=None, init=False)
+    # Estimated & actual durations of finished cells. Their ratio corrects estimates during the campaign
+    _estimated_work: float = attr.ib(default=0.0, init=False)
+    _actual_work: float = attr.ib(default=0.0, init=False)
+
+    def __attrs_post_init__(self) -> None:
+        if self.jobs < 1:
+            raise ValueError("The number of jobs should be a positive integer")
+        if not self.budget.fits(self.demand):
+            raise ValueError(f"A single cell requires {self.demand}, but the campaign budget is {self.budget}")
+        if self.pin_cpus:
+            self._cpus = CpuPool.host(int(self.budget.cpus))
+            if len(self._cpus.cpus) < self.cpus_per_cell:
+                raise ValueError(
+                    f"A single cell requires {self.cpus_per_cell} CPUs, but only {len(self._cpus.cpus)} can be pinned"
+                )
+
+    @property
+    def logs_dir(self) -> pathlib.Path:
+        return self.output_dir / CAMPAIGN_DIRECTORY_NAME / "logs"
+
+    @property
+    def allocated(self) -> Resources:
+        resources = Resources(cpus=0, memory=0)
+        for _ in self._running:
+            resources += self.demand
+        return resources
+
+    @property
+    def cpus_per_cell(self) -> int:
+        """Number of CPUs pinned to a single cell."""
+        return max(math.ceil(self.demand.cpus), 1)
+
+    @property
+    def slots(self) -> int:
+        """The maximum number of concurrently running cells."""
+        slots = min(self.jobs, self.budget.capacity(self.demand))
+        if self._cpus is not None:
+            slots = min(slots, len(self._cpus.cpus) // self.cpus_per_cell)
+        return max(slots, 1)
+
+    def can_start(self) -> bool:
+        if self._cpus is not None and self._cpus.available < self.cpus_per_cell:
+            return False
+        return len(self._running) < self.jobs and (self.budget - self.allocated).fits(self.demand)
+
+    def get_eta(self) -> Optional[float]:
+        """Estimated time in seconds until all cells are finished."""
+        if self.estimate is None or self._pending_work is None:
+            return None
+        scale = self._actual_work / self._estimated_work if self._estimated_work else 1.0
+        now = time.perf_counter()
+        in_progress = sum(
+            max(sum(map(self.estimate, item.cells)) * scale - (now - item.started_at), 0.0)
+            for item in self._running.values()
+        )
+        return (self._pending_work * scale + in_progress) / self.slots
+
+    def run(self, cells: Iterable[Cell]) -> List[CellResult]:
+        """Run all cells and wait until they finish.
+
+        Cells are consumed lazily, only when there is a free slot for a new one.
+        """
+        self.logs_dir.mkdir(parents=True, exist_ok=True)
+        self._started_at = time.perf_counter()
+        total = len(cells) if isinstance(cells, Sized) else None
+        if self.estimate is not None and total is not None:
+            self._pending_work = sum(map(self.estimate, cells))
+        logger.info("Start campaign", cells=total, jobs=self.jobs)
+        pending = enumerate(self.make_batches(cells))
+        exhausted = False
+        try:
+            while not exhausted or self._running:
+                while not exhausted and self.can_start():
+                    item = next(pending, None)
+                    if item is None:
+                        exhausted = True
+                    else:
+                        self.start(*item)
+                for finished in self.poll():
+                    self.on_finish(finished, total)
+                if self.queue is not None:
+                    self.queue.heartbeat()
+                if self._running:
+                    time.sleep(self.poll_interval)
+        finally:
+            self.terminate()
+        return self._results
+
+    def make_batches(self, cells: Iterable[Cell]) -> Iterable[List[Cell]]:
+        """Group cells for the same target into batches, keeping the order of their first cells."""
+        if self.warm_runs <= 1 or not isinstance(cells, Sized):
+            return ([cell] for cell in cells)
+        batches: List[List[Cell]] = []
+        open_batches: Dict[str, List[Cell]] = {}
+        for cell in cells:
+            if not self.can_reuse(cell):
+                batches.append([cell])
+                continue
+            batch = open_batches.get(cell.target)
+            if batch is None or len(batch) >= self.warm_runs:
+                batch = open_batches[cell.target] = []
+                batches.append(batch)
+            batch.append(cell)
+        return batches
+
+    def get_limits(self, cpus: List[int]) -> Optional[Limits]:
+        """Limits for all containers of a worker pinned to `cpus`."""
+        if not cpus:
+            return None
+        return Limits(cpuset=format_cpuset(cpus), cpus=self.demand.cpus, memory=self.demand.memory)
+
+    def get_command(self, cells: List[Cell], port: int, limits: Optional[Limits] = None) -> List[str]:
+        if len(cells) == 1:
+            cell = cells[0]
+            return [
+                sys.executable,
+                "-m",
+                "wafp",
+                *cell.get_args(self.output_dir, port, limits, run_id=cell.generate_run_id()),
+            ]
+        command = [
+            sys.executable,
+            "-m",
+            "wafp.campaign.warm",
+            cells[0].target,
+            f"--port={port}",
+            f"--output-dir={self.output_dir}",
+        ]
+        if limits is not None:
+            command.extend(limits.to_args())
+        for cell in cells:
+            command.extend(["--run", cell.fuzzer, str(cell.iteration)])
+        return command
+
+    def start(self, index: int, cells: List[Cell]) -> None:
+        port = self.allocate_port()
+        for cell in cells:
+            # Leftovers of an interrupted run
+            shutil.rmtree(self.output_dir / cell.key, ignore_errors=True)
+            get_archive_path(self.output_dir / cell.key).unlink(missing_ok=True)
+            if self.journal is not None:
+                self.journal.record_start(cell)
+            if self.estimate is not None and self._pending_work is not None:
+                self._pending_work -= self.estimate(cell)
+        log_file = (self.logs_dir / f"{cells[0].key}.log").open("wb")
+        # PID makes names unique between multiple campaign processes on the same host
+        env = {**os.environ, "WAFP_CAMPAIGN_CELL": f"c{os.getpid()}_{index}"}
+        cpus = self._cpus.acquire(self.cpus_per_cell) if self._cpus is not None else []
+        limits = self.get_limits(cpus)
+        try:
+            with log_file:
+                process = subprocess.Popen(  # pylint: disable=consider-using-with
+                    self.get_command(cells, port, limits),
+                    stdout=log_file,
+                    stderr=subprocess.STDOUT,
+                    env=env,
+                )
+        except BaseException:
+            self.release(cpus)
+            release_port(port)
+            raise
+        batch = RunningBatch(cells=cells, process=process, port=port, started_at=time.perf_counter(), cpus=cpus)
+        self._running[index] = batch
+        info = {"cpuset": limits.cpuset} if limits is not None else {}
+        logger.info("Start cell", cell=batch.name, cells=len(cells), port=port, running=len(self._running), **info)
+
+    def release(self, cpus: List[int]) -> None:
+        if self._cpus is not None:
+            self._cpus.release(cpus)
+
+    def allocate_port(self) -> int:
+        """Reserve a port that is not used by running cells, including cells of other campaigns on this host.
+
+        Workers receive the port explicitly and do not reserve it again. It is released when the worker exits.
+        """
+        return reserve_port()
+
+    def poll(self) -> List[CellResult]:
+        """Collect results of all cells that are finished since the last call."""
+        finished = []
+        for index, running in list(self._running.items()):
+            returncode = running.process.poll()
+            if returncode is not None:
+                del self._running[index]
+                self.release(running.cpus)
+                release_port(running.port)
+                # Cells in a batch share the target startup time
+                duration = round((time.perf_counter() - running.started_at) / len(running.cells), 2)
+                for cell in running.cells:
+                    completed = is_finished(self.output_dir / cell.key)
+                    finished.append(
+                        CellResult(cell=cell, returncode=returncode, duration=duration, completed=completed)
+                    )
+        return finished
+
+    def on_finish(self, result: CellResult, total: Optional[int]) -> None:
+        self._results.append(result)
+        if self.journal is not None:
+            self.journal.record_finish(result, self.output_dir)
+        if self.queue is not None:
+            self.queue.record_finish(result)
+        if self.estimate is not None and result.completed:
+            self._estimated_work += self.estimate(result.cell)
+            self._actual_work += result.duration
+        elapsed = time.perf_counter() - self._started_at
+        eta = self.get_eta()
+        log = logger.info if result.completed else logger.error
+        log(
+            "Finish cell",
+            cell=result.cell.key,
+            returncode=result.returncode,
+            completed=result.completed,
+            duration=result.duration,
+            progress=f"{len(self._results)}/{total if total is not None else '?'}",
+            throughput=f"{get_throughput(len(self._results), elapsed):.2f} runs/hour",
+            eta=format_duration(eta) if eta is not None else "unknown",
+        )
+
+    def terminate(self) -> None:
+        """Stop all running cells, e.g. when the campaign is interrupted."""
+        for running in self._running.values():
+            running.process.terminate()
+        for running in self._running.values():
+            running.process.wait()
+            self.release(running.cpus)
+            release_port(running.port)
+        self._running.clear()
+
+
+def get_throughput(completed: int, elapsed: float) -> float:
+    """Number of completed runs per hour."""
+    if elapsed <= 0:
+        return 0.0
+    return completed * 3600 / elapsed
+
+
+def format_duration(seconds: float) -> str:
+    """Human-readable duration, e.g. `1d 2h 3m`."""
+    minutes = int(seconds // 60)
+    days, minutes = divmod(minutes, 24 * 60)
+    hours, minutes = divmod(minutes, 60)
+    if days:
+        return f"{days}d {hours}h {minutes}m"
+    if hours:
+        return f"{hours}h {minutes}m"
+    return f"{minutes}m"
@@ -0,0 +1,195 @@
+"""Collecting Sentry events of a whole campaign at once.
+
+Runs only record their run ID in `metadata.json`, so the critical path of a cell does not include Sentry. The campaign
+runner then lists events of each Sentry project in a single scan, groups them by the `wafp.run-id` tag and stores them
+in the `target` directory of the corresponding runs, the same way `BaseTarget.process_artifacts` does. Runs may be
+plain directories, packed into an artifact store or archived.
+
+Usage: python -m wafp.campaign.harvest DIRECTORY --url=URL --token=TOKEN
+"""
+import argparse
+import json
+import os
+import pathlib
+import re
+import sys
+import threading
+import time
+import zipfile
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set
+
+import attr
+import requests
+import structlog
+
+from .. import archive, store, tracing
+from ..archive import ARCHIVE_SUFFIX, RunArchive
+from ..artifacts import SENTRY_EVENT_FILENAME
+from ..constants import METADATA_FILENAME
+from ..targets import sentry
+
+logger = structlog.get_logger()
+
+DEFAULT_ORGANIZATION = "sentry"
+EVENT_PATTERN = re.compile("^target/" + SENTRY_EVENT_FILENAME.format(event_id="(?P<event_id>.+)") + "$")
+
+
+def get_project(target: str) -> str:
+    """Sentry project slug of a target. All variants of a target report to the same project."""
+    return target.split(":", 1)[0]
+
+
+@attr.s(slots=True)
+class Run:
+    """A finished run, stored in any layout."""
+
+    path: pathlib.Path = attr.ib()
+    metadata: Dict[str, Any] = attr.ib()
+    artifacts: List[str] = attr.ib()
+
+    @property
+    def event_ids(self) -> Set[str]:
+        """Sentry events that are already stored."""
+        return {match.group("event_id") for match in map(EVENT_PATTERN.match, self.artifacts) if match is not None}
+
+    def save_events(self, events: List[Dict[str, Any]]) -> None:
+        files = {
+            f"target/{SENTRY_EVENT_FILENAME.format(event_id=event['eventID'])}": json.dumps(event).encode()
+            for event in events
+        }
+        if self.path.name.endswith(ARCHIVE_SUFFIX):
+            archive.add(self.path, files)
+        elif store.read_manifest(self.path) is not None:
+            store.add_artifacts(self.path, files)
+        else:
+            for relative, data in files.items():
+                path = self.path / relative
+                path.parent.mkdir(exist_ok=True)
+                path.write_bytes(data)
+        self.artifacts.extend(files)
+
+
+def find_runs(directory: pathlib.Path) -> List[Run]:
+    """All finished runs with a known run ID."""
+    runs = []
+    for path in sorted(directory.iterdir()):
+        try:
+            if path.name.endswith(ARCHIVE_SUFFIX) and path.is_file():
+                with RunArchive(path) as run_archive:
+                    run = Run(path=path, metadata=run_archive.metadata, artifacts=run_archive.names())
+            elif (path / METADATA_FILENAME).exists():
+                with (path / METADATA_FILENAME).open() as fd:
+                    run = Run(path=path, metadata=json.load(fd), artifacts=store.list_artifacts(path))
+            else:
+                continue
+        except (OSError, ValueError, zipfile.BadZipFile):
+            # E.g. the run directory is being packed right now
+            logger.warning("Can not read run", path=str(path))
+            continue
+        if run.metadata.get("run_id") is not None:
+            runs.append(run)
+    return runs
+
+
+@attr.s()
+class Harvester:
+    """Stores Sentry events of all runs in a campaign output directory."""
+
+    output_dir: pathlib.Path = attr.ib()
+    url: str = attr.ib()
+    token: str = attr.ib()
+    organization: str = attr.ib(default=DEFAULT_ORGANIZATION)
+    # Seconds between background harvests. Without it, events are collected only by explicit `harvest` calls
+    interval: Optional[float] = attr.ib(default=None)
+    _stopped: threading.Event = attr.ib(factory=threading.Event, init=False, repr=False)
+    _thread: Optional[threading.Thread] = attr.ib(default=None, init=False, repr=False)
+
+    @tracing.traced("sentry.harvest")
+    def harvest(self) -> int:
+        """Store events that are not stored yet. Returns the number of new events."""
+        start = time.perf_counter()
+        by_project: Dict[str, List[Run]] = defaultdict(list)
+        for run in find_runs(self.output_dir):
+            by_project[get_project(run.metadata["target"])].append(run)
+        stored = 0
+        for project, runs in sorted(by_project.items()):
+            try:
+                stored += self.harvest_project(project, runs)
+            except requests.HTTPError as exc:
+                if exc.response is None or exc.response.status_code != 404:
+                    raise
+                # The target does not report to Sentry
+                logger.info("No Sentry project", project=project)
+            except requests.Timeout:
+                # Events of these runs are stored by the next harvest
+                logger.warning("Sentry did not respond in time", project=project, timeout=sentry.REQUEST_TIMEOUT)
+        logger.info("Harvested Sentry events", events=stored, duration=round(time.perf_counter() - start, 2))
+        return stored
+
+    def harvest_project(self, project: str, runs: List[Run]) -> int:
+        by_run_id: Dict[str, List[Run]] = defaultdict(list)
+        known: Set[str] = set()
+        for run in runs:
+            by_run_id[run.metadata["run_id"]].append(run)
+            known.update(run.event_ids)
+
+        def select(summary: Dict[str, Any]) -> bool:
+            # Payloads of already stored events are not fetched again
+            return summary.get("eventID") not in known and bool(get_runs(summary))
+
+        def get_runs(event: Dict[str, Any]) -> List[Run]:
+            return by_run_id.get(sentry.get_tag(event, sentry.RUN_ID_TAG) or "", [])
+
+        events: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        runs_by_path = {}
+        for summary, event in sentry.scan_events(
+            self.url, self.token, self.organization, project, query=f"has:{sentry.RUN_ID_TAG}", select=select
+        ):
+            for run in get_runs(summary):
+                events[str(run.path)].append(event)
+                runs_by_path[str(run.path)] = run
+        for path, run_events in events.items():
+            try:
+                runs_by_path[path].save_events(run_events)
+            except OSError:
+                # The run is being packed. Its events will be stored by the next harvest
+                logger.warning("Can not store Sentry events", path=path)
+        return sum(map(len, events.values()))
+
+    def start(self) -> None:
+        """Harvest events periodically in a background thread."""
+        if self.interval is not None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        assert self.interval is not None
+        while not self._stopped.wait(self.interval):
+            try:
+                self.harvest()
+            except requests.RequestException as exc:
+                logger.warning("Failed to harvest Sentry events", error=str(exc))
+
+
+def main(args: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m wafp.campaign.harvest")
+    parser.add_argument("directory", type=pathlib.Path, help="Directory with artifacts of a campaign")
+    parser.add_argument("--url", default=os.environ.get("SENTRY_URL"), required=False, help="Sentry instance URL")
+    parser.add_argument("--token", default=os.environ.get("SENTRY_TOKEN"), required=False, help="Sentry API token")
+    parser.add_argument("--organization", default=DEFAULT_ORGANIZATION, help="Sentry organization slug")
+    parsed = parser.parse_args(args)
+    if not parsed.url or not parsed.token:
+        parser.error("Sentry URL & token are required")
+    Harvester(parsed.directory, url=parsed.url, token=parsed.token, organization=parsed.organization).harvest()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+import json
+import pathlib
+import statistics
+import zipfile
+from collections import defaultdict
+from functools import cached_property
+from typing import Dict, Iterable, List, Optional, Tuple, Type
+
+import attr
+import structlog
+import yaml
+
+from ..archive import ARCHIVE_SUFFIX, RunArchive
+from ..base import Component
+from ..constants import METADATA_FILENAME
+from ..fuzzers import loader as fuzzers_loader
+from ..targets import loader as targets_loader
+from ..targets.metadata import Metadata
+from .core import Cell
+
+logger = structlog.get_logger()
+
+# Used when there is no history at all
+DEFAULT_DURATION = 600.0
+
+Combination = Tuple[str, str]
+
+
+def get_group(metadata: Metadata) -> str:
+    """Targets built with the same language & framework tend to behave similarly under fuzzing."""
+    framework = metadata.framework.name if metadata.framework is not None else ""
+    return f"{metadata.language.name}:{framework}"
+
+
+def get_startup_cost(component: Type[Component]) -> int:
+    """The number of containers in the component's compose file.
+
+    Every container has to be created & become ready, and targets with several services usually run database migrations
+    before they serve requests.
+    """
+    try:
+        definition = yaml.safe_load((component.path / component.get_docker_compose_filename()).read_text()) or {}
+    except (OSError, yaml.YAMLError):
+        return 1
+    return max(len(definition.get("services") or {}), 1)
+
+
+def get_startup_costs(cells: Iterable[Cell]) -> Dict[str, int]:
+    """Startup costs of all fuzzers & targets in the given cells. See `get_startup_cost`."""
+    costs = {}
+    for cell in cells:
+        for load, name in ((fuzzers_loader.by_name, cell.fuzzer), (targets_loader.by_name, cell.target)):
+            if name not in costs:
+                cls = load(name)
+                if cls is not None:
+                    costs[name] = get_startup_cost(cls)
+    return costs
+
+
+@attr.s()
+class History:
+    """Durations of previous runs for each fuzzer / target combination."""
+
+    durations: Dict[Combination, List[float]] = attr.ib(factory=dict)
+    # Target name -> group of similar targets, see `get_group`
+    groups: Dict[str, str] = attr.ib(factory=dict)
+    # Fuzzer or target name -> startup cost, see `get_startup_cost`. Distinguishes cells on a fresh campaign
+    costs: Dict[str, int] = attr.ib(factory=dict)
+    _cache: Dict[Combination, float] = attr.ib(factory=dict, init=False, repr=False)
+
+    @classmethod
+    def from_directory(
+        cls,
+        directory: pathlib.Path,
+        groups: Optional[Dict[str, str]] = None,
+        costs: Optional[Dict[str, int]] = None,
+    ) -> "History":
+        """Load durations from `metadata.json` files of runs stored in `directory`, packed or not."""
+        durations: Dict[Combination, List[float]] = defaultdict(list)
+        for path in directory.glob(f"*/{METADATA_FILENAME}"):
+            try:
+                with path.open() as fd:
+                    data = json.load(fd)
+                durations[(data["fuzzer"], data["target"])].append(float(data["duration"]))
+            except (OSError, ValueError, KeyError, TypeError):
+                logger.warning("Invalid run metadata", path=str(path))
+        for path in directory.glob(f"*{ARCHIVE_SUFFIX}"):
+            try:
+                with RunArchive(path) as archive:
+                    data = archive.metadata
+                durations[(data["fuzzer"], data["target"])].append(float(data["duration"]))
+            except (OSError, ValueError, KeyError, TypeError, zipfile.BadZipFile):
+                logger.warning("Invalid run metadata", path=str(path))
+        return cls(durations=dict(durations), groups=groups or {}, costs=costs or {})
+
+    @cached_property
+    def means(self) -> Dict[Combination, float]:
+        return {combination: statistics.mean(values) for combination, values in self.durations.items() if values}
+
+    @cached_property
+    def default(self) -> float:
+        """Estimate for combinations without any related history."""
+        if not self.means:
+            return DEFAULT_DURATION
+        return statistics.mean(self.means.values())
+
+    def estimate(self, cell: Cell) -> float:
+        """Expected duration of a cell in seconds."""
+        combination = (cell.fuzzer, cell.target)
+        if combination not in self._cache:
+            self._cache[combination] = self._estimate(*combination)
+        return self._cache[combination]
+
+    def _estimate(self, fuzzer: str, target: str) -> float:
+        if (fuzzer, target) in self.means:
+            return self.means[(fuzzer, target)]
+        # No history for this combination - use the same fuzzer against similar targets
+        group = self.groups.get(target)
+        if group is not None:
+            similar = [
+                mean
+                for (other_fuzzer, other), mean in self.means.items()
+                if other_fuzzer == fuzzer and self.groups.get(other) == group
+            ]
+            if similar:
+                return statistics.mean(similar)
+        by_fuzzer = [mean for (other_fuzzer, _), mean in self.means.items() if other_fuzzer == fuzzer]
+        if by_fuzzer:
+            return statistics.mean(by_fuzzer)
+        # Nothing is known about the fuzzer. Cells with more containers to start take longer
+        return self.default * (self.costs.get(fuzzer, 1) + self.costs.get(target, 1)) / 2
+
+    def order(self, cells: List[Cell]) -> List[Cell]:
+        """Longest cells first, so the campaign does not wait for a slow cell started at the very end."""
+        return sorted(cells, key=lambda cell: (-self.estimate(cell), cell.target, cell.fuzzer, cell.iteration))
@@ -0,0 +1,152 @@
+import enum
+import hashlib
+import pathlib
+import sqlite3
+import time
+from typing import Iterable, List, Optional
+
+import attr
+import structlog
+
+from ..archive import get_archive_path, is_finished
+from ..constants import CAMPAIGN_DIRECTORY_NAME
+from .core import Cell, CellResult
+
+logger = structlog.get_logger()
+
+JOURNAL_FILENAME = "journal.db"
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL,
+    fuzzer TEXT NOT NULL,
+    target TEXT NOT NULL,
+    iteration INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    duration REAL,
+    returncode INTEGER,
+    checksum TEXT
+);
+CREATE INDEX IF NOT EXISTS events_by_key ON events (key, id);
+"""
+
+
+class CellState(enum.Enum):
+    # The cell was started, but there is no record of it finishing - e.g. the campaign process crashed
+    RUNNING = "running"
+    # All artifacts and metadata are stored
+    FINISHED = "finished"
+    # The worker exited without storing metadata
+    FAILED = "failed"
+
+
+@attr.s()
+class Journal:
+    """Append-only log of cell state transitions stored in SQLite.
+
+    The latest event for a cell defines its state, therefore restarting a campaign resumes only unfinished cells.
+    """
+
+    path: pathlib.Path = attr.ib()
+    _connection: sqlite3.Connection = attr.ib(init=False)
+
+    def __attrs_post_init__(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(str(self.path), isolation_level=None)
+        # Committed events survive a crash of the campaign process without a full `fsync` on every write
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+
+    @classmethod
+    def in_directory(cls, output_dir: pathlib.Path) -> "Journal":
+        """Journal of the campaign that stores its artifacts in `output_dir`."""
+        return cls(output_dir / CAMPAIGN_DIRECTORY_NAME / JOURNAL_FILENAME)
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def _append(
+        self,
+        cell: Cell,
+        state: CellState,
+        duration: Optional[float] = None,
+        returncode: Optional[int] = None,
+        checksum: Optional[str] = None,
+    ) -> None:
+        self._connection.execute(
+            "INSERT INTO events (key, fuzzer, target, iteration, state, timestamp, duration, returncode, checksum) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                cell.key,
+                cell.fuzzer,
+                cell.target,
+                cell.iteration,
+                state.value,
+                time.time(),
+                duration,
+                returncode,
+                checksum,
+            ),
+        )
+
+    def record_start(self, cell: Cell) -> None:
+        self._append(cell, CellState.RUNNING)
+
+    def record_finish(self, result: CellResult, output_dir: pathlib.Path) -> None:
+        if result.completed:
+            state = CellState.FINISHED
+            checksum: Optional[str] = get_checksum(output_dir / result.cell.key)
+        else:
+            state = CellState.FAILED
+            checksum = None
+        self._append(result.cell, state, duration=result.duration, returncode=result.returncode, checksum=checksum)
+
+    def get_state(self, cell: Cell) -> Optional[CellState]:
+        """The latest known state of a cell."""
+        row = self._connection.execute(
+            "SELECT state FROM events WHERE key = ? ORDER BY id DESC LIMIT 1", (cell.key,)
+        ).fetchone()
+        if row is None:
+            return None
+        return CellState(row[0])
+
+    def filter_pending(self, cells: Iterable[Cell], output_dir: pathlib.Path) -> List[Cell]:
+        """Cells that are not finished yet.
+
+        Directories created by campaigns that were run before the journal existed are considered finished if they
+        contain run metadata, which is stored as the last step of a run.
+        """
+        pending = []
+        for cell in cells:
+            state = self.get_state(cell)
+            if state is None and is_finished(output_dir / cell.key):
+                self._append(cell, CellState.FINISHED, checksum=get_checksum(output_dir / cell.key))
+                state = CellState.FINISHED
+            if state == CellState.FINISHED:
+                continue
+            if state is not None:
+                logger.info("Resume cell", cell=cell.key, state=state.value)
+            pending.append(cell)
+        return pending
+
+
+def get_checksum(directory: pathlib.Path) -> str:
+    """SHA-256 of all file names and contents in a directory, or of the run archive if it is packed."""
+    digest = hashlib.sha256()
+    archive_path = get_archive_path(directory)
+    if not directory.exists() and archive_path.exists():
+        update_digest(digest, archive_path)
+        return digest.hexdigest()
+    for path in sorted(directory.rglob("*")):
+        if path.is_file():
+            digest.update(str(path.relative_to(directory)).encode("utf8"))
+            update_digest(digest, path)
+    return digest.hexdigest()
+
+
+def update_digest(digest: "hashlib._Hash", path: pathlib.Path) -> None:
+    with path.open("rb") as fd:
+        for chunk in iter(lambda: fd.read(1024 * 1024), b""):
+            digest.update(chunk)
@@ -0,0 +1,81 @@
+"""Build all images needed by a campaign before fuzzing starts.
+
+Otherwise, concurrent workers that need the same image would build it at the same time.
+"""
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple, Type
+
+import attr
+import structlog
+
+from ..base import Component
+from ..fuzzers import loader as fuzzers_loader
+from ..targets import BaseTarget
+from ..targets import loader as targets_loader
+from .core import Cell
+
+logger = structlog.get_logger()
+
+
+@attr.s()
+class PrebuildResult:
+    built: int = attr.ib(default=0)
+    cached: int = attr.ib(default=0)
+    failed: List[str] = attr.ib(factory=list)
+
+
+def get_components(cells: Iterable[Cell]) -> List[Component]:
+    """Fuzzers & targets with distinct sets of images. E.g. variants often share all their images."""
+    components: Dict[Tuple[Tuple[str, str], ...], Component] = {}
+    names: Set[Tuple[Callable[..., Optional[Type[Component]]], str]] = set()
+    for cell in cells:
+        names.add((fuzzers_loader.by_name, cell.fuzzer))
+        names.add((targets_loader.by_name, cell.target))
+    for load, name in sorted(names, key=lambda item: item[1]):
+        cls = load(name)
+        if cls is None:
+            continue
+        if issubclass(cls, BaseTarget):
+            # Targets reserve a port on initialization, but images do not depend on it
+            component: Component = cls(port=0)
+        else:
+            component = cls()
+        images = tuple(sorted(component.get_build_images().items()))
+        if images:
+            components.setdefault(images, component)
+    return list(components.values())
+
+
+def build(component: Component) -> Optional[bool]:
+    """Whether the component's images were built. `None` if the build failed."""
+    try:
+        return component.ensure_built()
+    except subprocess.CalledProcessError as exc:
+        # Workers will try to build it again and will report the error in their logs
+        logger.warning("Failed to build", name=component.full_name, stdout=exc.stdout)
+        return None
+
+
+def prebuild(cells: Iterable[Cell], jobs: int = 1) -> PrebuildResult:
+    """Build images of all fuzzers & targets in the given cells, up to `jobs` at a time."""
+    components = get_components(cells)
+    result = PrebuildResult()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        for component, built in zip(components, executor.map(build, components)):
+            if built is None:
+                result.failed.append(component.full_name)
+            elif built:
+                result.built += 1
+            else:
+                result.cached += 1
+    logger.info(
+        "Prebuild is finished",
+        built=result.built,
+        cached=result.cached,
+        failed=len(result.failed),
+        duration=round(time.perf_counter() - start, 2),
+    )
+    return result
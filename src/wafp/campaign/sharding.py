@@ -0,0 +1,167 @@
+import heapq
+import pathlib
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Generator, List
+
+import attr
+import structlog
+
+from .core import Cell, CellResult, Estimate
+
+logger = structlog.get_logger()
+
+QUEUE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cells (
+    key TEXT PRIMARY KEY,
+    fuzzer TEXT NOT NULL,
+    target TEXT NOT NULL,
+    iteration INTEGER NOT NULL,
+    weight REAL NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS cells_by_state ON cells (state, weight);
+"""
+# Waiting for a lock held by another worker
+QUEUE_LOCK_TIMEOUT = 60.0
+# Workers renew claims of their running cells this often, in seconds
+HEARTBEAT_INTERVAL = 60.0
+# Running cells without a heartbeat for this long are considered abandoned, e.g. their host crashed
+LEASE_TIMEOUT = 15 * 60.0
+
+
+@attr.s(slots=True, frozen=True)
+class Shard:
+    """A part of the campaign executed on a single host."""
+
+    # 1-based
+    index: int = attr.ib()
+    count: int = attr.ib()
+
+    @classmethod
+    def parse(cls, value: str) -> "Shard":
+        """Parse shards in `i/n` format."""
+        match = re.fullmatch(r"(\d+)/(\d+)", value.strip())
+        if match is None:
+            raise ValueError(f"Shard should be in `i/n` format. Got: {value}")
+        index, count = map(int, match.groups())
+        if not 1 <= index <= count:
+            raise ValueError(f"Shard index should be between 1 and {count}. Got: {index}")
+        return cls(index=index, count=count)
+
+    def select(self, cells: List[Cell], estimate: Estimate) -> List[Cell]:
+        """Cells that belong to this shard."""
+        return partition(cells, self.count, estimate)[self.index - 1]
+
+
+def partition(cells: List[Cell], count: int, estimate: Estimate) -> List[List[Cell]]:
+    """Split cells into `count` parts with similar total estimated duration.
+
+    Cells are assigned greedily, longest first, to the least loaded part. The result depends only on the input
+    cells and estimates, so every host computes the same partitioning.
+    """
+    parts: List[List[Cell]] = [[] for _ in range(count)]
+    loads = [(0.0, index) for index in range(count)]
+    for cell in sorted(cells, key=lambda c: (-estimate(c), c.key)):
+        load, index = heapq.heappop(loads)
+        parts[index].append(cell)
+        heapq.heappush(loads, (load + estimate(cell), index))
+    return parts
+
+
+@attr.s()
+class CellQueue:
+    """A queue of cells shared by multiple hosts via an SQLite database.
+
+    Workers claim the longest pending cell when they have a free slot, which keeps finish times balanced.
+    A claim is a lease that the worker renews via `heartbeat` while the cell is running. Cells with expired leases
+    are returned to the queue, so cells of crashed hosts are picked up by other hosts.
+    """
+
+    path: pathlib.Path = attr.ib()
+    worker: str = attr.ib()
+    lease_timeout: float = attr.ib(default=LEASE_TIMEOUT)
+    heartbeat_interval: float = attr.ib(default=HEARTBEAT_INTERVAL)
+    _connection: sqlite3.Connection = attr.ib(init=False)
+    _last_heartbeat: float = attr.ib(default=0.0, init=False)
+
+    def __attrs_post_init__(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # WAL mode is not used - it does not work over network filesystems
+        self._connection = sqlite3.connect(str(self.path), timeout=QUEUE_LOCK_TIMEOUT, isolation_level=None)
+        self._connection.executescript(QUEUE_SCHEMA)
+
+    def close(self) -> None:
+        self._connection.close()
+
+    @contextmanager
+    def _transaction(self) -> Generator[sqlite3.Connection, None, None]:
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield self._connection
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
+
+    def populate(self, cells: List[Cell], estimate: Estimate) -> None:
+        """Add cells to the queue. Cells that are already known are left untouched."""
+        with self._transaction() as connection:
+            connection.executemany(
+                "INSERT OR IGNORE INTO cells (key, fuzzer, target, iteration, weight) VALUES (?, ?, ?, ?, ?)",
+                [(cell.key, cell.fuzzer, cell.target, cell.iteration, estimate(cell)) for cell in cells],
+            )
+
+    def release(self) -> None:
+        """Return cells that this worker failed or did not finish in a previous session back to the queue."""
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE cells SET state = 'pending', worker = NULL WHERE state IN ('running', 'failed') AND worker = ?",
+                (self.worker,),
+            )
+        if cursor.rowcount:
+            logger.info("Release stale cells", worker=self.worker, cells=cursor.rowcount)
+
+    def heartbeat(self) -> None:
+        """Renew leases of cells running on this worker. Calls more frequent than `heartbeat_interval` are no-ops."""
+        now = time.monotonic()
+        if now - self._last_heartbeat < self.heartbeat_interval:
+            return
+        self._last_heartbeat = now
+        with self._transaction() as connection:
+            connection.execute(
+                "UPDATE cells SET updated_at = ? WHERE state = 'running' AND worker = ?", (time.time(), self.worker)
+            )
+
+    def claim(self) -> Generator[Cell, None, None]:
+        """Claim pending cells one by one until the queue is empty."""
+        while True:
+            with self._transaction() as connection:
+                expired = connection.execute(
+                    "UPDATE cells SET state = 'pending', worker = NULL WHERE state = 'running' AND updated_at < ?",
+                    (time.time() - self.lease_timeout,),
+                ).rowcount
+                if expired:
+                    logger.warning("Release cells with expired leases", cells=expired)
+                row = connection.execute(
+                    "SELECT key, fuzzer, target, iteration FROM cells WHERE state = 'pending' "
+                    "ORDER BY weight DESC, key LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    return
+                connection.execute(
+                    "UPDATE cells SET state = 'running', worker = ?, updated_at = ? WHERE key = ?",
+                    (self.worker, time.time(), row[0]),
+                )
+            yield Cell(fuzzer=row[1], target=row[2], iteration=row[3])
+
+    def record_finish(self, result: CellResult) -> None:
+        state = "finished" if result.completed else "failed"
+        with self._transaction() as connection:
+            connection.execute(
+                "UPDATE cells SET state = ?, updated_at = ? WHERE key = ?", (state, time.time(), result.cell.key)
+            )
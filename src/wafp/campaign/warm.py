@@ -0,0 +1,83 @@
+"""Run multiple fuzzers one after another against the same target instance.
+
+The target is started once and reset via `BaseTarget.reset` between fuzzing runs.
+"""
+import argparse
+import pathlib
+import sys
+from typing import List, Optional, Tuple
+
+from .. import targets
+from ..__main__ import CliArguments, apply_limits, finish_run, fuzz, validate_cpuset
+from ..docker import ensure_docker_version
+from ..fuzzers.core import FuzzResult
+from ..limits import Limits
+from ..targets.core import Isolation, TargetContext
+from ..utils import exit_on_sigterm, parse_size
+from .core import Cell
+
+
+def parse_args(args: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("target", type=str, help="Fuzz target to start")
+    parser.add_argument("--port", required=True, type=int, help="TCP port on localhost used for the fuzz target")
+    parser.add_argument("--output-dir", required=True, type=str, help="Campaign output directory")
+    parser.add_argument("--cpuset", type=validate_cpuset, help="CPUs for all containers of the target and the fuzzers")
+    parser.add_argument("--cpus", type=float, help="CPU time of every run, split between its containers")
+    parser.add_argument("--memory", type=parse_size, help="Memory limit of every run, split between its containers")
+    parser.add_argument(
+        "--run",
+        nargs=2,
+        action="append",
+        required=True,
+        metavar=("FUZZER", "ITERATION"),
+        help="Fuzzer and iteration number for a single run",
+    )
+    return parser.parse_args(args)
+
+
+def main(args: Optional[List[str]] = None) -> int:
+    parsed = parse_args(args)
+    exit_on_sigterm()
+    ensure_docker_version()
+    output_dir = pathlib.Path(parsed.output_dir)
+    cells = [Cell(fuzzer=fuzzer, target=parsed.target, iteration=int(iteration)) for fuzzer, iteration in parsed.run]
+    limits = None
+    if parsed.cpuset is not None or parsed.cpus is not None or parsed.memory is not None:
+        limits = Limits(cpuset=parsed.cpuset, cpus=parsed.cpus, memory=parsed.memory)
+    # Validate all runs before starting the target
+    runs = [
+        CliArguments.from_all_args(cell.get_args(output_dir, parsed.port, limits, run_id=cell.generate_run_id()))
+        for cell in cells
+    ]
+    cls = targets.loader.by_name(parsed.target)
+    if cls is None:
+        raise ValueError(f"Target `{parsed.target}` is not found")
+    if cls.reset_isolation != Isolation.FULL:
+        raise ValueError(f"Target `{parsed.target}` does not support reuse across fuzzing runs")
+    target = cls(port=parsed.port)
+    fuzzers = [cli_args.get_fuzzer() for cli_args in runs]
+    apply_limits(limits, target, fuzzers)
+    returncode = 0
+    last: Optional[Tuple[CliArguments, FuzzResult, TargetContext]] = None
+    # Sentry is not used for warm runs, therefore the fuzzer ID only matters for the first run
+    with target.run(extra_env={"WAFP_FUZZER_ID": runs[0].fuzzer}) as context:
+        for index, (cli_args, fuzzer) in enumerate(zip(runs, fuzzers)):
+            if index > 0:
+                context = target.reset()
+            result = fuzz(cli_args, target, fuzzer, context)
+            # The trace of the first run includes the target start, the following ones their resets
+            if index + 1 < len(runs):
+                finish_run(cli_args, target, result, context)
+            else:
+                last = (cli_args, result, context)
+            returncode = returncode or result.completed_process.returncode
+    if last is not None:
+        # Finished after the target is stopped, like single runs, so its trace includes stopping the target
+        cli_args, result, context = last
+        finish_run(cli_args, target, result, context)
+    return returncode
+
+
+if __name__ == "__main__":
+    sys.exit(main())
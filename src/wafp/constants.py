@@ -5,8 +5,20 @@ COMPOSE_PROJECT_NAME_PREFIX = "wafp_"
 XDIST_WORKER = os.environ.get("PYTEST_XDIST_WORKER", "")
 if XDIST_WORKER:
     COMPOSE_PROJECT_NAME_PREFIX += f"{XDIST_WORKER}_"
+# Set by the campaign scheduler for each worker process, so concurrent runs get distinct compose projects
+CAMPAIGN_CELL = os.environ.get("WAFP_CAMPAIGN_CELL", "")
+if CAMPAIGN_CELL:
+    COMPOSE_PROJECT_NAME_PREFIX += f"{CAMPAIGN_CELL}_"
 TEMPORARY_DIRECTORY_PREFIX = "wafp-"
 MINIMUM_DOCKER_COMPOSE_VERSION = "1.28.0"
 MINIMUM_DOCKER_VERSION = "20.10.0"
+# Successful version checks are cached in the user's cache directory for a day
+VERSION_CACHE_FILENAME = "docker-version.json"
+VERSION_CACHE_TTL = 24 * 60 * 60
+# "cli" runs `docker` / `docker-compose` processes, "engine" talks to the Docker Engine API where possible
+DOCKER_BACKEND = os.environ.get("WAFP_DOCKER_BACKEND", "cli")
+DEFAULT_DOCKER_SOCKET = "/var/run/docker.sock"
 DEFAULT_DOCKER_COMPOSE_FILENAME = "docker-compose.yml"
 DEFAULT_FUZZER_SERVICE_NAME = "fuzzer"
+CAMPAIGN_DIRECTORY_NAME = ".campaign"
+METADATA_FILENAME = "metadata.json"
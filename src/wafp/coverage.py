@@ -0,0 +1,262 @@
+"""Operation-level coverage of an API schema.
+
+Requests are matched to Open API operations with a trie of path templates - every path segment is looked up in
+a dictionary of static segments first, then in segments with parameters. Matching a request does not depend on
+the number of operations in the schema, so even a large request log is classified in linear time.
+
+Usage: python -m wafp.coverage <schema> <path-to-requests.bin> [--base-path=/api]
+"""
+import argparse
+import json
+import pathlib
+import re
+import sys
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Pattern, Tuple
+from urllib.parse import unquote, urlsplit
+
+import attr
+import requests
+import yaml
+
+from . import proxy
+from .utils import is_url
+
+REPORT_FILENAME = "coverage.json"
+HTTP_METHODS = ("get", "put", "post", "delete", "options", "head", "patch", "trace")
+PARAMETER_RE = re.compile(r"{[^}]+}")
+
+
+def load_schema(location: str, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """Load an Open API schema from a URL or a file. Both JSON & YAML are supported."""
+    if is_url(location):
+        # Targets may use self-signed certificates
+        response = requests.get(location, headers=headers, verify=False, timeout=60)
+        response.raise_for_status()
+        text = response.text
+    else:
+        text = pathlib.Path(location).read_text()
+    schema = yaml.safe_load(text)
+    if not isinstance(schema, dict) or not isinstance(schema.get("paths"), dict):
+        raise ValueError(f"Not an Open API schema: {location}")
+    return schema
+
+
+def get_base_path(schema: Dict[str, Any]) -> str:
+    """Path prefix of all operations, from `basePath` in Open API 2 or the first server in Open API 3."""
+    if "basePath" in schema:
+        return schema["basePath"] or ""
+    servers = schema.get("servers") or []
+    if servers:
+        # Server URLs may be relative and contain variables, e.g. `{scheme}://example.com/api`
+        url = PARAMETER_RE.sub("x", servers[0].get("url") or "")
+        return urlsplit(url).path
+    return ""
+
+
+def split_path(path: str) -> List[str]:
+    return [segment for segment in path.split("/") if segment]
+
+
+@attr.s(slots=True)
+class Operation:
+    method: str = attr.ib()
+    path: str = attr.ib()
+
+
+@attr.s(slots=True)
+class Node:
+    static: Dict[str, "Node"] = attr.ib(factory=dict)
+    # A segment that is a single parameter, e.g. `{user_id}`
+    parameter: Optional["Node"] = attr.ib(default=None)
+    # Segments mixing parameters with static parts, e.g. `{name}.json`
+    patterns: List[Tuple[Pattern, "Node"]] = attr.ib(factory=list)
+    # Method -> operation index
+    operations: Dict[str, int] = attr.ib(factory=dict)
+
+    def get_child(self, segment: str) -> "Node":
+        if PARAMETER_RE.fullmatch(segment):
+            if self.parameter is None:
+                self.parameter = Node()
+            return self.parameter
+        if PARAMETER_RE.search(segment):
+            regex = "".join(
+                "[^/]+?" if PARAMETER_RE.fullmatch(part) else re.escape(part)
+                for part in re.split(r"({[^}]+})", segment)
+                if part
+            )
+            for pattern, child in self.patterns:
+                if pattern.pattern == regex:
+                    return child
+            child = Node()
+            self.patterns.append((re.compile(regex), child))
+            return child
+        return self.static.setdefault(segment, Node())
+
+
+@attr.s()
+class Router:
+    """Path-template trie of all operations in a schema."""
+
+    operations: List[Operation] = attr.ib(factory=list)
+    root: Node = attr.ib(factory=Node)
+
+    @classmethod
+    def from_schema(cls, schema: Dict[str, Any], base_paths: Iterable[str] = ()) -> "Router":
+        """Build a router for `schema`.
+
+        Operations are reachable under the schema's base path and every path in `base_paths`, as fuzzers differ in
+        which one they use.
+        """
+        router = cls()
+        prefixes = {base_path.rstrip("/") for base_path in (get_base_path(schema), *base_paths)}
+        for path, definition in schema["paths"].items():
+            if not isinstance(definition, dict):
+                continue
+            for method in HTTP_METHODS:
+                if method in definition:
+                    index = len(router.operations)
+                    router.operations.append(Operation(method=method.upper(), path=path))
+                    for prefix in sorted(prefixes):
+                        router.add(prefix + path, method.upper(), index)
+        return router
+
+    def add(self, path: str, method: str, index: int) -> None:
+        node = self.root
+        for segment in split_path(path):
+            node = node.get_child(segment)
+        node.operations.setdefault(method, index)
+
+    def match(self, method: str, path: str) -> Optional[int]:
+        """Index of the operation that serves the request. Static segments take precedence over parameters."""
+        segments = [unquote(segment) for segment in split_path(path)]
+        method = method.upper()
+        # Depth-first search that only backtracks if a static branch is a dead end
+        stack: List[Tuple[Node, int]] = [(self.root, 0)]
+        while stack:
+            node, depth = stack.pop()
+            if depth == len(segments):
+                if method in node.operations:
+                    return node.operations[method]
+                continue
+            segment = segments[depth]
+            # Pushed in reverse order of precedence
+            if node.parameter is not None:
+                stack.append((node.parameter, depth + 1))
+            for pattern, child in reversed(node.patterns):
+                if pattern.fullmatch(segment):
+                    stack.append((child, depth + 1))
+            static: Optional[Node] = node.static.get(segment)
+            if static is not None:
+                stack.append((static, depth + 1))
+        return None
+
+
+@attr.s()
+class Coverage:
+    """Hit counts of all operations in a schema."""
+
+    router: Router = attr.ib()
+    hits: array = attr.ib(init=False)
+    unmatched: int = attr.ib(default=0, init=False)
+
+    def __attrs_post_init__(self) -> None:
+        self.hits = array("Q", bytes(8 * len(self.router.operations)))
+
+    @classmethod
+    def from_location(
+        cls, location: str, *, headers: Optional[Dict[str, str]] = None, base_paths: Iterable[str] = ()
+    ) -> "Coverage":
+        return cls(Router.from_schema(load_schema(location, headers), base_paths))
+
+    def record(self, method: str, path: str, count: int = 1) -> Optional[int]:
+        index = self.router.match(method, path)
+        if index is None:
+            self.unmatched += count
+        else:
+            self.hits[index] += count
+        return index
+
+    def get_template(self, method: str, path: str) -> str:
+        """Record a request & return its path template, to be used by the metering proxy."""
+        index = self.record(method, path)
+        if index is None:
+            return proxy.get_template(method, path)
+        template = self.router.operations[index].path
+        # Keep the base path the request was sent to, so the log can be matched again by `from_log`
+        segments = split_path(path)
+        prefix = segments[: len(segments) - len(split_path(template))]
+        return "".join(f"/{segment}" for segment in prefix) + template
+
+    def bitmap(self) -> bytes:
+        """Bit N is set if operation N was called at least once. Operations are in the schema order."""
+        bits = bytearray((len(self.hits) + 7) // 8)
+        for index, hits in enumerate(self.hits):
+            if hits:
+                bits[index // 8] |= 1 << (index % 8)
+        return bytes(bits)
+
+    def summary(self) -> Dict[str, Any]:
+        total = len(self.hits)
+        covered = sum(1 for hits in self.hits if hits)
+        return {
+            "operations": total,
+            "covered": covered,
+            "ratio": covered / total if total else 0.0,
+            "bitmap": self.bitmap().hex(),
+            "unmatched": self.unmatched,
+        }
+
+    def report(self) -> Dict[str, Any]:
+        """Summary & hit counts of every operation."""
+        return {
+            **self.summary(),
+            "hits": [
+                {"method": operation.method, "path": operation.path, "hits": hits}
+                for operation, hits in zip(self.router.operations, self.hits)
+            ],
+        }
+
+    def store(self, path: pathlib.Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("w") as fd:
+            json.dump(self.report(), fd)
+
+
+def from_log(router: Router, path: pathlib.Path) -> Coverage:
+    """Coverage of requests in a metering proxy log.
+
+    Every distinct method & path template is matched only once, and the rest is counting.
+    """
+    data = proxy.read_log(path)
+    columns = data["columns"]
+    counts: Dict[Tuple[int, int], int] = {}
+    for key in zip(columns["method"], columns["template"]):
+        counts[key] = counts.get(key, 0) + 1
+    coverage = Coverage(router)
+    for (method, template), count in counts.items():
+        coverage.record(data["methods"][method], data["templates"][template], count)
+    return coverage
+
+
+def main(args: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m wafp.coverage")
+    parser.add_argument("schema", help="Path or URL of the API schema")
+    parser.add_argument("log", type=pathlib.Path, help="Request log of the metering proxy")
+    parser.add_argument(
+        "--base-path", action="append", default=[], help="Path prefix of operations, besides the one in the schema"
+    )
+    parsed = parser.parse_args(args)
+    router = Router.from_schema(load_schema(parsed.schema), parsed.base_path)
+    coverage = from_log(router, parsed.log)
+    for operation, hits in zip(router.operations, coverage.hits):
+        print(f"{hits:>8} {operation.method:<7} {operation.path}")
+    summary = coverage.summary()
+    print(
+        f"Covered: {summary['covered']}/{summary['operations']} operations. Unmatched requests: {summary['unmatched']}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,48 @@
+import json
+import os
+import pathlib
+import shutil
 import subprocess
-from typing import Any, List, Union
+import tempfile
+import time
+from typing import Any, List, Optional, Sequence, Union
 
 from packaging import version
 
-from .constants import DEFAULT_DOCKER_COMPOSE_FILENAME, MINIMUM_DOCKER_COMPOSE_VERSION, MINIMUM_DOCKER_VERSION
+from . import tracing
+from .constants import (
+    DEFAULT_DOCKER_COMPOSE_FILENAME,
+    MINIMUM_DOCKER_COMPOSE_VERSION,
+    MINIMUM_DOCKER_VERSION,
+    VERSION_CACHE_FILENAME,
+    VERSION_CACHE_TTL,
+)
 from .errors import VersionError
+from .utils import get_cache_dir
+
+# Keys of version checks that passed in this process
+_verified: List[List[Any]] = []
+
+
+def compose_command(
+    command: List[str],
+    *,
+    project: str,
+    file: str = DEFAULT_DOCKER_COMPOSE_FILENAME,
+    overrides: Sequence[str] = (),
+) -> List[str]:
+    """Full ``docker-compose`` command line.
+
+    Files passed via `overrides` are merged on top of the main compose file.
+    """
+    files = [file, *overrides]
+    return [
+        "docker-compose",
+        *(arg for filename in files for arg in ("-f", filename)),
+        "-p",
+        project,  # Project names are prefixed to avoid clashing with existing projects
+        *command,
+    ]
 
 
 def compose(
@@ -13,21 +51,18 @@ def compose(
     path: str,
     project: str,
     file: str = DEFAULT_DOCKER_COMPOSE_FILENAME,
+    overrides: Sequence[str] = (),
     check: bool = True,
     **kwargs: Any,
 ) -> subprocess.CompletedProcess:
-    """Run ``docker-compose`` in a subprocess."""
+    """Run ``docker-compose`` in a subprocess.
+
+    Output is captured unless `stdout` is passed explicitly, e.g. as an open file.
+    """
+    kwargs.setdefault("stdout", subprocess.PIPE)
     return subprocess.run(
-        [
-            "docker-compose",
-            "-f",
-            file,
-            "-p",
-            project,  # Project names are prefixed to avoid clashing with existing projects
-            *command,
-        ],
+        compose_command(command, project=project, file=file, overrides=overrides),
         cwd=path,
-        stdout=subprocess.PIPE,
         stderr=subprocess.STDOUT,
         bufsize=0,
         check=check,
@@ -65,8 +100,61 @@ def get_compose_version() -> Union[version.LegacyVersion, version.Version]:
     return version.parse(output.decode("utf8"))
 
 
-def ensure_docker_version() -> None:
-    """Ensure whether the host satisfies minimally required version of Docker & Docker-compose."""
+def get_binaries_key() -> Optional[List[Any]]:
+    """Identify installed Docker & Docker-compose binaries and the version requirements for them.
+
+    `None` if any binary is not found.
+    """
+    key: List[Any] = [MINIMUM_DOCKER_VERSION, MINIMUM_DOCKER_COMPOSE_VERSION]
+    for name in ("docker", "docker-compose"):
+        path = shutil.which(name)
+        if path is None:
+            return None
+        key.extend([os.path.realpath(path), os.stat(path).st_mtime])
+    return key
+
+
+def get_version_cache_path() -> pathlib.Path:
+    return get_cache_dir() / VERSION_CACHE_FILENAME
+
+
+def is_version_check_cached(key: List[Any]) -> bool:
+    try:
+        data = json.loads(get_version_cache_path().read_text())
+    except (OSError, ValueError):
+        return False
+    if not isinstance(data, dict) or data.get("key") != key:
+        return False
+    return time.time() - data.get("checked_at", 0) < VERSION_CACHE_TTL
+
+
+def store_version_check(key: List[Any]) -> None:
+    path = get_version_cache_path()
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Concurrent workers may write the cache at the same time. Replacing the file is atomic
+        with tempfile.NamedTemporaryFile("w", dir=path.parent, delete=False) as fd:
+            json.dump({"key": key, "checked_at": time.time()}, fd)
+        os.replace(fd.name, path)
+    except OSError:
+        # The cache is optional
+        pass
+
+
+@tracing.traced("docker.version_check")
+def ensure_docker_version(*, cached: bool = True) -> None:
+    """Ensure whether the host satisfies minimally required version of Docker & Docker-compose.
+
+    Successful checks are cached on disk until the binaries change or the cache expires,
+    and are not repeated within the same process.
+    """
+    key = get_binaries_key() if cached else None
+    if key is not None:
+        if key in _verified:
+            return
+        if is_version_check_cached(key):
+            _verified.append(key)
+            return
     compose_version = get_compose_version()
     if compose_version < version.parse(MINIMUM_DOCKER_COMPOSE_VERSION):
         raise VersionError(
@@ -78,3 +166,6 @@ def ensure_docker_version() -> None:
         raise VersionError(
             f"Docker {docker_version} is not supported. You need to have at least {MINIMUM_DOCKER_VERSION}"
         )
+    if key is not None:
+        store_version_check(key)
+        _verified.append(key)
@@ -0,0 +1,227 @@
+"""A minimal Docker Engine API client.
+
+It talks to the Docker daemon over its UNIX socket and keeps connections open between requests, which avoids spawning
+a `docker` / `docker-compose` process for every operation on existing containers.
+"""
+import http.client
+import json
+import os
+import queue
+import socket
+import struct
+import subprocess
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, Generator, List, Optional, Tuple
+from urllib.parse import quote, urlencode
+
+import attr
+
+from .constants import DEFAULT_DOCKER_SOCKET
+
+API_VERSION = "v1.41"
+# Idle connections kept open per client
+POOL_SIZE = 4
+PROJECT_LABEL = "com.docker.compose.project"
+SERVICE_LABEL = "com.docker.compose.service"
+NUMBER_LABEL = "com.docker.compose.container-number"
+# Log frames of containers without TTY have this header: stream type, 3 zero bytes, payload size
+FRAME_HEADER = struct.Struct(">BxxxL")
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: Optional[float] = None) -> None:
+        super().__init__("localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self) -> None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.path)
+        self.sock = sock
+
+
+def get_socket_path() -> str:
+    host = os.environ.get("DOCKER_HOST", "")
+    if host.startswith("unix://"):
+        return host[len("unix://") :]
+    return DEFAULT_DOCKER_SOCKET
+
+
+@attr.s()
+class EngineClient:
+    socket_path: str = attr.ib(factory=get_socket_path)
+    # Number of `Compose` operations that were served without spawning a process
+    operations: int = attr.ib(default=0)
+    requests: int = attr.ib(default=0)
+    duration: float = attr.ib(default=0.0)
+    _pool: "queue.LifoQueue[UnixHTTPConnection]" = attr.ib(factory=lambda: queue.LifoQueue(maxsize=POOL_SIZE))
+    _lock: threading.Lock = attr.ib(factory=threading.Lock)
+
+    def _acquire(self) -> UnixHTTPConnection:
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return UnixHTTPConnection(self.socket_path)
+
+    def _release(self, connection: UnixHTTPConnection) -> None:
+        try:
+            self._pool.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+    ) -> Tuple[int, bytes]:
+        url = f"/{API_VERSION}{path}"
+        if params:
+            url += f"?{urlencode(params)}"
+        start = time.perf_counter()
+        connection = self._acquire()
+        connection.timeout = timeout
+        if connection.sock is not None:
+            connection.sock.settimeout(timeout)
+        try:
+            try:
+                connection.request(method, url)
+                response = connection.getresponse()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                # The daemon closed an idle connection
+                connection.close()
+                connection.request(method, url)
+                response = connection.getresponse()
+            body = response.read()
+        except BaseException:
+            connection.close()
+            raise
+        self._release(connection)
+        with self._lock:
+            self.requests += 1
+            self.duration += time.perf_counter() - start
+        return response.status, body
+
+    def call(self, method: str, path: str, ok: Tuple[int, ...] = (), **kwargs: Any) -> bytes:
+        """Send a request and raise `CalledProcessError` on failures, like the CLI backend does."""
+        status, body = self.request(method, path, **kwargs)
+        if status >= 400 and status not in ok:
+            try:
+                message = json.loads(body)["message"]
+            except (ValueError, KeyError):
+                message = body.decode("utf8", errors="replace")
+            raise subprocess.CalledProcessError(
+                1, [method, path], output=f"Error response from daemon: {message}\n".encode()
+            )
+        return body
+
+    def containers(self, project: str, service: Optional[str] = None) -> List[Dict[str, Any]]:
+        """All containers of a docker-compose project, including stopped ones."""
+        labels = [f"{PROJECT_LABEL}={project}"]
+        if service is not None:
+            labels.append(f"{SERVICE_LABEL}={service}")
+        params = {"all": "1", "filters": json.dumps({"label": labels})}
+        return json.loads(self.call("GET", "/containers/json", params=params))
+
+    def start(self, container: str) -> None:
+        # 304 - already started
+        self.call("POST", f"/containers/{container}/start", ok=(304,))
+
+    def stop(self, container: str, timeout: int = 10) -> None:
+        # 304 - already stopped
+        self.call("POST", f"/containers/{container}/stop", ok=(304,), params={"t": timeout}, timeout=timeout + 60)
+
+    def restart(self, container: str, timeout: int = 10) -> None:
+        self.call("POST", f"/containers/{container}/restart", params={"t": timeout}, timeout=timeout + 60)
+
+    def wait(self, container: str) -> int:
+        """Block until the container stops and return its exit code."""
+        return json.loads(self.call("POST", f"/containers/{container}/wait"))["StatusCode"]
+
+    def remove(self, container: str) -> None:
+        # 404 - already removed
+        self.call("DELETE", f"/containers/{container}", ok=(404,), params={"force": "1", "v": "1"})
+
+    def remove_network(self, name: str) -> None:
+        self.call("DELETE", f"/networks/{quote(name)}")
+
+    def inspect(self, container: str) -> Dict[str, Any]:
+        return json.loads(self.call("GET", f"/containers/{container}/json"))
+
+    def stats(self, container: str) -> Generator[Dict[str, Any], None, None]:
+        """Stream resource usage of a running container. The daemon sends a new entry every second.
+
+        A dedicated connection is used, and it is closed when the generator is closed.
+        """
+        connection = UnixHTTPConnection(self.socket_path)
+        try:
+            connection.request("GET", f"/{API_VERSION}/containers/{container}/stats?stream=1")
+            response = connection.getresponse()
+            if response.status != 200:
+                return
+            for line in response:
+                if line.strip():
+                    yield json.loads(line)
+        finally:
+            connection.close()
+
+    def logs(self, container: str, timestamps: bool = True) -> bytes:
+        params = {"stdout": "1", "stderr": "1", "timestamps": "1" if timestamps else "0"}
+        return demultiplex(self.call("GET", f"/containers/{container}/logs", params=params))
+
+
+def demultiplex(data: bytes) -> bytes:
+    """Join payloads of multiplexed stdout / stderr frames.
+
+    Containers with TTY have raw output without frames.
+    """
+    if not data or data[0] not in (0, 1, 2) or data[1:4] != b"\0\0\0":
+        return data
+    chunks = []
+    offset = 0
+    while offset + FRAME_HEADER.size <= len(data):
+        _, size = FRAME_HEADER.unpack_from(data, offset)
+        offset += FRAME_HEADER.size
+        chunks.append(data[offset : offset + size])
+        offset += size
+    return b"".join(chunks)
+
+
+@lru_cache()
+def get_client() -> EngineClient:
+    """Shared client, so connections are pooled across all components in the process."""
+    return EngineClient()
+
+
+@lru_cache()
+def get_spawn_overhead() -> float:
+    """Time it takes to run a trivial `docker-compose` command.
+
+    `0.0` if the command fails - then nothing is known about the avoided overhead.
+    """
+    start = time.perf_counter()
+    try:
+        completed = subprocess.run(
+            ["docker-compose", "version", "--short"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False
+        )
+    except OSError:
+        return 0.0
+    if completed.returncode != 0:
+        return 0.0
+    return time.perf_counter() - start
+
+
+def get_usage_report() -> Dict[str, Any]:
+    """How much process spawning was avoided by using the Engine API."""
+    client = get_client()
+    overhead = get_spawn_overhead()
+    return {
+        "operations": client.operations,
+        "requests": client.requests,
+        "api_duration": round(client.duration, 3),
+        "spawn_overhead": round(overhead, 3),
+        "saved": round(max(client.operations * overhead - client.duration, 0.0), 2),
+    }
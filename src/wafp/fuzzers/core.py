@@ -10,14 +10,22 @@ from typing import Any, Dict, Generator, List, Optional, Tuple, Type, Union
 
 import attr
 
+from .. import tracing
 from ..artifacts import Artifact, ArtifactType
 from ..base import Component
 from ..constants import DEFAULT_FUZZER_SERVICE_NAME, TEMPORARY_DIRECTORY_PREFIX
-from ..targets.network import unused_port
+from ..limits import Limits
+from ..targets.network import release_port, reserve_port
 from ..utils import NOT_SET, NotSet, is_url
 
 
 class BaseFuzzer(abc.ABC, Component):
+    def __init__(self, limits: Optional[Limits] = None, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.limits = limits
+        # Ports of auxiliary services, released on cleanup
+        self._ports: List[int] = []
+
     def get_entrypoint(self) -> Union[str, NotSet]:
         """Default docker-compose service entrypoint."""
         return NOT_SET
@@ -40,7 +48,13 @@ class BaseFuzzer(abc.ABC, Component):
 
     def get_fuzzer_context(self, target: Optional[str] = None) -> "FuzzerContext":
         input_directory, output_directory = self.get_input_output_directories()
-        return FuzzerContext(input_directory=input_directory, output_directory=output_directory, target=target)
+        return FuzzerContext(
+            input_directory=input_directory,
+            output_directory=output_directory,
+            # Not inside `output_directory`, as everything there is collected via `collect_artifacts`
+            stdout_path=input_directory.parent / "stdout.txt",
+            target=target,
+        )
 
     def get_container_input_directory(self) -> pathlib.Path:
         return pathlib.Path("/tmp/wafp/input")
@@ -83,19 +97,23 @@ class BaseFuzzer(abc.ABC, Component):
         if build:
             self.build()
         context = self.get_fuzzer_context(target)
-        schema_location = self.prepare_schema(context, schema)
+        with tracing.span("fuzzer.prepare_schema", component=self.full_name):
+            schema_location = self.prepare_schema(context, schema)
         headers = headers or {}
         info: Dict[str, Any] = {"schema_location": schema_location, "base_url": base_url}
         if headers:
             info["headers"] = headers
         self.logger.info("Start fuzzer", **info)
         start = time.perf_counter()
-        completed_process = self.compose.run(
-            service=self.get_fuzzer_service_name(),
-            args=self.get_entrypoint_args(context, schema_location, base_url, headers, ssl_insecure),
-            entrypoint=self.get_entrypoint(),
-            volumes=self.get_volumes(context),
-        )
+        # Some fuzzers produce gigabytes of output, therefore it is written directly to disk
+        with context.stdout_path.open("wb") as stdout, tracing.span("fuzzer.run", component=self.full_name):
+            completed_process = self.compose.run(
+                service=self.get_fuzzer_service_name(),
+                args=self.get_entrypoint_args(context, schema_location, base_url, headers, ssl_insecure),
+                entrypoint=self.get_entrypoint(),
+                volumes=self.get_volumes(context),
+                stdout=stdout,
+            )
         duration = round(time.perf_counter() - start, 2)
         self.logger.info("Finish fuzzer", returncode=completed_process.returncode, duration=duration)
         return FuzzResult(fuzzer=self, completed_process=completed_process, context=context, duration=duration)
@@ -125,12 +143,19 @@ class BaseFuzzer(abc.ABC, Component):
     def serve_spec(self, context: "FuzzerContext", schema: str) -> str:
         # The schema is served via a static file server
         copy2(schema, context.input_directory)
-        port = unused_port()
+        port = reserve_port()
+        self._ports.append(port)
         # The service should be stopped by calling `cleanup` after fuzzing is done
         self.compose.up(services=["static"], extra_env={"SERVE_INDEX": str(context.input_directory), "PORT": str(port)})
         filename = pathlib.Path(schema).name
         return f"http://0.0.0.0:{port}/{filename}"
 
+    def cleanup(self) -> None:
+        super().cleanup()
+        for port in self._ports:
+            release_port(port)
+        self._ports.clear()
+
     @abc.abstractmethod
     def get_entrypoint_args(
         self,
@@ -147,10 +172,11 @@ class BaseFuzzer(abc.ABC, Component):
         """Collect, clean and store all fuzzer's artifacts."""
         if isinstance(output_dir, str):
             output_dir = pathlib.Path(output_dir)
-        raw_artifacts = result.collect_artifacts()
-        output_dir.mkdir(exist_ok=True)
-        for artifact in raw_artifacts:
-            artifact.save_to(output_dir)
+        with tracing.span("fuzzer.artifacts", component=self.full_name):
+            raw_artifacts = result.collect_artifacts()
+            output_dir.mkdir(exist_ok=True)
+            for artifact in raw_artifacts:
+                artifact.save_to(output_dir)
         return raw_artifacts
 
     def collect_artifacts(self, temp_dir: pathlib.Path) -> List[Artifact]:
@@ -164,6 +190,8 @@ class FuzzerContext:
 
     input_directory: pathlib.Path = attr.ib()
     output_directory: pathlib.Path = attr.ib()
+    # Fuzzer's stdout & stderr
+    stdout_path: pathlib.Path = attr.ib()
     target: Optional[str] = attr.ib(default=None)
 
 
@@ -173,18 +201,22 @@ class FuzzResult:
 
     # Fuzzer itself
     fuzzer: BaseFuzzer = attr.ib()
-    # Finished `docker-compose run` call
+    # Finished `docker-compose run` call. Its output is stored in `context.stdout_path`
     completed_process: subprocess.CompletedProcess = attr.ib()
     # Temporary directory that is expected to have all container's output - logs, failing test cases, etc
     context: FuzzerContext = attr.ib()
     # How long did the fuzzing process take in seconds
     duration: float = attr.ib()
+    # Throughput, latencies & statuses of the fuzzer's requests, if they were sent through the metering proxy
+    traffic: Optional[Dict[str, Any]] = attr.ib(default=None)
+    # CPU, memory & I/O usage of the target's and the fuzzer's containers, if they were sampled
+    resources: Optional[Dict[str, Any]] = attr.ib(default=None)
 
     def collect_artifacts(self) -> List[Artifact]:
         """Extract fuzz run's artifacts."""
         # Get stdout & delegate the rest to the fuzzer.
         artifacts = [
-            Artifact.stdout(self.completed_process.stdout),
+            Artifact.stdout(self.context.stdout_path),
             *self.fuzzer.collect_artifacts(self.context.output_directory),
         ]
         self.fuzzer.logger.info(
@@ -199,6 +231,7 @@ class FuzzResult:
         try:
             rmtree(self.context.input_directory)
             rmtree(self.context.output_directory)
+            self.context.stdout_path.unlink()
         except OSError:
             pass
 
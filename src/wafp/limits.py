@@ -0,0 +1,104 @@
+"""CPU & memory limits for all containers of a component.
+
+Concurrent runs on the same host compete for CPUs, caches & memory, which distorts comparisons between fuzzers.
+Limits are applied by a compose override file, therefore they hold for containers created by both `docker-compose up`
+and `docker-compose run`.
+"""
+import pathlib
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import attr
+import yaml
+
+from . import build
+
+
+@attr.s(slots=True, frozen=True)
+class Limits:
+    # CPUs the containers may run on, in the `cpuset` format, e.g. `0-3,8`
+    cpuset: Optional[str] = attr.ib(default=None)
+    # CPU time quota, e.g. `1.5` is one and a half CPUs
+    cpus: Optional[float] = attr.ib(default=None)
+    # In bytes
+    memory: Optional[int] = attr.ib(default=None)
+
+    def split(self, count: int) -> "Limits":
+        """Limits for each of `count` containers, so together they stay within these ones.
+
+        Compose applies limits to every container separately. The split is even, as the needs of individual services
+        are not known in advance.
+        """
+        return attr.evolve(
+            self,
+            cpus=self.cpus / count if self.cpus is not None else None,
+            memory=self.memory // count if self.memory is not None else None,
+        )
+
+    def to_service(self) -> Dict[str, Any]:
+        """Options for a compose service.
+
+        `docker-compose` >= 1.27 accepts them for all file format versions, including `3.x`.
+        """
+        service: Dict[str, Any] = {}
+        if self.cpuset is not None:
+            service["cpuset"] = self.cpuset
+        if self.cpus is not None:
+            service["cpus"] = self.cpus
+        if self.memory is not None:
+            service["mem_limit"] = self.memory
+            # Otherwise, containers may use swap on top of the limit
+            service["memswap_limit"] = self.memory
+        return service
+
+    def to_args(self) -> List[str]:
+        """Arguments for the `wafp` CLI."""
+        args = []
+        if self.cpuset is not None:
+            args.append(f"--cpuset={self.cpuset}")
+        if self.cpus is not None:
+            args.append(f"--cpus={self.cpus}")
+        if self.memory is not None:
+            args.append(f"--memory={self.memory}")
+        return args
+
+    def get_overrides_path(self, cache_dir: pathlib.Path, path: pathlib.Path, compose_file: str) -> str:
+        """Compose file that applies the limits to all services."""
+        definition = yaml.safe_load((path / compose_file).read_text()) or {}
+        service = self.to_service()
+        override = {
+            "version": build.get_compose_version(path / compose_file),
+            "services": {name: service for name in definition.get("services") or {}},
+        }
+        return build.store_overrides(cache_dir, override)
+
+
+def parse_cpuset(value: str) -> List[int]:
+    """Convert a CPU list to CPU numbers.
+
+    E.g. "0-2,5" => [0, 1, 2, 5]
+    """
+    cpus: Set[int] = set()
+    try:
+        for part in value.split(","):
+            start, _, end = part.strip().partition("-")
+            first, last = int(start), int(end or start)
+            if first < 0 or first > last:
+                raise ValueError
+            cpus.update(range(first, last + 1))
+    except ValueError:
+        raise ValueError(f"Invalid CPU set: {value}") from None
+    return sorted(cpus)
+
+
+def format_cpuset(cpus: Iterable[int]) -> str:
+    """Convert CPU numbers to a CPU list with ranges.
+
+    E.g. [0, 1, 2, 5] => "0-2,5"
+    """
+    ranges: List[List[int]] = []
+    for cpu in sorted(set(cpus)):
+        if ranges and ranges[-1][1] == cpu - 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ",".join(str(first) if first == last else f"{first}-{last}" for first, last in ranges)
@@ -1,63 +1,166 @@
 import inspect
+import json
+import os
+import pathlib
 import re
 from pkgutil import iter_modules
 from types import ModuleType
-from typing import Generator, List, Optional, TypeVar
+from typing import Any, Dict, Generator, Generic, List, Optional, Tuple, TypeVar
+
+import attr
 
 from .errors import AmbiguousItemNameError
+from .utils import get_cache_dir
 
 T = TypeVar("T", bound=type)
 COLLECTION_ATTRIBUTE_NAME = "__collect__"
+# Names of variants in every catalog package, so listing them does not require importing all packages
+INDEX_FILENAME = "catalog-index.json"
+
+
+@attr.s()
+class Registry(Generic[T]):
+    """Variants of a single catalog.
+
+    Packages are imported & scanned once, and every resolved name is memoized for the lifetime of the registry.
+    """
+
+    base: T = attr.ib()
+    catalog: str = attr.ib()
+    # Package name -> its variants
+    _packages: Dict[str, List[T]] = attr.ib(factory=dict, init=False)
+    # `package:Variant` or `package` -> variant
+    _variants: Dict[str, Optional[T]] = attr.ib(factory=dict, init=False)
+
+    def load_all_variants(self, name: str) -> List[T]:
+        if name not in self._packages:
+            try:
+                module = __import__(f"{self.catalog}.{name}", fromlist=[name])
+            except ModuleNotFoundError:
+                self._packages[name] = []
+            else:
+                self._packages[name] = list(iter_children(module, base=self.base))
+        return self._packages[name]
+
+    def by_name(self, name: str) -> Optional[T]:
+        if name not in self._variants:
+            self._variants[name] = self._resolve(name)
+        return self._variants[name]
+
+    def _resolve(self, name: str) -> Optional[T]:
+        package_name, variant_name = (re.split(r":(?![\\/])", name, 1) + [""])[:2]
+        variants = self.load_all_variants(package_name)
+        if variant_name:
+            for variant in variants:
+                if variant.__name__ == variant_name:
+                    return variant
+            return None
+        if len(variants) == 1:
+            # Default variant
+            return variants[0]
+        if not variants:
+            return None
+        variant_names = ", ".join([f"{name}:{variant.__name__}" for variant in variants])
+        raise AmbiguousItemNameError(
+            f"`{name}` defines multiple variants, and it is not clear which one to load. "
+            f"You need to specify a fully qualified name. "
+            f"Variants: {variant_names}"
+        )
+
+
+_registries: Dict[Tuple[type, str], Registry] = {}
+
+
+def get_registry(*, base: T, catalog: Optional[str], default_catalog: ModuleType) -> Registry[T]:
+    """Registry shared by all callers within the process."""
+    catalog_name = catalog if catalog is not None else default_catalog.__name__
+    key = (base, catalog_name)
+    if key not in _registries:
+        _registries[key] = Registry(base=base, catalog=catalog_name)
+    return _registries[key]
+
+
+def invalidate() -> None:
+    """Forget all resolved variants, e.g. after catalog packages were changed or reloaded."""
+    _registries.clear()
 
 
 def by_name(name: str, *, base: T, catalog: Optional[str], default_catalog: ModuleType) -> Optional[T]:
     """Get a item variant by name."""
-    package_name, variant_name = (re.split(r":(?![\\/])", name, 1) + [""])[:2]
-    variants = load_all_variants(package_name, base=base, catalog=catalog, default_catalog=default_catalog)
-    if variant_name:
-        for variant in variants:
-            if variant.__name__ == variant_name:
-                return variant
-        return None
-    if len(variants) == 1:
-        # Default variant
-        return variants[0]
-    if not variants:
-        return None
-    variant_names = ", ".join([f"{name}:{variant.__name__}" for variant in variants])
-    raise AmbiguousItemNameError(
-        f"`{name}` defines multiple variants, and it is not clear which one to load. "
-        f"You need to specify a fully qualified name. "
-        f"Variants: {variant_names}"
-    )
+    return get_registry(base=base, catalog=catalog, default_catalog=default_catalog).by_name(name)
 
 
 def load_all_variants(name: str, *, base: T, catalog: Optional[str], default_catalog: ModuleType) -> List[T]:
-    """Load all variants for an item."""
-    if catalog is not None:
-        try:
-            module = __import__(f"{catalog}.{name}", fromlist=[name])
-        except ModuleNotFoundError:
-            return []
-    else:
-        module = getattr(default_catalog, name, None)
-        if module is None:
-            return []
-    return list(iter_children(module, base=base))
+    """Load all variants for an item. Only the requested package is imported."""
+    return list(get_registry(base=base, catalog=catalog, default_catalog=default_catalog).load_all_variants(name))
 
 
 def get_all_variants(*, base: T, catalog: ModuleType) -> Generator[str, None, None]:
     """Iterate over all items and all their variants."""
+    for name, variants in get_index(base=base, catalog=catalog).items():
+        if len(variants) == 1:
+            # Yield only the base name if there is a single variant
+            yield name
+        else:
+            yield from (f"{name}:{variant}" for variant in variants)
+
+
+def get_index(*, base: T, catalog: ModuleType) -> Dict[str, List[str]]:
+    """Variant names for every package in the catalog.
+
+    The index is cached on disk. Only packages whose modules have changed since the last invocation are imported.
+    """
+    path = get_cache_dir() / INDEX_FILENAME
+    key = f"{catalog.__name__}:{base.__module__}.{base.__qualname__}"
+    cache = read_index(path)
+    cached = cache.get(key, {})
+    entries = {}
     # https://github.com/python/mypy/issues/1422
     for module_info in iter_modules(catalog.__path__):  # type: ignore
-        if module_info.ispkg:
+        if not module_info.ispkg:
+            continue
+        signature = get_signature(pathlib.Path(module_info.module_finder.path) / module_info.name)  # type: ignore
+        entry = cached.get(module_info.name)
+        if entry is None or entry["signature"] != signature:
             module = __import__(f"{catalog.__name__}.{module_info.name}", fromlist=[module_info.name])
-            items = [f"{module_info.name}:{cls.__name__}" for cls in iter_children(module, base=base)]
-            if len(items) == 1:
-                # Yield only the base name if there is a single variant
-                yield module_info.name
-            else:
-                yield from items
+            entry = {"signature": signature, "variants": [cls.__name__ for cls in iter_children(module, base=base)]}
+        entries[module_info.name] = entry
+    if entries != cached:
+        cache[key] = entries
+        write_index(path, cache)
+    return {name: entry["variants"] for name, entry in entries.items()}
+
+
+def get_signature(package: pathlib.Path) -> List[Any]:
+    """Modification times of top-level modules of a package, where variants are defined."""
+    signature: List[Any] = [str(package)]
+    with os.scandir(package) as entries:
+        for entry in sorted(entries, key=lambda item: item.name):
+            if entry.name.endswith(".py") and entry.is_file():
+                stat = entry.stat()
+                signature.append([entry.name, stat.st_mtime_ns, stat.st_size])
+    return signature
+
+
+def read_index(path: pathlib.Path) -> Dict[str, Any]:
+    try:
+        with path.open() as fd:
+            data = json.load(fd)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def write_index(path: pathlib.Path, data: Dict[str, Any]) -> None:
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_suffix(f".{os.getpid()}.tmp")
+        temporary.write_text(json.dumps(data))
+        # Concurrent processes may update the index at the same time. Replacing is atomic
+        os.replace(temporary, path)
+    except OSError:
+        # The index is only an optimization
+        pass
 
 
 def iter_children(module: ModuleType, base: T) -> Generator[T, None, None]:
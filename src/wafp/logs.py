@@ -0,0 +1,106 @@
+"""Incremental following of container logs."""
+import os
+import queue
+import subprocess
+import threading
+import time
+from typing import IO, Any, Generator, List, Optional, Set
+
+import attr
+
+# How many chunks of lines may be read ahead of the consumer. The reader blocks when the buffer is full
+DEFAULT_BUFFER_SIZE = 64
+READ_SIZE = 64 * 1024
+# Pause before re-spawning a follower process that exited early, e.g. because containers are not created yet
+RESPAWN_DELAY = 0.5
+
+
+@attr.s()
+class LogFollower:
+    """Follow the output of a long-running process, e.g. `docker-compose logs -f`.
+
+    Lines are read by a background thread into a bounded buffer, so the consumer receives them as soon as they are
+    printed, without re-reading the whole history.
+    """
+
+    command: List[str] = attr.ib()
+    buffer_size: int = attr.ib(default=DEFAULT_BUFFER_SIZE)
+    kwargs: Any = attr.ib(factory=dict)
+    _process: Optional[subprocess.Popen] = attr.ib(default=None, init=False)
+    _buffer: "queue.Queue[Optional[List[bytes]]]" = attr.ib(init=False)
+    _stop: threading.Event = attr.ib(factory=threading.Event, init=False)
+
+    def __attrs_post_init__(self) -> None:
+        self._buffer = queue.Queue(maxsize=self.buffer_size)
+
+    def _spawn(self) -> None:
+        self._process = subprocess.Popen(
+            self.command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, bufsize=0, **self.kwargs
+        )
+        threading.Thread(target=self._read, args=(self._process.stdout,), daemon=True).start()
+
+    def _read(self, stream: IO[bytes]) -> None:
+        # Lines are passed in chunks - a queue operation per line is too slow for chatty targets
+        pending = b""
+        while True:
+            chunk = os.read(stream.fileno(), READ_SIZE)
+            if not chunk:
+                break
+            lines = (pending + chunk).split(b"\n")
+            pending = lines.pop()
+            if not self._put([line.rstrip(b"\r") for line in lines]):
+                break
+        if pending:
+            self._put([pending.rstrip(b"\r")])
+        stream.close()
+        # Marks the end of the process output
+        self._put(None)
+
+    def _put(self, item: Optional[List[bytes]]) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def follow(self, deadline: float, streamed: Optional[Set[bytes]] = None) -> Generator[bytes, None, None]:
+        """Yield unique lines until the deadline.
+
+        If the process exits before the deadline, it is started again and only lines that were not yielded yet
+        are passed through. Lines in `streamed` are skipped, and all yielded lines are added to it.
+        """
+        if streamed is None:
+            streamed = set()
+        self._spawn()
+        try:
+            while True:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return
+                try:
+                    lines = self._buffer.get(timeout=remaining)
+                except queue.Empty:
+                    return
+                if lines is None:
+                    time.sleep(min(RESPAWN_DELAY, max(deadline - time.time(), 0)))
+                    self._spawn()
+                    continue
+                for line in lines:
+                    # Set lookup keeps deduplication linear in the log size
+                    if line and line not in streamed:
+                        streamed.add(line)
+                        yield line
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._process is not None and self._process.poll() is None:
+            self._process.terminate()
+            try:
+                self._process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+                self._process.wait()
@@ -0,0 +1,329 @@
+"""Resource usage of a run's containers.
+
+A background thread samples CPU time, memory, network & block I/O of the target's and the fuzzer's containers at
+a fixed interval. Counters are read directly from the containers' cgroup files, which costs a few small file reads per
+container and sample. If cgroups of the containers are not visible to WAFP (e.g. Docker Desktop or a remote daemon),
+the Docker stats stream is used instead - a single long-lived connection per container, with a new entry every second.
+Containers are discovered by their compose project labels, so the fuzzer's container is picked up once it starts.
+"""
+import json
+import pathlib
+import re
+import subprocess
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import attr
+import structlog
+
+from . import engine
+
+logger = structlog.get_logger()
+
+RESOURCES_FILENAME = "resources.json"
+DEFAULT_INTERVAL = 1.0
+CGROUP_ROOT = pathlib.Path("/sys/fs/cgroup")
+PROC_ROOT = pathlib.Path("/proc")
+# New containers are looked up at most this often, in seconds
+DISCOVERY_INTERVAL = 1.0
+# CPU time in nanoseconds, memory (RSS) in bytes, network & block I/O in bytes. Counters are cumulative
+FIELDS = ("cpu", "memory", "received", "sent", "read", "written")
+Sample = Tuple[int, int, Optional[int], Optional[int], int, int]
+
+
+def get_project_label(project_name: str) -> str:
+    """Project name as `docker-compose` stores it in container labels."""
+    return re.sub(r"[^-_a-z0-9]", "", project_name.lower())
+
+
+def read_keys(path: pathlib.Path) -> Dict[str, int]:
+    """Files like `memory.stat` - a key & a number per line."""
+    values = {}
+    for line in path.read_text().splitlines():
+        key, _, value = line.partition(" ")
+        if value.strip().isdigit():
+            values[key] = int(value)
+    return values
+
+
+def read_network(pid: int, proc_root: pathlib.Path = PROC_ROOT) -> Tuple[int, int]:
+    """Bytes received & sent on all interfaces in the network namespace of `pid`, except loopback."""
+    received = sent = 0
+    for line in (proc_root / str(pid) / "net" / "dev").read_text().splitlines()[2:]:
+        interface, _, counters = line.partition(":")
+        if interface.strip() == "lo":
+            continue
+        values = counters.split()
+        received += int(values[0])
+        sent += int(values[8])
+    return received, sent
+
+
+@attr.s()
+class CgroupSource:
+    """Counters of a container read from its cgroup files. Supports both cgroup v1 & v2."""
+
+    # cgroup v2 has a single directory, v1 has a directory per controller
+    directories: Dict[str, pathlib.Path] = attr.ib()
+    version: int = attr.ib()
+    # Network counters are read from the namespace of this process. None for containers in the host network
+    pid: Optional[int] = attr.ib(default=None)
+    proc_root: pathlib.Path = attr.ib(default=PROC_ROOT)
+
+    @classmethod
+    def find(
+        cls,
+        container_id: str,
+        pid: Optional[int],
+        root: pathlib.Path = CGROUP_ROOT,
+        proc_root: pathlib.Path = PROC_ROOT,
+    ) -> Optional["CgroupSource"]:
+        # Cgroup paths of the `systemd` & `cgroupfs` drivers
+        suffixes = (f"system.slice/docker-{container_id}.scope", f"docker/{container_id}")
+        if (root / "cgroup.controllers").exists():
+            for suffix in suffixes:
+                if (root / suffix).is_dir():
+                    return cls({"": root / suffix}, version=2, pid=pid, proc_root=proc_root)
+            return None
+        directories = {}
+        for controller, names in (("cpu", ("cpuacct", "cpu,cpuacct")), ("memory", ("memory",)), ("io", ("blkio",))):
+            for name in names:
+                for suffix in suffixes:
+                    if (root / name / suffix).is_dir():
+                        directories[controller] = root / name / suffix
+        if len(directories) < 3:
+            return None
+        return cls(directories, version=1, pid=pid, proc_root=proc_root)
+
+    def read(self) -> Optional[Sample]:
+        try:
+            if self.version == 2:
+                directory = self.directories[""]
+                cpu = read_keys(directory / "cpu.stat")["usage_usec"] * 1000
+                memory = read_keys(directory / "memory.stat").get("anon", 0)
+                read = written = 0
+                for line in (directory / "io.stat").read_text().splitlines():
+                    for item in line.split()[1:]:
+                        key, _, value = item.partition("=")
+                        if key == "rbytes":
+                            read += int(value)
+                        elif key == "wbytes":
+                            written += int(value)
+            else:
+                cpu = int((self.directories["cpu"] / "cpuacct.usage").read_text())
+                stat = read_keys(self.directories["memory"] / "memory.stat")
+                memory = stat.get("total_rss", stat.get("rss", 0))
+                read = written = 0
+                for line in (self.directories["io"] / "blkio.throttle.io_service_bytes").read_text().splitlines():
+                    parts = line.split()
+                    if len(parts) == 3 and parts[1] == "Read":
+                        read += int(parts[2])
+                    elif len(parts) == 3 and parts[1] == "Write":
+                        written += int(parts[2])
+            received: Optional[int] = None
+            sent: Optional[int] = None
+            if self.pid is not None:
+                received, sent = read_network(self.pid, self.proc_root)
+        except (OSError, KeyError, ValueError, IndexError):
+            # The container is stopped
+            return None
+        return cpu, memory, received, sent, read, written
+
+    def close(self) -> None:
+        pass
+
+
+def from_stats(stats: Dict[str, Any]) -> Optional[Sample]:
+    """Convert an entry of the Docker stats stream."""
+    cpu = (stats.get("cpu_stats") or {}).get("cpu_usage", {}).get("total_usage")
+    if not cpu:
+        # Entries of stopped containers are empty
+        return None
+    memory_stats = stats.get("memory_stats") or {}
+    details = memory_stats.get("stats") or {}
+    memory = details.get("anon", details.get("total_rss", details.get("rss", memory_stats.get("usage", 0))))
+    received: Optional[int] = None
+    sent: Optional[int] = None
+    networks = stats.get("networks")
+    if networks:
+        received = sum(network.get("rx_bytes", 0) for network in networks.values())
+        sent = sum(network.get("tx_bytes", 0) for network in networks.values())
+    read = written = 0
+    for entry in (stats.get("blkio_stats") or {}).get("io_service_bytes_recursive") or ():
+        operation = entry.get("op", "").lower()
+        if operation == "read":
+            read += entry.get("value", 0)
+        elif operation == "write":
+            written += entry.get("value", 0)
+    return cpu, memory, received, sent, read, written
+
+
+@attr.s()
+class StreamSource:
+    """The latest entry of the Docker stats stream of a container, updated by a background thread."""
+
+    client: engine.EngineClient = attr.ib()
+    container_id: str = attr.ib()
+    _latest: Optional[Sample] = attr.ib(default=None, init=False)
+    _stop: threading.Event = attr.ib(factory=threading.Event, init=False)
+
+    def __attrs_post_init__(self) -> None:
+        threading.Thread(target=self._follow, daemon=True).start()
+
+    def _follow(self) -> None:
+        try:
+            for stats in self.client.stats(self.container_id):
+                self._latest = from_stats(stats)
+                if self._stop.is_set():
+                    break
+        except (OSError, ValueError):
+            pass
+
+    def read(self) -> Optional[Sample]:
+        return self._latest
+
+    def close(self) -> None:
+        # The stream is closed when the next entry arrives
+        self._stop.set()
+
+
+@attr.s()
+class Series:
+    """Samples of a single container. Counters are stored relative to the first sample."""
+
+    name: str = attr.ib()
+    service: str = attr.ib()
+    role: str = attr.ib()
+    source: Any = attr.ib()
+    times: List[float] = attr.ib(factory=list)
+    values: Dict[str, List[int]] = attr.ib(factory=lambda: {field: [] for field in FIELDS})
+    _first: Optional[Sample] = attr.ib(default=None)
+
+    def add(self, elapsed: float, sample: Sample) -> None:
+        if self._first is None:
+            self._first = sample
+        self.times.append(round(elapsed, 3))
+        for index, field in enumerate(FIELDS):
+            value, first = sample[index], self._first[index]
+            if field == "memory":
+                self.values[field].append(value or 0)
+            elif value is not None and first is not None:
+                self.values[field].append(value - first)
+
+    def has_network(self) -> bool:
+        return bool(self.values["received"])
+
+    def to_dict(self) -> Dict[str, Any]:
+        values = {field: series for field, series in self.values.items() if series}
+        return {"name": self.name, "service": self.service, "role": self.role, "t": self.times, **values}
+
+
+@attr.s()
+class ResourceMonitor:
+    """Samples containers of the given compose projects. Projects map to their roles, e.g. "target" or "fuzzer"."""
+
+    projects: Dict[str, str] = attr.ib()
+    interval: float = attr.ib(default=DEFAULT_INTERVAL)
+    client: engine.EngineClient = attr.ib(factory=engine.get_client)
+    cgroup_root: pathlib.Path = attr.ib(default=CGROUP_ROOT)
+    proc_root: pathlib.Path = attr.ib(default=PROC_ROOT)
+    series: Dict[str, Series] = attr.ib(factory=dict, init=False)
+    # Peak of the total memory of all containers of a role
+    peaks: Dict[str, int] = attr.ib(factory=dict, init=False)
+    _started_at: float = attr.ib(default=0.0, init=False, repr=False)
+    _discovered_at: float = attr.ib(default=0.0, init=False, repr=False)
+    _stop: threading.Event = attr.ib(factory=threading.Event, init=False, repr=False)
+    _thread: Optional[threading.Thread] = attr.ib(default=None, init=False, repr=False)
+
+    def start(self) -> None:
+        self._started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        # The last sample, so short runs have at least one
+        self.sample()
+        for series in self.series.values():
+            series.source.close()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                self.sample()
+            except (OSError, subprocess.CalledProcessError, ValueError) as exc:
+                logger.warning("Failed to sample container resources", error=str(exc))
+            self._stop.wait(max(self.interval - (time.monotonic() - started), 0.0))
+
+    def discover(self) -> None:
+        for project, role in self.projects.items():
+            for container in self.client.containers(get_project_label(project)):
+                if container["Id"] in self.series or container.get("State") != "running":
+                    continue
+                details = self.client.inspect(container["Id"])
+                host_network = details.get("HostConfig", {}).get("NetworkMode") == "host"
+                pid = None if host_network else details.get("State", {}).get("Pid") or None
+                source: Any = CgroupSource.find(container["Id"], pid, self.cgroup_root, self.proc_root)
+                if source is None:
+                    source = StreamSource(self.client, container["Id"])
+                self.series[container["Id"]] = Series(
+                    name=container["Names"][0].lstrip("/"),
+                    service=container.get("Labels", {}).get(engine.SERVICE_LABEL, ""),
+                    role=role,
+                    source=source,
+                )
+
+    def sample(self) -> None:
+        now = time.monotonic()
+        if now - self._discovered_at >= DISCOVERY_INTERVAL:
+            self._discovered_at = now
+            self.discover()
+        elapsed = now - self._started_at
+        totals: Dict[str, int] = {}
+        for series in self.series.values():
+            sample = series.source.read()
+            if sample is None:
+                continue
+            series.add(elapsed, sample)
+            totals[series.role] = totals.get(series.role, 0) + sample[1]
+        for role, memory in totals.items():
+            self.peaks[role] = max(self.peaks.get(role, 0), memory)
+
+    def summary(self) -> Dict[str, Any]:
+        """Usage per role - CPU seconds, peak memory (RSS) and bytes transferred over the network & block devices."""
+        roles: Dict[str, Dict[str, Any]] = {}
+        for series in self.series.values():
+            if not series.times:
+                continue
+            role = roles.setdefault(
+                series.role,
+                {
+                    "containers": 0,
+                    "cpu_seconds": 0.0,
+                    "peak_memory": self.peaks.get(series.role, 0),
+                    "read": 0,
+                    "written": 0,
+                },
+            )
+            role["containers"] += 1
+            role["cpu_seconds"] += series.values["cpu"][-1] / 1e9
+            role["read"] += series.values["read"][-1]
+            role["written"] += series.values["written"][-1]
+            if series.has_network():
+                role["received"] = role.get("received", 0) + series.values["received"][-1]
+                role["sent"] = role.get("sent", 0) + series.values["sent"][-1]
+        for role in roles.values():
+            role["cpu_seconds"] = round(role["cpu_seconds"], 3)
+        return roles
+
+    def store(self, path: pathlib.Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = {"interval": self.interval, "containers": [series.to_dict() for series in self.series.values()]}
+        with path.open("w") as fd:
+            json.dump(data, fd, separators=(",", ":"))
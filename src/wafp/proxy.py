@@ -0,0 +1,564 @@
+"""A metering reverse proxy between a fuzzer and a target.
+
+The proxy runs in the WAFP process on a host port, and the fuzzer is pointed to it instead of the target. Fuzzers use
+the host network, so the proxy is reachable the same way as the target itself. Every request is forwarded as is
+(only `Host` is rewritten to the target's address) and recorded into a columnar log:
+
+    MAGIC | chunk* | footer (JSON) | footer offset (u64) | MAGIC
+
+where every chunk is the number of rows (u32) followed by the bytes of each column, in the order given in the footer.
+The footer also contains tables of HTTP methods & path templates that the `method` and `template` columns refer to.
+
+Usage: python -m wafp.proxy summary <path-to-requests.bin>
+"""
+import argparse
+import asyncio
+import json
+import math
+import pathlib
+import re
+import ssl
+import struct
+import sys
+import threading
+import time
+from array import array
+from collections import Counter
+from typing import Any, AsyncGenerator, BinaryIO, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+import attr
+import structlog
+
+from .targets.network import release_port, reserve_port
+
+logger = structlog.get_logger()
+
+LOG_FILENAME = "requests.bin"
+MAGIC = b"WAFPREQ1"
+# Rows are buffered in memory and written to the log in chunks of this size
+CHUNK_SIZE = 4096
+# Name, array typecode
+COLUMNS = (
+    ("timestamp", "d"),  # Seconds since the proxy start
+    ("method", "B"),
+    ("template", "I"),
+    ("status", "H"),  # 0 if there is no response from the target
+    ("request_bytes", "Q"),
+    ("response_bytes", "Q"),
+    ("latency", "f"),  # Seconds from receiving the whole request to sending the whole response
+)
+PERCENTILES = (50, 90, 95, 99)
+# Maximum size of the request line & headers
+MAX_HEAD_SIZE = 1024 * 1024
+# Segments that are likely identifiers - numbers, UUIDs & long hex strings
+ID_SEGMENT_RE = re.compile(
+    r"^(\d+|[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}|[0-9a-fA-F]{16,})$"
+)
+NO_BODY_STATUSES = {204, 304}
+TemplateFunc = Callable[[str, str], str]
+
+
+def get_template(method: str, path: str) -> str:
+    """Approximate path template without the API schema - segments that look like IDs are replaced with `{id}`."""
+    return "/".join("{id}" if ID_SEGMENT_RE.match(segment) else segment for segment in path.split("/"))
+
+
+def percentile(values: List[float], value: float) -> float:
+    """Nearest-rank percentile of sorted `values`."""
+    if not values:
+        return 0.0
+    rank = max(math.ceil(value / 100 * len(values)) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+@attr.s()
+class RequestLog:
+    """Columnar log of proxied requests, written to `path` in chunks."""
+
+    path: pathlib.Path = attr.ib(converter=pathlib.Path)
+    _fd: Optional[BinaryIO] = attr.ib(default=None, init=False, repr=False)
+    _columns: Dict[str, array] = attr.ib(init=False, repr=False)
+    _strings: Dict[str, Dict[str, int]] = attr.ib(init=False, repr=False)
+    # Aggregates for the whole run. Latencies are kept in memory to compute percentiles
+    _latencies: array = attr.ib(factory=lambda: array("f"), init=False, repr=False)
+    _statuses: Counter = attr.ib(factory=Counter, init=False, repr=False)
+    _totals: Dict[str, int] = attr.ib(factory=lambda: {"request_bytes": 0, "response_bytes": 0}, init=False)
+    _first: Optional[float] = attr.ib(default=None, init=False, repr=False)
+    _last: float = attr.ib(default=0.0, init=False, repr=False)
+
+    def __attrs_post_init__(self) -> None:
+        self._columns = {name: array(typecode) for name, typecode in COLUMNS}
+        self._strings = {"method": {}, "template": {}}
+
+    def open(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fd = self.path.open("wb")
+        self._fd.write(MAGIC)
+
+    def __len__(self) -> int:
+        return len(self._latencies)
+
+    def get_string_id(self, kind: str, value: str) -> int:
+        table = self._strings[kind]
+        if value not in table:
+            table[value] = len(table)
+        return table[value]
+
+    def add(
+        self,
+        *,
+        timestamp: float,
+        method: str,
+        template: str,
+        status: int,
+        request_bytes: int,
+        response_bytes: int,
+        latency: float,
+    ) -> None:
+        columns = self._columns
+        columns["timestamp"].append(timestamp)
+        columns["method"].append(self.get_string_id("method", method))
+        columns["template"].append(self.get_string_id("template", template))
+        columns["status"].append(status)
+        columns["request_bytes"].append(request_bytes)
+        columns["response_bytes"].append(response_bytes)
+        columns["latency"].append(latency)
+        self._latencies.append(latency)
+        self._statuses[str(status) if status else "error"] += 1
+        self._totals["request_bytes"] += request_bytes
+        self._totals["response_bytes"] += response_bytes
+        if self._first is None:
+            self._first = timestamp
+        self._last = max(self._last, timestamp + latency)
+        if len(columns["timestamp"]) >= CHUNK_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        rows = len(self._columns["timestamp"])
+        if self._fd is None or not rows:
+            return
+        self._fd.write(struct.pack("<I", rows))
+        for name, typecode in COLUMNS:
+            self._fd.write(self._columns[name].tobytes())
+            self._columns[name] = array(typecode)
+
+    def close(self) -> None:
+        if self._fd is None:
+            return
+        self.flush()
+        offset = self._fd.tell()
+        footer = {
+            "columns": [[name, typecode, array(typecode).itemsize] for name, typecode in COLUMNS],
+            "methods": list(self._strings["method"]),
+            "templates": list(self._strings["template"]),
+        }
+        self._fd.write(json.dumps(footer).encode())
+        self._fd.write(struct.pack("<Q", offset))
+        self._fd.write(MAGIC)
+        self._fd.close()
+        self._fd = None
+
+    def summary(self) -> Dict[str, Any]:
+        """Throughput, latency percentiles & status histogram of all recorded requests."""
+        count = len(self._latencies)
+        elapsed = self._last - self._first if self._first is not None else 0.0
+        latencies = sorted(self._latencies)
+        return {
+            "requests": count,
+            "elapsed": elapsed,
+            "throughput": count / elapsed if elapsed > 0 else 0.0,
+            **self._totals,
+            # In milliseconds
+            "latency": {
+                **{f"p{value}": percentile(latencies, value) * 1000 for value in PERCENTILES},
+                "mean": sum(latencies) / count * 1000 if count else 0.0,
+                "max": latencies[-1] * 1000 if count else 0.0,
+            },
+            "statuses": dict(sorted(self._statuses.items())),
+        }
+
+
+def read_log(path: pathlib.Path) -> Dict[str, Any]:
+    """Load a request log. Columns are arrays, `methods` & `templates` are tables their IDs refer to."""
+    data = pathlib.Path(path).read_bytes()
+    if not data.startswith(MAGIC) or not data.endswith(MAGIC):
+        raise ValueError(f"Not a request log: {path}")
+    (offset,) = struct.unpack_from("<Q", data, len(data) - len(MAGIC) - 8)
+    footer = json.loads(data[offset : len(data) - len(MAGIC) - 8])
+    columns = {name: array(typecode) for name, typecode, _ in footer["columns"]}
+    position = len(MAGIC)
+    while position < offset:
+        (rows,) = struct.unpack_from("<I", data, position)
+        position += 4
+        for name, _, itemsize in footer["columns"]:
+            size = rows * itemsize
+            columns[name].frombytes(data[position : position + size])
+            position += size
+    return {"columns": columns, "methods": footer["methods"], "templates": footer["templates"]}
+
+
+class ProtocolError(Exception):
+    """Malformed HTTP message."""
+
+
+Headers = List[Tuple[str, str]]
+
+
+def get_header(headers: Headers, name: str) -> Optional[str]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def parse_head(head: bytes) -> Tuple[str, Headers]:
+    """Split the start line & headers."""
+    lines = head.decode("latin-1").split("\r\n")
+    headers = []
+    for line in lines[1:]:
+        if not line:
+            continue
+        key, sep, value = line.partition(":")
+        if not sep:
+            raise ProtocolError(f"Invalid header: {line!r}")
+        headers.append((key.strip(), value.strip()))
+    return lines[0], headers
+
+
+def serialize_head(start_line: str, headers: Headers) -> bytes:
+    lines = [start_line, *(f"{key}: {value}" for key, value in headers), "", ""]
+    return "\r\n".join(lines).encode("latin-1")
+
+
+async def read_head(reader: asyncio.StreamReader) -> Optional[bytes]:
+    """Read the start line & headers. None if the connection is closed before a new message."""
+    try:
+        return await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as exc:
+        if not exc.partial.strip():
+            return None
+        raise ProtocolError("Incomplete message head") from exc
+    except asyncio.LimitOverrunError as exc:
+        raise ProtocolError("Message head is too large") from exc
+
+
+async def iter_chunked(reader: asyncio.StreamReader) -> AsyncGenerator[bytes, None]:
+    """Raw pieces of a chunked body, including chunk sizes & trailers."""
+    while True:
+        line = await reader.readuntil(b"\r\n")
+        size = int(line.split(b";", 1)[0].strip(), 16)
+        if size:
+            yield line + await reader.readexactly(size + 2)
+            continue
+        # The last chunk & optional trailers
+        yield line
+        while True:
+            trailer = await reader.readuntil(b"\r\n")
+            yield trailer
+            if trailer == b"\r\n":
+                return
+
+
+async def read_chunked(reader: asyncio.StreamReader) -> bytes:
+    return b"".join([piece async for piece in iter_chunked(reader)])
+
+
+async def relay_chunked(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> int:
+    relayed = 0
+    async for piece in iter_chunked(reader):
+        writer.write(piece)
+        await writer.drain()
+        relayed += len(piece)
+    return relayed
+
+
+async def relay(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, size: Optional[int]) -> int:
+    """Relay `size` bytes or everything until the connection is closed, if `size` is None."""
+    relayed = 0
+    while size is None or relayed < size:
+        chunk = await reader.read(65536 if size is None else min(65536, size - relayed))
+        if not chunk:
+            if size is not None:
+                raise ProtocolError("Connection is closed before the end of the body")
+            break
+        writer.write(chunk)
+        await writer.drain()
+        relayed += len(chunk)
+    return relayed
+
+
+@attr.s()
+class Exchange:
+    """What is known about the response so far."""
+
+    status: int = attr.ib(default=0)
+    response_bytes: int = attr.ib(default=0)
+
+
+@attr.s()
+class Upstream:
+    """A keep-alive connection to the target."""
+
+    reader: asyncio.StreamReader = attr.ib()
+    writer: asyncio.StreamWriter = attr.ib()
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+@attr.s()
+class MeteringProxy:
+    """Forwards requests to `upstream` and records them in `log_path`."""
+
+    upstream: str = attr.ib()
+    log_path: pathlib.Path = attr.ib(converter=pathlib.Path)
+    host: str = attr.ib(default="0.0.0.0")
+    port: int = attr.ib(default=0)
+    get_template: TemplateFunc = attr.ib(default=get_template)
+    log: RequestLog = attr.ib(init=False)
+    _loop: Optional[asyncio.AbstractEventLoop] = attr.ib(default=None, init=False, repr=False)
+    _thread: Optional[threading.Thread] = attr.ib(default=None, init=False, repr=False)
+    _server: Optional[asyncio.AbstractServer] = attr.ib(default=None, init=False, repr=False)
+    _started_at: float = attr.ib(default=0.0, init=False, repr=False)
+    # Whether `port` is reserved by the proxy and should be released on stop
+    _reserved: bool = attr.ib(default=False, init=False, repr=False)
+    _upstream_host: str = attr.ib(init=False, repr=False)
+    _upstream_port: int = attr.ib(init=False, repr=False)
+    _netloc: str = attr.ib(init=False, repr=False)
+    _ssl: Optional[ssl.SSLContext] = attr.ib(default=None, init=False, repr=False)
+
+    def __attrs_post_init__(self) -> None:
+        self.log = RequestLog(self.log_path)
+        parsed = urlsplit(self.upstream)
+        self._upstream_host = parsed.hostname or "localhost"
+        self._upstream_port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        self._netloc = parsed.netloc
+        if parsed.scheme == "https":
+            # Targets use self-signed certificates
+            self._ssl = ssl.create_default_context()
+            self._ssl.check_hostname = False
+            self._ssl.verify_mode = ssl.CERT_NONE
+
+    @property
+    def base_url(self) -> str:
+        """The upstream URL with the proxy address. The proxy itself always speaks plain HTTP."""
+        parsed = urlsplit(self.upstream)
+        return urlunsplit(("http", f"{self._upstream_host}:{self.port}", parsed.path, parsed.query, parsed.fragment))
+
+    def start(self) -> None:
+        if self.port == 0:
+            # Otherwise, the OS could give the proxy a port that another WAFP process reserved for its containers
+            self.port = reserve_port()
+            self._reserved = True
+        self.log.open()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start_server(), self._loop).result()
+        logger.msg("Metering proxy is started", port=self.port, upstream=self.upstream)
+
+    async def _start_server(self) -> None:
+        self._started_at = time.perf_counter()
+        self._server = await asyncio.start_server(self.handle, self.host, self.port, limit=MAX_HEAD_SIZE)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    def stop(self) -> None:
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._stop_server(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread is not None:
+            self._thread.join()
+        self._loop.close()
+        self._loop = None
+        self.log.close()
+        if self._reserved:
+            release_port(self.port)
+            self._reserved = False
+        logger.msg("Metering proxy is stopped", requests=len(self.log))
+
+    async def _stop_server(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        # Connections that are still open, e.g. keep-alive connections of the fuzzer
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def connect(self) -> Upstream:
+        reader, writer = await asyncio.open_connection(
+            self._upstream_host, self._upstream_port, ssl=self._ssl, limit=MAX_HEAD_SIZE
+        )
+        return Upstream(reader, writer)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        upstream: Optional[Upstream] = None
+        try:
+            keep_alive = True
+            while keep_alive:
+                head = await read_head(reader)
+                if head is None:
+                    break
+                keep_alive, upstream = await self.handle_request(head, reader, writer, upstream)
+        except (ProtocolError, ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            # The proxy is stopped
+            pass
+        finally:
+            if upstream is not None:
+                upstream.close()
+            writer.close()
+
+    async def handle_request(
+        self,
+        head: bytes,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        upstream: Optional[Upstream],
+    ) -> Tuple[bool, Optional[Upstream]]:
+        start_line, headers = parse_head(head)
+        try:
+            method, target, version = start_line.split(" ", 2)
+        except ValueError as exc:
+            raise ProtocolError(f"Invalid request line: {start_line!r}") from exc
+        if (get_header(headers, "expect") or "").lower() == "100-continue":
+            # The body is read before connecting to the target, so the client may send it right away
+            writer.write(f"{version} 100 Continue\r\n\r\n".encode("latin-1"))
+            headers = [(key, value) for key, value in headers if key.lower() != "expect"]
+        if (get_header(headers, "transfer-encoding") or "").lower().endswith("chunked"):
+            body = await read_chunked(reader)
+        else:
+            body = await reader.readexactly(int(get_header(headers, "content-length") or 0))
+        headers = [(key, value) if key.lower() != "host" else (key, self._netloc) for key, value in headers]
+        request = serialize_head(start_line, headers) + body
+        keep_alive = version == "HTTP/1.1" and (get_header(headers, "connection") or "").lower() != "close"
+        started_at = time.perf_counter()
+        exchange = Exchange()
+        try:
+            response_head, upstream = await self.send(request, upstream)
+            if not await self.relay_response(method, response_head, upstream, writer, exchange):
+                upstream.close()
+                upstream = None
+                keep_alive = False
+        except (OSError, ProtocolError, asyncio.IncompleteReadError, ValueError):
+            if upstream is not None:
+                upstream.close()
+                upstream = None
+            if exchange.status == 0:
+                writer.write(b"HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            keep_alive = False
+        finally:
+            self.log.add(
+                timestamp=started_at - self._started_at,
+                method=method,
+                template=self.get_template(method, urlsplit(target).path),
+                status=exchange.status,
+                request_bytes=len(request),
+                response_bytes=exchange.response_bytes,
+                latency=time.perf_counter() - started_at,
+            )
+        await writer.drain()
+        return keep_alive, upstream
+
+    async def send(self, request: bytes, upstream: Optional[Upstream]) -> Tuple[bytes, Upstream]:
+        """Send the request and read the response head. Returns the head and the connection it was read from."""
+        if upstream is not None:
+            try:
+                return await self._send(request, upstream)
+            except ConnectionError:
+                # The target may close an idle keep-alive connection at any time
+                pass
+        return await self._send(request, await self.connect())
+
+    async def _send(self, request: bytes, upstream: Upstream) -> Tuple[bytes, Upstream]:
+        try:
+            upstream.writer.write(request)
+            await upstream.writer.drain()
+            head = await read_head(upstream.reader)
+            if head is None:
+                raise ConnectionResetError("Connection is closed by the target")
+            return head, upstream
+        except BaseException:
+            upstream.close()
+            raise
+
+    async def relay_response(
+        self, method: str, head: bytes, upstream: Upstream, writer: asyncio.StreamWriter, exchange: Exchange
+    ) -> bool:
+        """Relay the response to the client. Returns whether the target connection can be reused."""
+        while True:
+            start_line, headers = parse_head(head)
+            parts = start_line.split(" ", 2)
+            if len(parts) < 2 or not parts[1].isdigit():
+                raise ProtocolError(f"Invalid status line: {start_line!r}")
+            status = int(parts[1])
+            writer.write(head)
+            exchange.status = status
+            exchange.response_bytes += len(head)
+            # Interim responses, e.g. `103 Early Hints`, are followed by the final one
+            if 100 <= status < 200 and status != 101:
+                interim = await read_head(upstream.reader)
+                if interim is None:
+                    raise ProtocolError("Connection is closed before the final response")
+                head = interim
+                continue
+            break
+        alive = parts[0] == "HTTP/1.1" and (get_header(headers, "connection") or "").lower() != "close"
+        if status == 101:
+            # Protocol upgrades are not supported
+            alive = False
+        elif method == "HEAD" or status in NO_BODY_STATUSES:
+            pass
+        elif (get_header(headers, "transfer-encoding") or "").lower().endswith("chunked"):
+            exchange.response_bytes += await relay_chunked(upstream.reader, writer)
+        elif get_header(headers, "content-length") is not None:
+            size = int(get_header(headers, "content-length") or 0)
+            exchange.response_bytes += await relay(upstream.reader, writer, size)
+        else:
+            exchange.response_bytes += await relay(upstream.reader, writer, None)
+            alive = False
+        await writer.drain()
+        return alive
+
+
+def main(args: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m wafp.proxy")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    summary = subparsers.add_parser("summary", help="Print the number of requests & latencies per path template")
+    summary.add_argument("path", type=pathlib.Path, help="Request log")
+    serve = subparsers.add_parser("serve", help="Run a metering proxy in front of a URL")
+    serve.add_argument("upstream", help="Base URL of the target")
+    serve.add_argument("--log", type=pathlib.Path, default=pathlib.Path(LOG_FILENAME), help="Request log to write")
+    serve.add_argument("--port", type=int, default=0, help="Port to listen on. Random by default")
+    parsed = parser.parse_args(args)
+    if parsed.command == "summary":
+        data = read_log(parsed.path)
+        columns = data["columns"]
+        by_template: Dict[Tuple[str, str], List[float]] = {}
+        for method, template, latency in zip(columns["method"], columns["template"], columns["latency"]):
+            key = (data["methods"][method], data["templates"][template])
+            by_template.setdefault(key, []).append(latency)
+        for (method, template), latencies in sorted(by_template.items(), key=lambda item: -len(item[1])):
+            latencies.sort()
+            print(f"{len(latencies):>8} {percentile(latencies, 50) * 1000:>9.2f}ms {method:<7} {template}")
+        return 0
+    proxy = MeteringProxy(parsed.upstream, parsed.log, port=parsed.port)
+    proxy.start()
+    print(f"Base URL: {proxy.base_url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        proxy.stop()
+        print(json.dumps(proxy.log.summary(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
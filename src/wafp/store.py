@@ -0,0 +1,159 @@
+"""Compressed, content-addressed storage for run artifacts.
+
+Files of a run are compressed into blobs named by the SHA-256 of their content. Blobs are shared by all runs that use
+the same store, so identical files (schemas, logs, Sentry events) are stored once. Each run directory keeps
+`metadata.json` as is and gets a `manifest.json` that maps artifact paths to blobs:
+
+    {"store": "../.blobs", "files": {"fuzzer/stdout.txt": {"sha256": "...", "size": 1024}}}
+
+Use `open_artifact` & `list_artifacts` to read artifacts regardless of whether a run is packed or not.
+
+Usage: python -m wafp.store export IN-DIRECTORY OUT-DIRECTORY
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import sys
+import tempfile
+from typing import IO, Dict, List, Optional
+
+import attr
+
+from .constants import METADATA_FILENAME
+
+MANIFEST_FILENAME = "manifest.json"
+BLOBS_DIRECTORY = "blobs"
+CHUNK_SIZE = 1024 * 1024
+COMPRESSION_LEVEL = 6
+
+
+@attr.s()
+class ArtifactStore:
+    root: pathlib.Path = attr.ib(converter=pathlib.Path)
+
+    def get_blob_path(self, digest: str) -> pathlib.Path:
+        return self.root / BLOBS_DIRECTORY / digest[:2] / f"{digest}.gz"
+
+    def put(self, path: pathlib.Path) -> Dict[str, object]:
+        """Store a file and return its manifest entry."""
+        temporary_dir = self.root / "tmp"
+        temporary_dir.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        with tempfile.NamedTemporaryFile(dir=temporary_dir, delete=False) as temporary:
+            try:
+                # `mtime=0` makes blobs of identical files identical
+                with path.open("rb") as source, gzip.GzipFile(
+                    fileobj=temporary, mode="wb", compresslevel=COMPRESSION_LEVEL, mtime=0
+                ) as compressed:
+                    for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+                        digest.update(chunk)
+                        size += len(chunk)
+                        compressed.write(chunk)
+            except BaseException:
+                os.unlink(temporary.name)
+                raise
+        blob = self.get_blob_path(digest.hexdigest())
+        if blob.exists():
+            os.unlink(temporary.name)
+        else:
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            # Concurrent runs may store the same blob. Replacing is atomic
+            os.replace(temporary.name, blob)
+        return {"sha256": digest.hexdigest(), "size": size}
+
+    def pack(self, run_dir: pathlib.Path) -> None:
+        """Move all artifacts of a run into the store, except its metadata."""
+        files = {}
+        for path in sorted(run_dir.rglob("*")):
+            relative = path.relative_to(run_dir).as_posix()
+            if not path.is_file() or relative in (METADATA_FILENAME, MANIFEST_FILENAME):
+                continue
+            files[relative] = self.put(path)
+        manifest = {"store": os.path.relpath(self.root, run_dir), "files": files}
+        (run_dir / MANIFEST_FILENAME).write_text(json.dumps(manifest, sort_keys=True))
+        for path in sorted(run_dir.iterdir()):
+            if path.is_dir():
+                shutil.rmtree(path)
+            elif path.name not in (METADATA_FILENAME, MANIFEST_FILENAME):
+                path.unlink()
+
+
+def read_manifest(run_dir: pathlib.Path) -> Optional[Dict]:
+    try:
+        with (run_dir / MANIFEST_FILENAME).open() as fd:
+            return json.load(fd)
+    except FileNotFoundError:
+        return None
+
+
+def add_artifacts(run_dir: pathlib.Path, files: Dict[str, bytes]) -> None:
+    """Add files to an already packed run, e.g. Sentry events collected after the run."""
+    manifest = read_manifest(run_dir)
+    if manifest is None:
+        raise FileNotFoundError(f"No manifest in {run_dir}")
+    store = ArtifactStore((run_dir / manifest["store"]).resolve())
+    with tempfile.TemporaryDirectory(dir=run_dir) as temporary_dir:
+        for relative, data in files.items():
+            path = pathlib.Path(temporary_dir) / "artifact"
+            path.write_bytes(data)
+            manifest["files"][relative] = store.put(path)
+        temporary = pathlib.Path(temporary_dir) / MANIFEST_FILENAME
+        temporary.write_text(json.dumps(manifest, sort_keys=True))
+        os.replace(temporary, run_dir / MANIFEST_FILENAME)
+
+
+def list_artifacts(run_dir: pathlib.Path) -> List[str]:
+    """Relative paths of all artifacts of a run, packed or not."""
+    manifest = read_manifest(run_dir)
+    if manifest is not None:
+        return sorted(manifest["files"])
+    return sorted(
+        path.relative_to(run_dir).as_posix()
+        for path in run_dir.rglob("*")
+        if path.is_file() and path.name != METADATA_FILENAME
+    )
+
+
+def open_artifact(run_dir: pathlib.Path, relative: str) -> IO[bytes]:
+    """Open an artifact for reading in binary mode. Packed artifacts are decompressed on the fly."""
+    manifest = read_manifest(run_dir)
+    if manifest is None:
+        return (run_dir / relative).open("rb")
+    try:
+        entry = manifest["files"][relative]
+    except KeyError:
+        raise FileNotFoundError(f"No artifact `{relative}` in {run_dir}") from None
+    store = ArtifactStore((run_dir / manifest["store"]).resolve())
+    return gzip.open(store.get_blob_path(entry["sha256"]), "rb")  # type: ignore
+
+
+def export(run_dir: pathlib.Path, destination: pathlib.Path) -> None:
+    """Restore the plain directory layout of a run, e.g. for `postprocessing`."""
+    destination.mkdir(parents=True, exist_ok=True)
+    shutil.copy(run_dir / METADATA_FILENAME, destination / METADATA_FILENAME)
+    for relative in list_artifacts(run_dir):
+        target = destination / relative
+        target.parent.mkdir(parents=True, exist_ok=True)
+        with open_artifact(run_dir, relative) as source, target.open("wb") as fd:
+            shutil.copyfileobj(source, fd, CHUNK_SIZE)
+
+
+def main(args: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m wafp.store")
+    parser.add_argument("command", choices=["export"])
+    parser.add_argument("in_directory", type=pathlib.Path, help="Directory with run directories")
+    parser.add_argument("out_directory", type=pathlib.Path)
+    parsed = parser.parse_args(args)
+    for run_dir in sorted(parsed.in_directory.iterdir()):
+        if (run_dir / METADATA_FILENAME).exists():
+            export(run_dir, parsed.out_directory / run_dir.name)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
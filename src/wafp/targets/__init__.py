@@ -1,3 +1,3 @@
 from . import cli, loader
-from .core import BaseTarget
+from .core import BaseTarget, Isolation
 from .metadata import Language, Metadata, Package, SchemaSource, SchemaSourceType, Specification, SpecificationType
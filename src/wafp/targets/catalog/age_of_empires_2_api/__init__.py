@@ -1,7 +1,18 @@
-from wafp.targets import BaseTarget, Metadata, SchemaSource, SchemaSourceType, Specification, SpecificationType
+from wafp.targets import (
+    BaseTarget,
+    Isolation,
+    Metadata,
+    SchemaSource,
+    SchemaSourceType,
+    Specification,
+    SpecificationType,
+)
 
 
 class Default(BaseTarget):
+    # All endpoints are read-only
+    reset_isolation = Isolation.FULL
+
     def get_base_url(self) -> str:
         return f"http://0.0.0.0:{self.port}/api/v1"
 
@@ -11,7 +22,8 @@ class Default(BaseTarget):
     def is_ready(self, line: bytes) -> bool:
         return b"uwsgi entered RUNNING state" in line
 
-    def get_metadata(self) -> Metadata:
+    @classmethod
+    def get_metadata(cls) -> Metadata:
         return Metadata.flask(
             flask_version="1.1.2",
             schema_source=SchemaSource(
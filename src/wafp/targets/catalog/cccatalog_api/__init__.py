@@ -17,6 +17,9 @@ from wafp.targets import (
 
 
 class Default(BaseTarget):
+    # Migrations & Elasticsearch bootstrap take most of the startup time
+    supports_snapshots = True
+
     def get_base_url(self) -> str:
         return f"http://0.0.0.0:{self.port}/v1"
 
@@ -26,7 +29,8 @@ class Default(BaseTarget):
     def is_ready(self, line: bytes) -> bool:
         return b"Starting development server at" in line
 
-    def get_metadata(self) -> Metadata:
+    @classmethod
+    def get_metadata(cls) -> Metadata:
         return Metadata(
             language=Language.PYTHON,
             framework=Package(name="Django", version="2.2.13"),
@@ -1,7 +1,10 @@
-from wafp.targets import BaseTarget, Metadata
+from wafp.targets import BaseTarget, Isolation, Metadata
 
 
 class Default(BaseTarget):
+    # Only GET endpoints over bundled data
+    reset_isolation = Isolation.FULL
+
     def get_base_url(self) -> str:
         return f"http://0.0.0.0:{self.port}/"
 
@@ -11,7 +14,8 @@ class Default(BaseTarget):
     def is_ready(self, line: bytes) -> bool:
         return b"* Running on" in line
 
-    def get_metadata(self) -> Metadata:
+    @classmethod
+    def get_metadata(cls) -> Metadata:
         return Metadata.flasgger(
             flask_version="1.1.2", flasgger_version="0.9.4", openapi_version="2.0", validation_from_schema=False
         )
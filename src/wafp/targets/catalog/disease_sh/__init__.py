@@ -20,7 +20,8 @@ class Default(BaseTarget):
     def is_ready(self, line: bytes) -> bool:
         return b"Your app is listening on port " in line
 
-    def get_metadata(self) -> Metadata:
+    @classmethod
+    def get_metadata(cls) -> Metadata:
         return Metadata(
             language=Language.JAVASCRIPT,
             framework=Package(name="Express", version="4.17.1"),
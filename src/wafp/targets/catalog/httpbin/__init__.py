@@ -1,7 +1,10 @@
-from wafp.targets import BaseTarget, Metadata
+from wafp.targets import BaseTarget, Isolation, Metadata
 
 
 class Default(BaseTarget):
+    # httpbin keeps no state
+    reset_isolation = Isolation.FULL
+
     def get_base_url(self) -> str:
         return f"http://0.0.0.0:{self.port}/"
 
@@ -11,7 +14,8 @@ class Default(BaseTarget):
     def is_ready(self, line: bytes) -> bool:
         return b"Listening at: " in line
 
-    def get_metadata(self) -> Metadata:
+    @classmethod
+    def get_metadata(cls) -> Metadata:
         return Metadata.flasgger(
             flask_version="1.0.2",
             flasgger_version="0.9.0",
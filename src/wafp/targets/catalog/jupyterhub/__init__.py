@@ -24,7 +24,8 @@ class Default(BaseTarget):
     def is_ready(self, line: bytes) -> bool:
         return b"JupyterHub is now running at" in line
 
-    def get_metadata(self) -> Metadata:
+    @classmethod
+    def get_metadata(cls) -> Metadata:
         return Metadata(
             language=Language.PYTHON,
             framework=Package(name="Tornado", version="6.1.0"),
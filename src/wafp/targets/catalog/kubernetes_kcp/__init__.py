@@ -48,7 +48,8 @@ class Default(BaseTarget):
     def is_ready(self, line: bytes) -> bool:
         return b"Bootstrapped Namespace root|default" in line
 
-    def get_metadata(self) -> Metadata:
+    @classmethod
+    def get_metadata(cls) -> Metadata:
         return Metadata(
             language=Language.GO,
             framework=Package(name="kubernetes", version="1.23.5"),
@@ -1,5 +1,6 @@
 from wafp.targets import (
     BaseTarget,
+    Isolation,
     Language,
     Metadata,
     SchemaSource,
@@ -10,6 +11,9 @@ from wafp.targets import (
 
 
 class Default(BaseTarget):
+    # Messages are kept in memory and dropped on restart
+    reset_isolation = Isolation.FULL
+
     def get_base_url(self) -> str:
         return f"http://0.0.0.0:{self.port}/"
 
@@ -19,7 +23,8 @@ class Default(BaseTarget):
     def is_ready(self, line: bytes) -> bool:
         return b"Serving under " in line
 
-    def get_metadata(self) -> Metadata:
+    @classmethod
+    def get_metadata(cls) -> Metadata:
         return Metadata(
             language=Language.GO,
             framework=None,
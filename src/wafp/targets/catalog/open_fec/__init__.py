@@ -2,6 +2,9 @@ from wafp.targets import BaseTarget, Metadata, Package, SchemaSource, SchemaSour
 
 
 class Default(BaseTarget):
+    # Loading the sample database & building indexes take most of the startup time
+    supports_snapshots = True
+
     def get_base_url(self) -> str:
         return f"http://0.0.0.0:{self.port}/v1"
 
@@ -11,7 +14,8 @@ class Default(BaseTarget):
     def is_ready(self, line: bytes) -> bool:
         return b"Listening at: " in line
 
-    def get_metadata(self) -> Metadata:
+    @classmethod
+    def get_metadata(cls) -> Metadata:
         return Metadata.flask(
             flask_version="1.1.1",
             schema_source=SchemaSource(
@@ -1,5 +1,6 @@
 from wafp.targets import (
     BaseTarget,
+    Isolation,
     Language,
     Metadata,
     Package,
@@ -11,6 +12,9 @@ from wafp.targets import (
 
 
 class Default(BaseTarget):
+    # Parses input without storing anything
+    reset_isolation = Isolation.FULL
+
     def get_base_url(self) -> str:
         return f"http://0.0.0.0:{self.port}/"
 
@@ -20,7 +24,8 @@ class Default(BaseTarget):
     def is_ready(self, line: bytes) -> bool:
         return b"Server listening on " in line
 
-    def get_metadata(self) -> Metadata:
+    @classmethod
+    def get_metadata(cls) -> Metadata:
         return Metadata(
             language=Language.RUST,
             framework=Package(name="tide", version="0.14.0"),
@@ -11,7 +11,8 @@ class Default(BaseTarget):
     def is_ready(self, line: bytes) -> bool:
         return b"* Running on" in line
 
-    def get_metadata(self) -> Metadata:
+    @classmethod
+    def get_metadata(cls) -> Metadata:
         return Metadata.flasgger(
             flask_version="1.1.2", flasgger_version="0.9.5", openapi_version="2.0", validation_from_schema=False
         )
@@ -13,6 +13,9 @@ from wafp.targets import (
 
 
 class Default(BaseTarget):
+    # Migrations take most of the startup time. They are no-op for a restored database
+    supports_snapshots = True
+
     def get_base_url(self) -> str:
         return f"http://0.0.0.0:{self.port}/"
 
@@ -22,7 +25,8 @@ class Default(BaseTarget):
     def is_ready(self, line: bytes) -> bool:
         return b"Watching for file changes with" in line
 
-    def get_metadata(self) -> Metadata:
+    @classmethod
+    def get_metadata(cls) -> Metadata:
         return Metadata(
             language=Language.PYTHON,
             framework=Package(name="Django", version="2.2.17"),
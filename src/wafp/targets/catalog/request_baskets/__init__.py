@@ -3,6 +3,7 @@ from typing import Dict
 
 from wafp.targets import (
     BaseTarget,
+    Isolation,
     Language,
     Metadata,
     SchemaSource,
@@ -13,6 +14,9 @@ from wafp.targets import (
 
 
 class Default(BaseTarget):
+    # Baskets live in the default in-memory storage
+    reset_isolation = Isolation.FULL
+
     def get_base_url(self) -> str:
         return f"http://0.0.0.0:{self.port}/"
 
@@ -29,7 +33,8 @@ class Default(BaseTarget):
     def is_ready(self, line: bytes) -> bool:
         return b"token: " in line
 
-    def get_metadata(self) -> Metadata:
+    @classmethod
+    def get_metadata(cls) -> Metadata:
         return Metadata(
             language=Language.GO,
             framework=None,
@@ -11,7 +11,8 @@ class Default(BaseTarget):
     def is_ready(self, line: bytes) -> bool:
         return b"Starting development server at" in line
 
-    def get_metadata(self) -> Metadata:
+    @classmethod
+    def get_metadata(cls) -> Metadata:
         return Metadata.flask(
             flask_version="1.1.2",
             schema_source=SchemaSource(
@@ -1,23 +1,27 @@
 import argparse
+import os
+import pathlib
 from dataclasses import dataclass
 from typing import Any, Dict, Optional
 
 from ..cli import BaseCliArguments
 from . import loader
-from .core import BaseTarget, Target, unused_port
+from .core import BaseTarget, Target
 
 
 @dataclass
 class SharedCliArguments(BaseCliArguments):
     target: str
-    port: int
+    port: Optional[int]
     no_cleanup: bool
+    no_snapshot: bool
     run_id: Optional[str]
     sentry_dsn: Optional[str]
     sentry_url: Optional[str]
     sentry_token: Optional[str]
     sentry_organization: Optional[str]
     sentry_project: Optional[str]
+    sentry_sink: bool
 
     @classmethod
     def extend_parser(cls, parser: argparse.ArgumentParser, *, catalog: Optional[str] = None) -> None:
@@ -28,8 +32,8 @@ class SharedCliArguments(BaseCliArguments):
             "--port",
             required=False,
             type=int,
-            default=unused_port(),
-            help="TCP port on localhost used for the fuzz target",
+            help="TCP port on localhost used for the fuzz target. "
+            "Defaults to a free port reserved for this run, which no concurrent run can get",
         )
         parser.add_argument(
             "--no-cleanup",
@@ -38,6 +42,13 @@ class SharedCliArguments(BaseCliArguments):
             default=False,
             help="Do not perform any cleanup on exit",
         )
+        parser.add_argument(
+            "--no-snapshot",
+            action="store_true",
+            required=False,
+            default=False,
+            help="Always start the target from scratch instead of restoring it from a snapshot",
+        )
         parser.add_argument(
             "--run-id",
             action="store",
@@ -60,6 +71,14 @@ class SharedCliArguments(BaseCliArguments):
         parser.add_argument(
             "--sentry-project", action="store", type=str, required=False, help="The slug of the Sentry project"
         )
+        parser.add_argument(
+            "--sentry-sink",
+            action="store_true",
+            required=False,
+            default=bool(os.environ.get("WAFP_SENTRY_SINK")),
+            help="Receive Sentry events with a built-in sink and store them in the `target` output directory "
+            "as they arrive, instead of using a Sentry server",
+        )
 
     def get_target_cls(self, *, catalog: Optional[str] = None) -> Target:
         cls = loader.by_name(self.target, catalog=catalog)
@@ -68,7 +87,12 @@ class SharedCliArguments(BaseCliArguments):
         return cls
 
     def get_target_kwargs(self) -> Dict[str, Any]:
-        kwargs: Dict[str, Any] = {"port": self.port, "sentry_dsn": self.sentry_dsn}
+        kwargs: Dict[str, Any] = {
+            "sentry_dsn": self.sentry_dsn,
+            "use_snapshots": not self.no_snapshot,
+        }
+        if self.port is not None:
+            kwargs["port"] = self.port
         if self.run_id is not None:
             kwargs["run_id"] = self.run_id  # type: ignore
         return kwargs
@@ -88,6 +112,8 @@ class CliArguments(SharedCliArguments):
     def get_target_kwargs(self) -> Dict[str, Any]:
         kwargs = super().get_target_kwargs()
         kwargs["force_build"] = self.build
+        if self.sentry_sink:
+            kwargs["sentry_sink_dir"] = pathlib.Path(self.output_dir) / "target"
         return kwargs
 
     @classmethod
@@ -1,65 +1,226 @@
 import abc
+import contextvars
+import enum
 import pathlib
 import subprocess
 import sys
+import threading
 import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
-from typing import Dict, Generator, List, Optional, Type, Union
+from functools import partial
+from typing import Callable, Dict, Generator, List, Optional, Set, Type, Union
 
 import attr
+import requests
 
+from .. import tracing
 from ..artifacts import Artifact
 from ..base import Component
 from ..constants import WAIT_TARGET_READY_TIMEOUT
-from . import sentry
+from ..limits import Limits
+from ..utils import get_cache_dir, is_url
+from . import sentry, sink
 from .errors import TargetNotReady
 from .metadata import Metadata
-from .network import unused_port
+from .network import release_port, reserve_port
 from .retries import wait
+from .snapshots import Snapshot
 
 
 def generate_run_id() -> str:
-    return str(int(time.time()))
+    return uuid.uuid4().hex
+
+
+def exclude_lines(stdout: bytes, lines: Set[bytes]) -> bytes:
+    """Remove the given lines from the output. Lines are prefixed with timestamps, therefore they are unique."""
+    if not lines:
+        return stdout
+    return b"\n".join(line for line in stdout.splitlines() if line not in lines)
+
+
+class Isolation(enum.Enum):
+    """How well `BaseTarget.reset` separates consecutive fuzzing runs."""
+
+    # Runs may observe state created by previous runs, e.g. database records
+    NONE = enum.auto()
+    # Nothing is shared between runs. E.g. the target keeps its state only in memory or has no state at all
+    FULL = enum.auto()
 
 
 @attr.s()
 class BaseTarget(abc.ABC, Component):
-    port: int = attr.ib(factory=unused_port)
+    # Reserved for this target until `cleanup`, unless passed explicitly
+    port: int = attr.ib(factory=reserve_port)
     force_build: bool = attr.ib(default=False)
     fuzzer_skip_ssl_verify: bool = attr.ib(default=False)
     sentry_dsn: Optional[str] = attr.ib(default=None)
     run_id: str = attr.ib(factory=generate_run_id)
+    use_snapshots: bool = attr.ib(default=True)
+    # Store Sentry events in this directory as they arrive, without a Sentry server. See `wafp.targets.sink`
+    sentry_sink_dir: Optional[pathlib.Path] = attr.ib(default=None)
+    limits: Optional[Limits] = attr.ib(default=None)
+    _sentry_sink: Optional[sink.EventSink] = attr.ib(default=None, init=False, repr=False)
+    # Log lines printed before the last reset belong to previous fuzzing runs against the same containers
+    _previous_logs: Set[bytes] = attr.ib(factory=set, init=False, repr=False)
     wait_target_ready_timeout: int = WAIT_TARGET_READY_TIMEOUT
+    # Only targets with full isolation are reused across fuzzing runs
+    reset_isolation: Isolation = Isolation.NONE
+    # Whether the target state after startup can be restored from a snapshot. See `wafp.targets.snapshots`
+    supports_snapshots: bool = False
+    # Whether the target is available only when its schema URL responds successfully, not as soon as its port
+    # accepts connections
+    check_schema: bool = False
 
     def start(self, extra_env: Optional[Dict[str, str]] = None) -> "TargetContext":
         """Start the target.
 
         It will be ready to serve requests after this method is called.
         """
+        with tracing.span("target.start", component=self.full_name):
+            return self._start(extra_env)
+
+    def _start(self, extra_env: Optional[Dict[str, str]]) -> "TargetContext":
         self.logger.msg("Start target")
         start = time.perf_counter()
         self.before_start()
+        self.start_sentry_sink()
         deadline = time.time() + self.wait_target_ready_timeout
-        self.compose.up(timeout=self.wait_target_ready_timeout, build=self.force_build, extra_env=extra_env)
+        snapshot = self.get_snapshot()
+        if snapshot is not None:
+            startup_duration = snapshot.get_startup_duration()
+            if startup_duration is not None and self._restore(snapshot, extra_env):
+                context = self.wait_until_ready(start, deadline)
+                duration = time.perf_counter() - start
+                self.logger.msg(
+                    "Target is restored from snapshot",
+                    duration=round(duration, 2),
+                    saved=round(max(startup_duration - duration, 0.0), 2),
+                )
+                return context
+        with tracing.span("compose.up", component=self.full_name):
+            self.compose.up(timeout=self.wait_target_ready_timeout, build=self.force_build, extra_env=extra_env)
+        if snapshot is None:
+            return self.wait_until_ready(start, deadline)
+        # `after_start` may change the target state (e.g. register a user), and it runs again after every restore.
+        # Therefore, the snapshot is taken before it, so restored targets go through the same steps as fresh ones
+        return self.wait_until_ready(start, deadline, on_ready=partial(self._take_snapshot, start))
+
+    def _take_snapshot(self, start: float) -> None:
+        try:
+            with tracing.span("snapshot.take", component=self.full_name):
+                # Images may be built or pulled by `compose.up`, so the key is computed again from their IDs
+                Snapshot.for_target(self).take(time.perf_counter() - start)
+        except subprocess.CalledProcessError as exc:
+            self.logger.warning("Failed to take snapshot", stdout=exc.stdout)
+
+    def get_snapshot(self) -> Optional[Snapshot]:
+        # Snapshots keep the environment of the containers, but the sink address differs on every start
+        if not (self.supports_snapshots and self.use_snapshots) or self.sentry_sink_dir is not None:
+            return None
+        return Snapshot.for_target(self)
+
+    def start_sentry_sink(self) -> None:
+        if self.sentry_sink_dir is None or self._sentry_sink is not None:
+            return
+        if self.sentry_dsn is not None:
+            self.logger.warning("Sentry DSN is set, the built-in sink is not used")
+            return
+        self._sentry_sink = sink.EventSink(self.sentry_sink_dir)
+        self._sentry_sink.start()
+
+    def stop(self) -> None:
+        super().stop()
+        # Targets may send events until they exit
+        if self._sentry_sink is not None:
+            self._sentry_sink.stop()
+            self._sentry_sink = None
+
+    def cleanup(self) -> None:
+        super().cleanup()
+        release_port(self.port)
+
+    def _restore(self, snapshot: Snapshot, extra_env: Optional[Dict[str, str]]) -> bool:
+        try:
+            with tracing.span("snapshot.restore", component=self.full_name):
+                snapshot.restore(timeout=self.wait_target_ready_timeout, extra_env=extra_env)
+            return True
+        except subprocess.CalledProcessError as exc:
+            # E.g. the snapshot images were removed in the meantime. Start from scratch instead
+            self.logger.warning("Failed to restore snapshot", stdout=exc.stdout)
+            self.compose.rm()
+            return False
+
+    def reset(self) -> "TargetContext":
+        """Bring the running target to its initial state between fuzzing runs.
+
+        It is much cheaper than a full restart of the docker-compose stack. By default, all containers are restarted,
+        which drops in-memory state but keeps data stored in containers & volumes. Targets that override this method
+        to clear their persistent state (e.g. truncate database tables) may declare `Isolation.FULL`.
+        """
+        self.logger.msg("Reset target")
+        with tracing.span("target.reset", component=self.full_name):
+            start = time.perf_counter()
+            deadline = time.time() + self.wait_target_ready_timeout
+            # Log lines emitted before the restart should not affect readiness detection & artifacts of the next run
+            self._previous_logs = set(self.compose.logs().stdout.splitlines())
+            with tracing.span("compose.restart", component=self.full_name):
+                self.compose.restart(timeout=self.wait_target_ready_timeout)
+            return self.wait_until_ready(start, deadline, self._previous_logs)
+
+    def wait_until_ready(
+        self,
+        start: float,
+        deadline: float,
+        seen: Optional[Set[bytes]] = None,
+        on_ready: Optional[Callable[[], None]] = None,
+    ) -> "TargetContext":
+        """Wait until the target accepts connections & reports readiness in its logs.
+
+        Both signals are awaited concurrently - the base URL is probed in a background thread while logs are followed.
+        `on_ready` is called once both are observed, before `after_start`.
+        """
         base_url = self.get_base_url()
-        # Wait until base URL is accessible
-        wait(base_url)
-        headers = {}
-        # Then extract important information from logs
-        # And decide from logs whether the service is ready
-        for line in self.compose.log_stream(deadline=deadline):
-            headers.update(self.get_headers(line))
-            if self.is_ready(line):
-                break
-        else:
-            message = "Target is not ready in time"
-            self.logger.error(message, timeout=self.wait_target_ready_timeout, logs=self.compose.logs())
-            raise TargetNotReady(message)
-
-        logs = self.compose.logs()
-        self.after_start(logs.stdout, headers)
+        # Seconds since `start` until each signal is observed
+        startup: Dict[str, float] = {}
+        stop = threading.Event()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            # The copied context makes the probe span a child of the current one
+            copied = contextvars.copy_context()
+
+            def probe() -> float:
+                return copied.run(self.wait_until_available, base_url, start, deadline, stop)
+
+            available = executor.submit(probe)
+            headers = {}
+            try:
+                # Extract important information from logs
+                # And decide from logs whether the service is ready
+                with tracing.span("target.readiness", component=self.full_name):
+                    for line in self.compose.log_stream(deadline=deadline, seen=seen):
+                        headers.update(self.get_headers(line))
+                        if self.is_ready(line):
+                            startup["ready"] = round(time.perf_counter() - start, 3)
+                            break
+                    else:
+                        message = "Target is not ready in time"
+                        self.logger.error(message, timeout=self.wait_target_ready_timeout, logs=self.compose.logs())
+                        raise TargetNotReady(message)
+            except BaseException:
+                stop.set()
+                raise
+            startup["available"] = available.result()
+
+        if on_ready is not None:
+            on_ready()
+        with tracing.span("target.after_start", component=self.full_name):
+            self.after_start(exclude_lines(self.compose.logs().stdout, seen or set()), headers)
+        startup["duration"] = round(time.perf_counter() - start, 3)
         info = {
-            "duration": round(time.perf_counter() - start, 2),
+            "duration": round(startup["duration"], 2),
+            "available": startup["available"],
+            "ready": startup["ready"],
             "address": base_url,
             "schema": self.get_schema_location(),
         }
@@ -71,8 +232,25 @@ class BaseTarget(abc.ABC, Component):
             schema_location=self.get_schema_location(),
             headers=headers,
             fuzzer_skip_ssl_verify=self.fuzzer_skip_ssl_verify,
+            startup=startup,
         )
 
+    def wait_until_available(
+        self, base_url: str, start: float, deadline: float, stop: Optional[threading.Event] = None
+    ) -> float:
+        """Wait until the target accepts connections and return the number of seconds since `start`."""
+        schema_location = self.get_schema_location()
+        health_url = schema_location if self.check_schema and is_url(schema_location) else None
+        with tracing.span("target.wait", component=self.full_name):
+            wait(
+                base_url,
+                timeout=max(deadline - time.time(), 0.0),
+                health_url=health_url,
+                verify=not self.fuzzer_skip_ssl_verify,
+                stop=stop,
+            )
+        return round(time.perf_counter() - start, 3)
+
     # These methods are expected to be overridden
 
     @abc.abstractmethod
@@ -90,8 +268,9 @@ class BaseTarget(abc.ABC, Component):
         """Detect whether the target is ready."""
         raise NotImplementedError
 
+    @classmethod
     @abc.abstractmethod
-    def get_metadata(self) -> Metadata:
+    def get_metadata(cls) -> Metadata:
         """Target meta information."""
         raise NotImplementedError
 
@@ -99,10 +278,18 @@ class BaseTarget(abc.ABC, Component):
         """Environment variables for docker-compose."""
         env = super().get_environment_variables()
         env.update({"PORT": str(self.port), "WAFP_RUN_ID": self.run_id})
-        if self.sentry_dsn is not None:
+        if self._sentry_sink is not None:
+            env["SENTRY_DSN"] = self._sentry_sink.get_dsn()
+        elif self.sentry_dsn is not None:
             env["SENTRY_DSN"] = self.sentry_dsn
         return env
 
+    def get_compose_overrides(self) -> List[str]:
+        overrides = super().get_compose_overrides()
+        if self._sentry_sink is not None:
+            overrides.append(sink.get_overrides_path(get_cache_dir(), self.path, self.get_docker_compose_filename()))
+        return overrides
+
     def get_headers(self, line: bytes) -> Dict[str, str]:
         """Extract headers from docker-compose output lines."""
         return {}
@@ -130,15 +317,16 @@ class BaseTarget(abc.ABC, Component):
         """Collect, clean and store all target's artifacts."""
         if isinstance(output_dir, str):
             output_dir = pathlib.Path(output_dir)
-        raw_artifacts = self.collect_artifacts(
-            sentry_url=sentry_url,
-            sentry_token=sentry_token,
-            sentry_organization=sentry_organization,
-            sentry_project=sentry_project,
-        )
-        output_dir.mkdir(exist_ok=True)
-        for artifact in raw_artifacts:
-            artifact.save_to(output_dir)
+        with tracing.span("target.artifacts", component=self.full_name):
+            raw_artifacts = self.collect_artifacts(
+                sentry_url=sentry_url,
+                sentry_token=sentry_token,
+                sentry_organization=sentry_organization,
+                sentry_project=sentry_project,
+            )
+            output_dir.mkdir(exist_ok=True)
+            for artifact in raw_artifacts:
+                artifact.save_to(output_dir)
         return raw_artifacts
 
     def collect_artifacts(
@@ -152,12 +340,21 @@ class BaseTarget(abc.ABC, Component):
 
         By default it includes only target's stdout logs, but may also collect Sentry events for this run.
 
-        It could also collect logs that are stored in containers directly.
+        It could also collect logs that are stored in containers directly. Logs of previous fuzzing runs against the
+        same containers are not included.
         """
-        artifacts = [Artifact.stdout(self.compose.logs().stdout)]
+        artifacts = [Artifact.stdout(exclude_lines(self.compose.logs().stdout, self._previous_logs))]
         if sentry_url and sentry_token and sentry_organization and sentry_project:
-            events = sentry.list_events(sentry_url, sentry_token, sentry_organization, sentry_project, self.run_id)
-            artifacts.extend(map(Artifact.sentry_event, events))
+            try:
+                with tracing.span("sentry.events", component=self.full_name):
+                    events = sentry.list_events(
+                        sentry_url, sentry_token, sentry_organization, sentry_project, self.run_id
+                    )
+            except requests.Timeout:
+                # Other artifacts of the run are still stored. Events can be collected later by `wafp.campaign.harvest`
+                self.logger.warning("Sentry did not respond in time", timeout=sentry.REQUEST_TIMEOUT)
+            else:
+                artifacts.extend(map(Artifact.sentry_event, events))
         return artifacts
 
     @contextmanager
@@ -187,6 +384,8 @@ class TargetContext:
     schema_location: str = attr.ib()
     headers: Dict[str, str] = attr.ib()
     fuzzer_skip_ssl_verify: bool = attr.ib(default=False)
+    # Seconds since the start until the target was available, reported its readiness, and both
+    startup: Dict[str, float] = attr.ib(factory=dict)
 
 
 Target = Type[BaseTarget]
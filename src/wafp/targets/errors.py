@@ -4,3 +4,7 @@ class TargetNotAccessible(RuntimeError):
 
 class TargetNotReady(RuntimeError):
     """Target is not ready in time."""
+
+
+class NoPortAvailable(RuntimeError):
+    """All candidate ports are reserved by other runs."""
@@ -1,8 +1,10 @@
+from functools import lru_cache
 from typing import Generator, List, Optional
 
 from .. import loader
 from . import catalog as default_catalog  # type: ignore
 from .core import BaseTarget, Target
+from .metadata import Metadata
 
 
 def by_name(name: str, catalog: Optional[str] = None) -> Optional[Target]:
@@ -25,3 +27,16 @@ def get_all_variants(*, catalog: Optional[str] = None) -> Generator[str, None, N
     else:
         catalog_package = default_catalog
     yield from loader.get_all_variants(base=BaseTarget, catalog=catalog_package)
+
+
+def get_metadata(name: str, *, catalog: Optional[str] = None) -> Optional[Metadata]:
+    """Metadata of a target variant, without creating a target instance."""
+    cls = by_name(name, catalog=catalog)
+    if cls is None:
+        return None
+    return _get_metadata(cls)
+
+
+@lru_cache()
+def _get_metadata(cls: Target) -> Metadata:
+    return cls.get_metadata()
@@ -1,19 +1,99 @@
+import fcntl
+import pathlib
 import socket
+import threading
+from functools import lru_cache
+from typing import IO, Dict
 from urllib.parse import urlparse
 
+import attr
 
-def is_available(url: str) -> bool:
+from ..utils import get_cache_dir
+from .errors import NoPortAvailable
+
+CONNECT_TIMEOUT = 1.0
+PORTS_DIRECTORY = "ports"
+# Candidates are ports that are free at the moment, therefore collisions with reservations are rare
+MAX_ATTEMPTS = 1000
+
+
+def is_available(url: str, timeout: float = CONNECT_TIMEOUT) -> bool:
     """Whether the `url` is available for connection or not."""
     parsed = urlparse(url)
     try:
-        with socket.create_connection((parsed.hostname, parsed.port or 80)):
+        with socket.create_connection((parsed.hostname, parsed.port or 80), timeout=timeout):
             return True
-    except ConnectionError:
+    except OSError:
+        # Refused connections, timeouts, unresolvable hosts
         return False
 
 
 def unused_port() -> int:
-    """Get an unused port on localhost."""
+    """Get an unused port on localhost.
+
+    Another process may take the same port before it is bound. Use `reserve_port` for ports of containers.
+    """
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
         s.bind(("127.0.0.1", 0))
         return s.getsockname()[1]
+
+
+@attr.s()
+class PortRegistry:
+    """Ports reserved by WAFP processes on this host.
+
+    A reservation is an exclusive lock on a file named after the port. The lock is held until the port is released or
+    the process exits, even if it crashes, therefore reservations are never left behind. Lock files are kept, as
+    removing them would let two processes lock different files for the same port.
+    """
+
+    directory: pathlib.Path = attr.ib()
+    _locks: Dict[int, IO[str]] = attr.ib(factory=dict, init=False)
+    _mutex: threading.Lock = attr.ib(factory=threading.Lock, init=False)
+
+    def reserve(self) -> int:
+        """Reserve a free port that is not reserved by any other WAFP process."""
+        for _ in range(MAX_ATTEMPTS):
+            port = unused_port()
+            if self.try_reserve(port):
+                return port
+        raise NoPortAvailable(f"No free port found in {MAX_ATTEMPTS} attempts")
+
+    def try_reserve(self, port: int) -> bool:
+        with self._mutex:
+            if port in self._locks:
+                return False
+            self.directory.mkdir(parents=True, exist_ok=True)
+            fd = (self.directory / f"{port}.lock").open("a")
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                fd.close()
+                return False
+            self._locks[port] = fd
+            return True
+
+    def release(self, port: int) -> None:
+        """Make the port available for reservation. Ports not reserved by this registry are ignored."""
+        with self._mutex:
+            fd = self._locks.pop(port, None)
+        if fd is not None:
+            fd.close()
+
+    def is_reserved(self, port: int) -> bool:
+        return port in self._locks
+
+
+@lru_cache()
+def get_registry() -> PortRegistry:
+    """Registry shared by all components in the process."""
+    return PortRegistry(get_cache_dir() / PORTS_DIRECTORY)
+
+
+def reserve_port() -> int:
+    """Reserve a port on localhost that is unique among all concurrent WAFP processes on this host."""
+    return get_registry().reserve()
+
+
+def release_port(port: int) -> None:
+    get_registry().release(port)
@@ -1,28 +1,69 @@
 import random
-from time import sleep
-from typing import Tuple
+import threading
+import time
+from typing import Optional, Tuple
 
+import requests
+
+from ..constants import WAIT_TARGET_READY_TIMEOUT
 from .errors import TargetNotAccessible
 from .network import is_available
 
-EXPONENTIAL_BASE = 2
-JITTER = (0.0, 0.5)
-INITIAL_RETRY_DELAY = 0.5
-MAX_WAITING_RETRIES = 10
+EXPONENTIAL_BASE = 1.5
+JITTER = (0.0, 0.05)
+# Most targets become available within a few seconds, therefore polling starts fast
+INITIAL_RETRY_DELAY = 0.05
+MAX_RETRY_DELAY = 1.0
+# For a single health check request
+HEALTH_CHECK_TIMEOUT = 5.0
+
+
+def is_healthy(url: str, verify: bool = True, timeout: float = HEALTH_CHECK_TIMEOUT) -> bool:
+    """Whether `url` responds with a non-error status.
+
+    Docker accepts connections on published ports before the service in the container listens, so a successful
+    connection alone does not mean that the target serves requests.
+    """
+    try:
+        # The body is not needed. Schemas may be large
+        response = requests.get(url, verify=verify, timeout=timeout, stream=True)
+    except requests.RequestException:
+        return False
+    # Releases the connection without reading the body
+    response.close()
+    return response.status_code < 400
 
 
 def wait(
     url: str,
-    retries: int = MAX_WAITING_RETRIES,
+    timeout: float = WAIT_TARGET_READY_TIMEOUT,
     delay: float = INITIAL_RETRY_DELAY,
+    max_delay: float = MAX_RETRY_DELAY,
     jitter: Tuple[float, float] = JITTER,
+    health_url: Optional[str] = None,
+    verify: bool = True,
+    retries: Optional[int] = None,
+    stop: Optional[threading.Event] = None,
 ) -> None:
-    """Wait until `url` is available."""
-    while retries > 0:
-        if is_available(url):
+    """Wait until `url` is available and `health_url`, if given, responds successfully.
+
+    The delay between attempts grows until `max_delay`, so a target is noticed shortly after it becomes available.
+    Waiting ends early when `stop` is set.
+    """
+    deadline = time.monotonic() + timeout
+    attempts = 0
+    while True:
+        if is_available(url) and (health_url is None or is_healthy(health_url, verify=verify)):
             return
-        retries -= 1
-        delay *= EXPONENTIAL_BASE
-        delay += random.uniform(*jitter)
-        sleep(delay)
+        attempts += 1
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or (retries is not None and attempts >= retries):
+            break
+        pause = min(delay + random.uniform(*jitter), remaining)
+        if stop is not None:
+            if stop.wait(pause):
+                break
+        else:
+            time.sleep(pause)
+        delay = min(delay * EXPONENTIAL_BASE, max_delay)
     raise TargetNotAccessible(f"{url} is not accessible")
@@ -1,27 +1,167 @@
-from typing import Any, Dict, List
+"""Collecting Sentry events of fuzzing runs.
+
+Targets tag their events with `wafp.run-id` (see `sitecustomize.py` files in the catalog). The tag filter is applied
+by the Sentry API, and full event payloads are fetched concurrently while the listing is paginated. All requests go
+through a shared pool of connections and are retried if Sentry rate-limits them or is temporarily unavailable.
+"""
+import random
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from time import sleep
+from typing import Any, Callable, Deque, Dict, Generator, List, Optional, Tuple
 
 import requests
+from requests.adapters import HTTPAdapter
+
+RUN_ID_TAG = "wafp.run-id"
+MAX_WORKERS = 8
+MAX_RETRIES = 5
+EXPONENTIAL_BASE = 2
+INITIAL_RETRY_DELAY = 0.5
+MAX_RETRY_DELAY = 60.0
+RETRY_STATUSES = frozenset((429, 502, 503, 504))
+# Seconds to wait for a connection and then for each response. A hanging Sentry fails the harvest instead of blocking it
+REQUEST_TIMEOUT = 30.0
+
+
+@lru_cache()
+def get_session() -> requests.Session:
+    """HTTP session shared by all Sentry requests, so connections are reused between pages & runs."""
+    session = requests.Session()
+    # One more connection for paginating the listing while workers fetch events
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=MAX_WORKERS + 1)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
 
 
 def list_events(url: str, token: str, organization: str, project: str, run_id: str) -> List[Dict[str, Any]]:
-    events: List[Dict[str, Any]] = []
+    """Full payloads of all events reported during the given run, in the order Sentry lists them."""
+    return [
+        event
+        for _, event in scan_events(
+            url,
+            token,
+            organization,
+            project,
+            query=f'{RUN_ID_TAG}:"{run_id}"',
+            # Older Sentry versions ignore unknown query parameters, therefore the tag is checked here as well
+            select=lambda summary: has_tag(summary, RUN_ID_TAG, run_id),
+        )
+    ]
+
+
+def scan_events(
+    url: str,
+    token: str,
+    organization: str,
+    project: str,
+    *,
+    query: str,
+    select: Callable[[Dict[str, Any]], bool],
+) -> Generator[Tuple[Dict[str, Any], Dict[str, Any]], None, None]:
+    """Page through events matching `query` & fetch full payloads of the selected ones.
+
+    Yields pairs of event summaries from the listing and full payloads, in the order Sentry lists them.
+    """
     headers = {"Authorization": f"Bearer {token}"}
-    next_link = make_call(f"{url}api/0/projects/{organization}/{project}/events/?full=true", headers, events, run_id)
-    while next_link["results"] == "true":
-        next_link = make_call(next_link["url"], headers, events, run_id)
-    return events
+    base_url = f"{url}api/0/projects/{organization}/{project}/events/"
+    pending: Deque[Tuple[Dict[str, Any], "Future[Dict[str, Any]]"]] = deque()
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        next_url: Optional[str] = base_url
+        params: Optional[Dict[str, str]] = {"query": query}
+        while next_url is not None:
+            response = get(next_url, headers, params)
+            for summary in response.json():
+                if select(summary):
+                    pending.append((summary, executor.submit(get_event, f"{base_url}{summary['id']}/", headers)))
+            # Pagination links keep all query parameters
+            next_url, params = get_next_url(response), None
+            while pending and pending[0][1].done():
+                summary, future = pending.popleft()
+                yield summary, future.result()
+        while pending:
+            summary, future = pending.popleft()
+            yield summary, future.result()
+
+
+def get_event(url: str, headers: Dict[str, str]) -> Dict[str, Any]:
+    return get(url, headers).json()
+
 
+def get_next_url(response: requests.Response) -> Optional[str]:
+    next_link = response.links.get("next")
+    if next_link is None or next_link.get("results") != "true":
+        return None
+    return next_link["url"]
 
-def make_call(url: str, headers: Dict[str, str], events: List[Dict[str, Any]], run_id: str) -> Dict[str, Any]:
-    response = requests.get(url, headers=headers)
+
+def get(url: str, headers: Dict[str, str], params: Optional[Dict[str, str]] = None) -> requests.Response:
+    """Send a GET request, waiting & retrying if Sentry asks for it."""
+    session = get_session()
+    for attempt in range(MAX_RETRIES + 1):
+        response: Optional[requests.Response] = None
+        try:
+            response = session.get(url, headers=headers, params=params, timeout=REQUEST_TIMEOUT)
+        except requests.ConnectionError:
+            if attempt == MAX_RETRIES:
+                raise
+        else:
+            if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                break
+        sleep(get_retry_delay(response, attempt))
+    assert response is not None
     response.raise_for_status()
-    data = response.json()
-    events.extend((event for event in data if has_tag(event, "wafp.run-id", run_id)))
-    return response.links["next"]
+    wait_for_quota(response)
+    return response
+
+
+def get_retry_delay(response: Optional[requests.Response], attempt: int) -> float:
+    """How long to wait before retrying a failed request.
+
+    Rate-limited responses tell exactly when the next request is allowed. Otherwise, the delay grows exponentially.
+    """
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after is not None:
+            try:
+                return min(max(float(retry_after), 0.0), MAX_RETRY_DELAY)
+            except ValueError:
+                pass
+        reset = get_rate_limit_reset(response)
+        if reset is not None:
+            return reset
+    delay = INITIAL_RETRY_DELAY * EXPONENTIAL_BASE**attempt + random.uniform(0.0, 0.5)
+    return min(delay, MAX_RETRY_DELAY)
+
+
+def get_rate_limit_reset(response: requests.Response) -> Optional[float]:
+    """Seconds until Sentry resets the rate limit window, if it reports one."""
+    reset = response.headers.get("X-Sentry-Rate-Limit-Reset")
+    if reset is None:
+        return None
+    try:
+        return min(max(float(reset) - time.time(), 0.0), MAX_RETRY_DELAY)
+    except ValueError:
+        return None
+
+
+def wait_for_quota(response: requests.Response) -> None:
+    """Do not send requests that are going to be rate-limited anyway."""
+    if response.headers.get("X-Sentry-Rate-Limit-Remaining") == "0":
+        reset = get_rate_limit_reset(response)
+        if reset:
+            sleep(reset)
 
 
 def has_tag(event: Dict[str, Any], key: str, value: str) -> bool:
-    for tag in event["tags"]:
-        if tag["key"] == key and tag["value"] == value:
-            return True
-    return False
+    return get_tag(event, key) == value
+
+
+def get_tag(event: Dict[str, Any], key: str) -> Optional[str]:
+    for tag in event.get("tags", ()):
+        if tag["key"] == key:
+            return tag["value"]
+    return None
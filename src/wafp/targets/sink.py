@@ -0,0 +1,308 @@
+"""A built-in replacement for a Sentry server.
+
+Targets report errors via `sentry_sdk` (see `sitecustomize.py` files in the catalog). Instead of sending them to a real
+Sentry instance and reading them back via its API, WAFP can run a small HTTP server that speaks the Sentry ingestion
+protocol (the `store` & `envelope` endpoints) and writes every event straight into the run's artifact directory
+as it arrives. Events are stored in the same shape as the Sentry API returns them, therefore `postprocessing` handles
+them the same way.
+
+The sink runs in the WAFP process. Containers reach it via `host.docker.internal`, which is added to all services by
+a compose override file.
+
+Usage: python -m wafp.targets.sink OUTPUT-DIRECTORY --port=PORT
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import pathlib
+import re
+import secrets
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+import attr
+import structlog
+import yaml
+
+from .. import build
+from ..artifacts import Artifact
+
+logger = structlog.get_logger()
+
+SINK_HOST = "host.docker.internal"
+PROJECT_ID = "1"
+# How often the number of received events is logged, in seconds
+LOG_INTERVAL = 5.0
+ENDPOINT_RE = re.compile(r"^/api/(?P<project>[^/]+)/(?P<endpoint>store|envelope)/?$")
+SENTRY_KEY_RE = re.compile(r"sentry_key=(?P<key>[^,\s]+)")
+
+
+def get_overrides_path(cache_dir: pathlib.Path, path: pathlib.Path, compose_file: str) -> str:
+    """Compose file that makes the host reachable from all services as `host.docker.internal`."""
+    definition = yaml.safe_load((path / compose_file).read_text()) or {}
+    override = {
+        "version": build.get_compose_version(path / compose_file),
+        "services": {
+            service: {"extra_hosts": [f"{SINK_HOST}:host-gateway"]} for service in definition.get("services") or {}
+        },
+    }
+    return build.store_overrides(cache_dir, override)
+
+
+def decode_body(body: bytes, encoding: Optional[str]) -> bytes:
+    if encoding == "gzip":
+        return gzip.decompress(body)
+    if encoding == "deflate":
+        return zlib.decompress(body)
+    return body
+
+
+def parse_event(payload: bytes) -> Dict[str, Any]:
+    event = json.loads(payload)
+    if not isinstance(event, dict):
+        raise ValueError("Event is not a JSON object")
+    return event
+
+
+def parse_envelope(body: bytes) -> List[Dict[str, Any]]:
+    """Events from an envelope. Other items, e.g. sessions or transactions, are skipped.
+
+    Raises `ValueError` if the envelope is malformed.
+    """
+    events = []
+    _, _, rest = body.partition(b"\n")
+    while rest.strip():
+        header_line, _, rest = rest.partition(b"\n")
+        if not header_line.strip():
+            continue
+        header = json.loads(header_line)
+        if not isinstance(header, dict):
+            raise ValueError("Envelope item header is not a JSON object")
+        length = header.get("length")
+        if length is None:
+            payload, _, rest = rest.partition(b"\n")
+        elif not isinstance(length, int) or length < 0:
+            raise ValueError(f"Invalid envelope item length: {length!r}")
+        else:
+            payload, rest = rest[:length], rest[length:]
+            # Payloads with explicit length may be followed by a newline
+            if rest.startswith(b"\n"):
+                rest = rest[1:]
+        if header.get("type") == "event":
+            events.append(parse_event(payload))
+    return events
+
+
+def get_message(event: Dict[str, Any]) -> str:
+    message = event.get("logentry") or event.get("message") or ""
+    if isinstance(message, dict):
+        return message.get("formatted") or message.get("message") or ""
+    return str(message)
+
+
+def normalize_frame(frame: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        **frame,
+        "filename": frame.get("filename") or frame.get("abs_path") or "",
+        "function": frame.get("function") or "",
+        "lineNo": frame.get("lineno"),
+        "colNo": frame.get("colno"),
+        "vars": frame.get("vars") or {},
+    }
+
+
+def normalize_exception(value: Dict[str, Any]) -> Dict[str, Any]:
+    stacktrace = value.get("stacktrace")
+    if stacktrace is not None:
+        stacktrace = {**stacktrace, "frames": [normalize_frame(frame) for frame in stacktrace.get("frames") or ()]}
+    return {**value, "type": value.get("type") or "Error", "stacktrace": stacktrace}
+
+
+def get_group_id(event: Dict[str, Any], exceptions: List[Dict[str, Any]]) -> str:
+    """A rough approximation of Sentry grouping - exception types & the functions they were raised in."""
+    digest = hashlib.sha256()
+    if event.get("fingerprint") and event["fingerprint"] != ["{{ default }}"]:
+        digest.update(json.dumps(event["fingerprint"]).encode())
+    elif exceptions:
+        for exception in exceptions:
+            digest.update(exception["type"].encode())
+            for frame in (exception.get("stacktrace") or {}).get("frames") or ():
+                digest.update(f"{frame['filename']}:{frame['function']}".encode())
+    else:
+        digest.update(get_message(event).encode())
+    return str(int(digest.hexdigest()[:12], 16))
+
+
+def normalize(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert an event sent by an SDK to the format of the Sentry events API."""
+    exceptions = [normalize_exception(value) for value in (event.get("exception") or {}).get("values") or ()]
+    message = get_message(event)
+    entries: List[Dict[str, Any]] = []
+    if exceptions:
+        entries.append({"type": "exception", "data": {"values": exceptions}})
+    request = event.get("request")
+    if request:
+        entries.append({"type": "request", "data": {**request, "url": request.get("url") or ""}})
+    if message:
+        entries.append({"type": "message", "data": {"formatted": message}})
+    breadcrumbs = event.get("breadcrumbs")
+    if breadcrumbs:
+        values = breadcrumbs.get("values", ()) if isinstance(breadcrumbs, dict) else breadcrumbs
+        entries.append({"type": "breadcrumbs", "data": {"values": list(values)}})
+    if exceptions:
+        last = exceptions[-1]
+        metadata: Dict[str, Any] = {"type": last["type"], "value": last.get("value") or ""}
+        title = f"{last['type']}: {last.get('value') or ''}".rstrip(": ")
+    else:
+        title = message or "<unlabeled event>"
+        metadata = {"title": title}
+    tags = event.get("tags") or {}
+    if isinstance(tags, dict):
+        tags = tags.items()
+    return {
+        "id": event.get("event_id"),
+        "eventID": event.get("event_id"),
+        "groupID": get_group_id(event, exceptions),
+        "title": title,
+        "message": message,
+        "culprit": event.get("transaction") or event.get("culprit") or "",
+        "dateCreated": event.get("timestamp"),
+        "platform": event.get("platform"),
+        "tags": [{"key": key, "value": str(value)} for key, value in tags],
+        "entries": entries,
+        "metadata": metadata,
+    }
+
+
+class SinkHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "SinkServer"
+
+    def log_message(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+    def send(self, status: int, body: Dict[str, Any]) -> None:
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def get_key(self) -> Optional[str]:
+        match = SENTRY_KEY_RE.search(self.headers.get("X-Sentry-Auth", ""))
+        if match is not None:
+            return match.group("key")
+        # SDKs that can not set headers pass the key in the query string
+        values = parse_qs(urlparse(self.path).query).get("sentry_key")
+        return values[0] if values else None
+
+    def get_content_length(self) -> Optional[int]:
+        try:
+            length = int(self.headers["Content-Length"])
+        except (TypeError, ValueError):
+            return None
+        return length if length >= 0 else None
+
+    def do_POST(self) -> None:
+        length = self.get_content_length()
+        if length is None:
+            # The body can not be skipped, therefore the connection can not be reused
+            self.close_connection = True
+            return self.send(400, {"detail": "Invalid Content-Length"})
+        body = self.rfile.read(length)
+        match = ENDPOINT_RE.match(urlparse(self.path).path)
+        if match is None:
+            return self.send(404, {"detail": "Not found"})
+        if self.get_key() != self.server.sink.key:
+            return self.send(401, {"detail": "Invalid sentry_key"})
+        try:
+            data = decode_body(body, self.headers.get("Content-Encoding"))
+            if match.group("endpoint") == "store":
+                events = [parse_event(data)]
+            else:
+                events = parse_envelope(data)
+        except (OSError, ValueError, zlib.error):
+            return self.send(400, {"detail": "Invalid payload"})
+        for event in events:
+            self.server.sink.add(event)
+        self.send(200, {"id": events[0].get("event_id") if events else None})
+
+
+class SinkServer(ThreadingHTTPServer):
+    daemon_threads = True
+    sink: "EventSink"
+
+
+@attr.s()
+class EventSink:
+    """Receives events from Sentry SDKs & stores them in `output_dir`."""
+
+    output_dir: pathlib.Path = attr.ib(converter=pathlib.Path)
+    host: str = attr.ib(default="0.0.0.0")
+    port: int = attr.ib(default=0)
+    key: str = attr.ib(factory=lambda: secrets.token_hex(16))
+    count: int = attr.ib(default=0, init=False)
+    _lock: threading.Lock = attr.ib(factory=threading.Lock, init=False, repr=False)
+    _server: Optional[SinkServer] = attr.ib(default=None, init=False, repr=False)
+    _logged_at: float = attr.ib(default=0.0, init=False, repr=False)
+
+    def start(self) -> None:
+        self._server = SinkServer((self.host, self.port), SinkHandler)
+        self._server.sink = self
+        self.port = self._server.server_port
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        logger.msg("Sentry sink is started", port=self.port, output_dir=str(self.output_dir))
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            logger.msg("Sentry sink is stopped", events=self.count)
+
+    def get_dsn(self, host: str = SINK_HOST) -> str:
+        return f"http://{self.key}@{host}:{self.port}/{PROJECT_ID}"
+
+    def add(self, event: Dict[str, Any]) -> None:
+        normalized = normalize(event)
+        if normalized["eventID"] is None:
+            normalized["id"] = normalized["eventID"] = secrets.token_hex(16)
+        with self._lock:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            Artifact.sentry_event(normalized).save_to(self.output_dir)
+            self.count += 1
+            now = time.monotonic()
+            if now - self._logged_at >= LOG_INTERVAL:
+                self._logged_at = now
+                logger.msg("Sentry events received", events=self.count, last=normalized["title"])
+
+
+def main(args: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m wafp.targets.sink")
+    parser.add_argument("output_dir", type=pathlib.Path, help="Directory to store events in")
+    parser.add_argument("--host", default="0.0.0.0", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=0, help="Port to listen on. Random by default")
+    parser.add_argument("--key", default=secrets.token_hex(16), help="Public key expected in the DSN")
+    parsed = parser.parse_args(args)
+    sink = EventSink(parsed.output_dir, host=parsed.host, port=parsed.port, key=parsed.key)
+    sink.start()
+    print(f"DSN: {sink.get_dsn()}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sink.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""Snapshots of targets that are ready for fuzzing.
+
+Some targets spend minutes on migrations & bootstrapping before they are ready. After the first successful start,
+their containers are committed to images and the content of their volumes is copied to separate images.
+Later runs create containers from these images, restore volumes, and only wait until the target is ready.
+"""
+import hashlib
+import json
+import pathlib
+import subprocess
+import tempfile
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+import attr
+
+from ..build import get_compose_version, get_context_hash, get_service_images
+from ..constants import TEMPORARY_DIRECTORY_PREFIX
+from ..docker import docker
+
+if TYPE_CHECKING:
+    from .core import BaseTarget
+
+# Copies volume content in & out of snapshots
+HELPER_IMAGE = "busybox:1.36"
+# Volume content is stored under this directory in snapshot images
+VOLUMES_ROOT = "/wafp-volumes"
+VOLUMES_TAG_SUFFIX = "-volumes"
+DURATION_LABEL = "wafp.snapshot.duration"
+VOLUMES_LABEL = "wafp.snapshot.volumes"
+# Differ between starts of the same target and are not part of the snapshot key. Containers are created from the
+# compose file on restore, therefore the current values are applied to them anyway
+RUNTIME_VARIABLES = frozenset(("PATH", "PORT", "WAFP_RUN_ID"))
+
+
+@attr.s()
+class Snapshot:
+    target: "BaseTarget" = attr.ib()
+    key: str = attr.ib()
+
+    @classmethod
+    def for_target(cls, target: "BaseTarget") -> "Snapshot":
+        compose_file = target.get_docker_compose_filename()
+        env = target.get_environment_variables()
+        images = get_service_images(target.name, target.path, compose_file, env)
+        # Snapshots are only valid for the same sources, environment, build arguments & base images
+        digest = hashlib.sha256(get_context_hash(target.path, compose_file).encode())
+        digest.update(
+            json.dumps(
+                {
+                    "env": {key: value for key, value in env.items() if key not in RUNTIME_VARIABLES},
+                    "images": {service: get_image_id(image) or image for service, image in images.items()},
+                },
+                sort_keys=True,
+            ).encode()
+        )
+        return cls(target=target, key=digest.hexdigest()[:16])
+
+    def get_image(self, service: str) -> str:
+        return f"wafp-snapshot/{self.target.name}/{service}:{self.target.__class__.__name__}-{self.key}"
+
+    def get_volumes_image(self, service: str) -> str:
+        return f"{self.get_image(service)}{VOLUMES_TAG_SUFFIX}"
+
+    def get_startup_duration(self) -> Optional[float]:
+        """How long it took to start the target before the snapshot was taken.
+
+        `None` if there is no complete snapshot for this target.
+        """
+        duration = 0.0
+        for service in self.target.compose.services():
+            labels = get_labels(self.get_image(service))
+            if labels is None or DURATION_LABEL not in labels:
+                return None
+            duration = max(duration, float(labels[DURATION_LABEL]))
+        return duration
+
+    def take(self, duration: float) -> None:
+        """Store the current state of all target containers & their volumes."""
+        containers = self.target.compose.containers()
+        # Paused containers do not change their filesystem, therefore all volumes are copied consistently
+        docker(["pause", *containers.values()])
+        try:
+            for service, container in containers.items():
+                volumes = get_volumes(container)
+                changes = [
+                    f'--change=LABEL {DURATION_LABEL}="{round(duration, 2)}"',
+                    f'--change=LABEL {VOLUMES_LABEL}="{",".join(volumes)}"',
+                ]
+                docker(["commit", "--pause=false", *changes, container, self.get_image(service)])
+                if volumes:
+                    self._store_volumes(service, container, volumes)
+        finally:
+            docker(["unpause", *containers.values()])
+        self.target.logger.msg("Snapshot is taken", key=self.key, services=list(containers))
+
+    def _store_volumes(self, service: str, container: str, volumes: List[str]) -> None:
+        helper = f"{self.target.project_name}_{service}_snapshot"
+        script = " && ".join(
+            f"mkdir -p {VOLUMES_ROOT}{volume} && cp -a {volume}/. {VOLUMES_ROOT}{volume}/" for volume in volumes
+        )
+        docker(["run", "--name", helper, "--volumes-from", container, HELPER_IMAGE, "sh", "-c", script])
+        try:
+            docker(["commit", helper, self.get_volumes_image(service)])
+        finally:
+            docker(["rm", "--force", helper])
+
+    def restore(self, timeout: Optional[int] = None, extra_env: Optional[Dict[str, str]] = None) -> None:
+        """Create target containers from the snapshot and start them."""
+        compose = self.target.compose
+        services = compose.services()
+        override = {
+            "version": get_compose_version(self.target.path / self.target.get_docker_compose_filename()),
+            "services": {service: {"image": self.get_image(service)} for service in services},
+        }
+        with tempfile.TemporaryDirectory(prefix=TEMPORARY_DIRECTORY_PREFIX) as directory:
+            path = pathlib.Path(directory) / "snapshot.yml"
+            # JSON is valid YAML
+            path.write_text(json.dumps(override))
+            compose.up(timeout=timeout, no_start=True, extra_env=extra_env, overrides=[str(path)])
+        for service, container in compose.containers().items():
+            labels = get_labels(self.get_image(service)) or {}
+            volumes = [volume for volume in labels.get(VOLUMES_LABEL, "").split(",") if volume]
+            if volumes:
+                script = " && ".join(f"cp -a {VOLUMES_ROOT}{volume}/. {volume}/" for volume in volumes)
+                docker(
+                    ["run", "--rm", "--volumes-from", container, self.get_volumes_image(service), "sh", "-c", script]
+                )
+        compose.start(timeout=timeout)
+
+
+def get_labels(image: str) -> Optional[Dict[str, str]]:
+    """Labels of a local image or `None` if it does not exist."""
+    try:
+        output = docker(["image", "inspect", "--format", "{{json .Config.Labels}}", image])
+    except subprocess.CalledProcessError:
+        return None
+    return json.loads(output) or {}
+
+
+def get_image_id(image: str) -> Optional[str]:
+    """ID of a local image or `None` if it does not exist."""
+    try:
+        return docker(["image", "inspect", "--format", "{{.Id}}", image]).decode().strip()
+    except subprocess.CalledProcessError:
+        return None
+
+
+def get_volumes(container: str) -> List[str]:
+    """Mount points of all volumes of a container. Bind mounts are not included."""
+    mounts = json.loads(docker(["inspect", "--format", "{{json .Mounts}}", container])) or []
+    return sorted(mount["Destination"] for mount in mounts if mount["Type"] == "volume")
@@ -0,0 +1,128 @@
+"""Nested timing spans of run phases.
+
+Phases are wrapped into spans, e.g. `with tracing.span("compose.up"):`. Spans started within another span are its
+children. Every finished span is logged, and all spans of a run are stored in its output directory in the Chrome
+trace format, which is supported by `chrome://tracing`, Perfetto and other trace viewers.
+"""
+import contextvars
+import functools
+import itertools
+import json
+import os
+import pathlib
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Generator, List, Optional, TypeVar
+
+import attr
+import structlog
+
+logger = structlog.get_logger()
+
+TRACE_FILENAME = "trace.json"
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+@attr.s(slots=True)
+class Span:
+    name: str = attr.ib()
+    id: int = attr.ib()
+    parent_id: Optional[int] = attr.ib()
+    # Nanoseconds since the epoch
+    start: int = attr.ib()
+    thread_id: int = attr.ib()
+    attributes: Dict[str, Any] = attr.ib(factory=dict)
+    # In nanoseconds
+    duration: int = attr.ib(default=0)
+
+    def to_chrome(self) -> Dict[str, Any]:
+        """A "complete" event of the Chrome trace format. Timestamps are in microseconds."""
+        return {
+            "name": self.name,
+            "cat": "wafp",
+            "ph": "X",
+            "ts": self.start / 1000,
+            "dur": self.duration / 1000,
+            "pid": os.getpid(),
+            "tid": self.thread_id,
+            "args": {**self.attributes, "span_id": self.id, "parent_id": self.parent_id},
+        }
+
+
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("span", default=None)
+
+
+@attr.s()
+class Tracer:
+    """Finished spans of the current process."""
+
+    spans: List[Span] = attr.ib(factory=list)
+    _ids: Any = attr.ib(factory=lambda: itertools.count(1), init=False, repr=False)
+    _lock: threading.Lock = attr.ib(factory=threading.Lock, init=False, repr=False)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Generator[Span, None, None]:
+        parent = _current.get()
+        current = Span(
+            name=name,
+            id=self._next_id(),
+            parent_id=parent.id if parent is not None else None,
+            start=time.time_ns(),
+            thread_id=threading.get_ident(),
+            attributes=attributes,
+        )
+        token = _current.set(current)
+        started = time.perf_counter_ns()
+        try:
+            yield current
+        except BaseException as exc:
+            current.attributes["error"] = type(exc).__name__
+            raise
+        finally:
+            current.duration = time.perf_counter_ns() - started
+            _current.reset(token)
+            with self._lock:
+                self.spans.append(current)
+            logger.debug("Span", span=name, duration=round(current.duration / 1e9, 3), **current.attributes)
+
+    def _next_id(self) -> int:
+        return next(self._ids)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.spans.clear()
+
+    def to_chrome(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda item: (item.start, item.id))
+        return {"traceEvents": [item.to_chrome() for item in spans], "displayTimeUnit": "ms"}
+
+    def flush(self, path: pathlib.Path) -> None:
+        """Store all finished spans in `path` & start over, e.g. for the next run in the same process."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("w") as fd:
+            json.dump(self.to_chrome(), fd)
+        self.clear()
+
+
+tracer = Tracer()
+
+
+def span(name: str, **attributes: Any) -> Any:
+    """Time a phase with the process-wide tracer."""
+    return tracer.span(name, **attributes)
+
+
+def traced(name: str) -> Callable[[F], F]:
+    """Time every call of the decorated function."""
+
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with tracer.span(name):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore
+
+    return decorator
@@ -1,4 +1,8 @@
-from typing import Any, Callable, Dict, List
+import os
+import pathlib
+import signal
+from types import FrameType
+from typing import Any, Callable, Dict, List, Optional
 from urllib.parse import urlparse
 
 from .errors import InvalidHeader
@@ -19,6 +23,24 @@ class NotSet:
 NOT_SET = NotSet()
 
 
+def exit_on_sigterm() -> None:
+    """Exit via `SystemExit` on SIGTERM, so `finally` blocks stop & remove containers.
+
+    The campaign scheduler terminates workers this way when the campaign is interrupted.
+    """
+
+    def handler(signum: int, frame: Optional[FrameType]) -> None:
+        raise SystemExit(128 + signum)
+
+    signal.signal(signal.SIGTERM, handler)
+
+
+def get_cache_dir() -> pathlib.Path:
+    """Directory for data that is reused across WAFP invocations."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return pathlib.Path(base) / "wafp"
+
+
 def is_url(location: str) -> bool:
     return urlparse(location).scheme != ""
 
@@ -38,3 +60,21 @@ def parse_headers(headers: List[str]) -> Dict[str, str]:
         key = key.strip()
         out[key] = value
     return out
+
+
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+
+def parse_size(value: str) -> int:
+    """Convert a human-readable size to bytes.
+
+    E.g. "512M" => 536870912
+    """
+    normalized = value.strip().upper().rstrip("B").rstrip("I")
+    number, unit = normalized, ""
+    if normalized and normalized[-1] in SIZE_UNITS:
+        number, unit = normalized[:-1], normalized[-1]
+    try:
+        return int(float(number) * SIZE_UNITS[unit])
+    except ValueError:
+        raise ValueError(f"Invalid size: {value}") from None
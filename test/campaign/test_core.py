@@ -0,0 +1,220 @@
+import subprocess
+import sys
+
+import pytest
+
+from wafp.campaign import Cell, CellState, CpuPool, Journal, Resources, Scheduler
+from wafp.campaign.core import format_duration, get_throughput
+
+GIB = 1024**3
+
+
+@pytest.fixture
+def fake_worker(mocker):
+    # Workers exit immediately with a return code that depends on the cell's iteration
+    popen = subprocess.Popen
+
+    def run(args, **kwargs):
+        output_dir = next(arg for arg in args if arg.startswith("--output-dir="))
+        iteration = output_dir.rsplit("-", 1)[-1]
+        return popen([sys.executable, "-c", f"import sys; sys.exit({int(iteration) % 2})"], **kwargs)
+
+    return mocker.patch("wafp.campaign.core.subprocess.Popen", side_effect=run)
+
+
+def test_cell_args(tmp_path):
+    cell = Cell(fuzzer="schemathesis:Default", target="httpbin", iteration=3, sentry_dsn="http://dsn")
+    assert cell.key == "schemathesis:Default-httpbin-3"
+    assert cell.get_args(tmp_path, port=8080) == [
+        "schemathesis:Default",
+        "httpbin",
+        f"--output-dir={tmp_path / cell.key}",
+        "--port=8080",
+        "--sentry-dsn=http://dsn",
+    ]
+
+
+def test_run_id(tmp_path):
+    cell = Cell(fuzzer="cats", target="httpbin", iteration=1)
+    run_ids = {cell.generate_run_id() for _ in range(10)}
+    # Every run of a cell gets its own ID
+    assert len(run_ids) == 10
+    assert all(run_id.startswith("cats-httpbin-1-") for run_id in run_ids)
+    command = Scheduler(output_dir=tmp_path).get_command([cell], 8080)
+    assert command[-1].startswith("--run-id=cats-httpbin-1-")
+
+
+def test_resources_fits():
+    budget = Resources(cpus=4, memory=8 * GIB)
+    assert budget.fits(Resources(cpus=4, memory=8 * GIB))
+    assert not budget.fits(Resources(cpus=1, memory=9 * GIB))
+    assert budget - Resources(cpus=1, memory=GIB) == Resources(cpus=3, memory=7 * GIB)
+
+
+def test_budget_limits_concurrency(tmp_path):
+    # When the budget allows only two cells at a time
+    scheduler = Scheduler(
+        output_dir=tmp_path, jobs=8, budget=Resources(cpus=2, memory=64 * GIB), demand=Resources(cpus=1, memory=GIB)
+    )
+    # Then more jobs do not lead to more concurrent runs
+    assert scheduler.can_start()
+    scheduler._running = {0: None, 1: None}
+    assert not scheduler.can_start()
+
+
+def test_demand_exceeds_budget(tmp_path):
+    with pytest.raises(ValueError, match="A single cell requires"):
+        Scheduler(output_dir=tmp_path, budget=Resources(cpus=1, memory=GIB), demand=Resources(cpus=2, memory=GIB))
+
+
+@pytest.mark.usefixtures("fake_worker")
+def test_run(tmp_path):
+    cells = [Cell(fuzzer="schemathesis", target="httpbin", iteration=iteration) for iteration in range(1, 6)]
+    scheduler = Scheduler(output_dir=tmp_path, jobs=3, poll_interval=0.01)
+    results = scheduler.run(cells)
+    # All cells are executed
+    assert sorted(result.cell.iteration for result in results) == [1, 2, 3, 4, 5]
+    # And return codes are collected from workers
+    assert {result.cell.iteration: result.returncode for result in results} == {1: 1, 2: 0, 3: 1, 4: 0, 5: 1}
+    assert len(list(scheduler.logs_dir.iterdir())) == 5
+    # Fake workers do not store any metadata
+    assert not any(result.completed for result in results)
+
+
+def test_cpu_pool():
+    pool = CpuPool([0, 1, 2, 3, 4, 5, 6, 7])
+    assert pool.acquire(2) == [0, 1]
+    assert pool.acquire(3) == [2, 3, 4]
+    pool.release([0, 1])
+    # The smallest range that fits is used
+    assert pool.acquire(2) == [0, 1]
+    assert pool.acquire(3) == [5, 6, 7]
+    pool.release([0, 2, 4])
+    # Fragmented CPUs are used when there is no range that fits
+    assert pool.acquire(2) == [0, 2]
+    assert pool.available == 1
+    with pytest.raises(ValueError, match="only 1 are available"):
+        pool.acquire(2)
+
+
+@pytest.fixture
+def host_cpus(mocker):
+    return mocker.patch("wafp.campaign.core.os.sched_getaffinity", return_value=set(range(8)), create=True)
+
+
+@pytest.mark.usefixtures("host_cpus")
+def test_pin_cpus(tmp_path, fake_worker):
+    cells = [Cell(fuzzer="schemathesis", target="httpbin", iteration=iteration) for iteration in range(1, 5)]
+    scheduler = Scheduler(
+        output_dir=tmp_path,
+        jobs=8,
+        budget=Resources(cpus=5, memory=64 * GIB),
+        demand=Resources(cpus=1.5, memory=GIB),
+        poll_interval=0.01,
+        pin_cpus=True,
+    )
+    # Only whole CPUs are pinned
+    assert scheduler.slots == 2
+    scheduler.run(cells)
+    cpusets = []
+    for call in fake_worker.call_args_list:
+        args = call.args[0]
+        assert "--cpus=1.5" in args
+        assert f"--memory={GIB}" in args
+        cpusets.extend(arg for arg in args if arg.startswith("--cpuset="))
+    # Concurrent cells get disjoint CPUs, and CPUs are reused after cells finish
+    assert len(cpusets) == 4
+    assert set(cpusets) <= {"--cpuset=0-1", "--cpuset=2-3"}
+    assert scheduler._cpus.available == 5
+
+
+@pytest.mark.usefixtures("host_cpus")
+def test_pin_cpus_budget(tmp_path):
+    with pytest.raises(ValueError, match="A single cell requires 2 CPUs, but only 1 can be pinned"):
+        Scheduler(
+            output_dir=tmp_path,
+            budget=Resources(cpus=1.5, memory=GIB),
+            demand=Resources(cpus=1.5, memory=GIB),
+            pin_cpus=True,
+        )
+
+
+@pytest.mark.usefixtures("fake_worker")
+def test_run_with_journal(tmp_path):
+    journal = Journal.in_directory(tmp_path)
+    cell = Cell(fuzzer="schemathesis", target="httpbin", iteration=1)
+    Scheduler(output_dir=tmp_path, poll_interval=0.01, journal=journal).run([cell])
+    assert journal.get_state(cell) == CellState.FAILED
+    journal.close()
+
+
+def test_throughput():
+    assert get_throughput(10, 1800) == 20
+    assert get_throughput(0, 0) == 0
+
+
+def test_eta(tmp_path):
+    scheduler = Scheduler(
+        output_dir=tmp_path,
+        jobs=2,
+        budget=Resources(cpus=8, memory=64 * GIB),
+        demand=Resources(cpus=1, memory=GIB),
+        estimate=lambda cell: 3600.0,
+    )
+    assert scheduler.get_eta() is None
+    scheduler._pending_work = 4 * 3600.0
+    # Work is split between two slots
+    assert scheduler.get_eta() == 2 * 3600.0
+    # When cells are twice faster than estimated
+    scheduler._estimated_work = 3600.0
+    scheduler._actual_work = 1800.0
+    # Then the ETA is adjusted
+    assert scheduler.get_eta() == 3600.0
+
+
+@pytest.mark.parametrize("seconds, expected", ((59, "0m"), (3 * 3600 + 120, "3h 2m"), (90000, "1d 1h 0m")))
+def test_format_duration(seconds, expected):
+    assert format_duration(seconds) == expected
+
+
+def test_make_batches(tmp_path):
+    scheduler = Scheduler(output_dir=tmp_path, warm_runs=2, can_reuse=lambda cell: cell.target == "httpbin")
+    cells = [
+        Cell(fuzzer=fuzzer, target=target, iteration=1)
+        for fuzzer in ("cats", "restler", "schemathesis")
+        for target in ("httpbin", "gitlab")
+    ]
+    batches = [[(cell.fuzzer, cell.target) for cell in batch] for batch in scheduler.make_batches(cells)]
+    assert batches == [
+        [("cats", "httpbin"), ("restler", "httpbin")],
+        [("cats", "gitlab")],
+        [("restler", "gitlab")],
+        [("schemathesis", "httpbin")],
+        [("schemathesis", "gitlab")],
+    ]
+
+
+def test_warm_command_limits(tmp_path):
+    scheduler = Scheduler(output_dir=tmp_path, warm_runs=2)
+    cells = [Cell(fuzzer=fuzzer, target="httpbin", iteration=3) for fuzzer in ("cats", "restler")]
+    command = scheduler.get_command(cells, 8080, scheduler.get_limits([4, 5]))
+    assert command[6:9] == ["--cpuset=4-5", "--cpus=1.0", f"--memory={2 * GIB}"]
+    # Without pinned CPUs there are no limits
+    assert scheduler.get_limits([]) is None
+
+
+def test_warm_command(tmp_path):
+    scheduler = Scheduler(output_dir=tmp_path, warm_runs=2)
+    cells = [Cell(fuzzer=fuzzer, target="httpbin", iteration=3) for fuzzer in ("cats", "restler")]
+    assert scheduler.get_command(cells, 8080)[2:] == [
+        "wafp.campaign.warm",
+        "httpbin",
+        "--port=8080",
+        f"--output-dir={tmp_path}",
+        "--run",
+        "cats",
+        "3",
+        "--run",
+        "restler",
+        "3",
+    ]
@@ -0,0 +1,105 @@
+import json
+import time
+
+import pytest
+
+from wafp import archive, store
+from wafp.campaign.harvest import Harvester, find_runs, get_project
+
+from ..sentry_api import make_events
+
+
+def store_run(directory, name, fuzzer, target, run_id):
+    run_dir = directory / name
+    (run_dir / "fuzzer").mkdir(parents=True)
+    (run_dir / "fuzzer" / "stdout.txt").write_text("Output")
+    (run_dir / "metadata.json").write_text(
+        json.dumps({"fuzzer": fuzzer, "target": target, "run_id": run_id, "duration": 1.0})
+    )
+    return run_dir
+
+
+@pytest.fixture
+def harvester(sentry_server, tmp_path):
+    sentry_server.projects = {"example": make_events(300)}
+    output_dir = tmp_path / "artifacts"
+    output_dir.mkdir()
+    return Harvester(output_dir, url=f"http://127.0.0.1:{sentry_server.server_port}/", token="TOKEN")
+
+
+def event_names(run):
+    return sorted(name for name in run.artifacts if name.startswith("target/"))
+
+
+def test_get_project():
+    assert get_project("example:Default") == "example"
+    assert get_project("httpbin") == "httpbin"
+
+
+def test_harvest(harvester, sentry_server, tmp_path):
+    output_dir = harvester.output_dir
+    store_run(output_dir, "example-example:Default-1", "example", "example:Default", "0")
+    archive.pack(store_run(output_dir, "example-example:Default-2", "example", "example:Default", "1"))
+    store.ArtifactStore(tmp_path / "blobs").pack(
+        store_run(output_dir, "example-example:Linked-1", "example", "example:Linked", "2")
+    )
+    # Another run without events
+    store_run(output_dir, "other-example:Default-1", "other", "example:Default", "3")
+    # Not reported to Sentry
+    store_run(output_dir, "example-httpbin-1", "example", "httpbin", "0")
+    assert harvester.harvest() == 300
+    # A single scan for the whole project + full payloads
+    assert sentry_server.requests == 3 + 300 + 1
+    runs = {run.path.name: run for run in find_runs(output_dir)}
+    for name, run_id in (
+        ("example-example:Default-1", 0),
+        ("example-example:Default-2.zip", 1),
+        ("example-example:Linked-1", 2),
+    ):
+        run = runs[name]
+        assert event_names(run) == sorted(f"target/sentry_event_{idx:032x}.json" for idx in range(run_id, 300, 3)), name
+    event = json.loads((runs["example-example:Default-1"].path / f"target/sentry_event_{0:032x}.json").read_text())
+    assert event["entries"] == [{"type": "exception"}]
+    with store.open_artifact(runs["example-example:Linked-1"].path, "fuzzer/stdout.txt") as fd:
+        assert fd.read() == b"Output"
+    assert event_names(runs["other-example:Default-1"]) == []
+    assert event_names(runs["example-httpbin-1"]) == []
+    # Stored events are not fetched again
+    sentry_server.requests = 0
+    assert harvester.harvest() == 0
+    assert sentry_server.requests == 3 + 1
+
+
+def test_new_events(harvester, sentry_server):
+    run_dir = store_run(harvester.output_dir, "example-example:Default-1", "example", "example:Default", "0")
+    sentry_server.projects["example"] = make_events(150)
+    assert harvester.harvest() == 50
+    # Sentry ingested more events since the last harvest
+    sentry_server.projects["example"] = make_events(300)
+    assert harvester.harvest() == 50
+    assert len(list((run_dir / "target").iterdir())) == 100
+
+
+def test_background(harvester, sentry_server):
+    store_run(harvester.output_dir, "example-example:Default-1", "example", "example:Default", "0")
+    harvester.interval = 0.01
+    harvester.start()
+    try:
+        while not (harvester.output_dir / "example-example:Default-1" / "target").exists():
+            time.sleep(0.01)
+    finally:
+        harvester.stop()
+    assert harvester.harvest() == 0
+
+
+def test_timeout(harvester, sentry_server, mocker):
+    run_dir = store_run(harvester.output_dir, "example-example:Default-1", "example", "example:Default", "0")
+    mocker.patch("wafp.targets.sentry.REQUEST_TIMEOUT", 0.05)
+    # When Sentry does not respond in time
+    sentry_server.delay = 0.2
+    # Then the harvest fails without storing events
+    assert harvester.harvest() == 0
+    assert not (run_dir / "target").exists()
+    # And they are stored by the next harvest
+    sentry_server.delay = 0.0
+    assert harvester.harvest() == 100
@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+from wafp.archive import pack
+from wafp.campaign import Cell, History, get_group, get_startup_costs
+from wafp.campaign.history import DEFAULT_DURATION, get_startup_cost
+from wafp.fuzzers import loader as fuzzers_loader
+from wafp.targets import Metadata
+from wafp.targets import loader as targets_loader
+
+
+def store_metadata(directory, name, fuzzer, target, duration):
+    (directory / name).mkdir()
+    (directory / name / "metadata.json").write_text(
+        json.dumps({"fuzzer": fuzzer, "target": target, "run_id": "1", "duration": duration})
+    )
+
+
+def test_from_directory(tmp_path):
+    store_metadata(tmp_path, "a-1", "schemathesis:Default", "httpbin", 10.0)
+    store_metadata(tmp_path, "a-2", "schemathesis:Default", "httpbin", 20.0)
+    store_metadata(tmp_path, "b-1", "restler", "gitlab", 90.0)
+    (tmp_path / "broken").mkdir()
+    (tmp_path / "broken" / "metadata.json").write_text("{")
+    history = History.from_directory(tmp_path)
+    assert history.estimate(Cell(fuzzer="schemathesis:Default", target="httpbin", iteration=1)) == 15.0
+    # Unknown combinations get the average estimate
+    assert history.estimate(Cell(fuzzer="cats", target="httpbin", iteration=1)) == pytest.approx(52.5)
+
+
+def test_from_packed_runs(tmp_path):
+    store_metadata(tmp_path, "a-1", "schemathesis:Default", "httpbin", 10.0)
+    store_metadata(tmp_path, "a-2", "schemathesis:Default", "httpbin", 20.0)
+    pack(tmp_path / "a-2")
+    history = History.from_directory(tmp_path)
+    assert history.estimate(Cell(fuzzer="schemathesis:Default", target="httpbin", iteration=1)) == 15.0
+
+
+def test_empty():
+    assert History().estimate(Cell(fuzzer="cats", target="httpbin", iteration=1)) == DEFAULT_DURATION
+
+
+def test_fallbacks():
+    history = History(
+        durations={("restler", "pulpcore"): [300.0], ("restler", "httpbin"): [100.0], ("cats", "httpbin"): [20.0]},
+        groups={"pulpcore": "PYTHON:Django", "cccatalog_api": "PYTHON:Django", "httpbin": "PYTHON:Flask"},
+    )
+    # Similar targets are used when the combination has no history
+    assert history.estimate(Cell(fuzzer="restler", target="cccatalog_api", iteration=1)) == 300.0
+    # Then the fuzzer's average duration
+    assert history.estimate(Cell(fuzzer="restler", target="mailhog", iteration=1)) == 200.0
+    # Then the global average
+    assert history.estimate(Cell(fuzzer="got_swag", target="mailhog", iteration=1)) == 140.0
+
+
+def test_get_group():
+    metadata = Metadata.flasgger(
+        flask_version="1.0.2", flasgger_version="0.9.0", openapi_version="2.0", validation_from_schema=False
+    )
+    assert get_group(metadata) == "PYTHON:Flask"
+
+
+def test_order():
+    history = History(durations={("cats", "gitlab"): [300.0], ("cats", "httpbin"): [20.0]})
+    cells = [Cell(fuzzer="cats", target=target, iteration=1) for target in ("httpbin", "gitlab", "mailhog")]
+    assert [cell.target for cell in history.order(cells)] == ["gitlab", "mailhog", "httpbin"]
+
+
+def test_startup_cost():
+    assert get_startup_cost(targets_loader.by_name("httpbin")) == 1
+    assert get_startup_cost(targets_loader.by_name("cccatalog_api:Default")) == 6
+    assert get_startup_costs([Cell(fuzzer="restler", target="open_fec:Default", iteration=1)]) == {
+        "restler": 1,
+        "open_fec:Default": 3,
+    }
+    assert get_startup_cost(fuzzers_loader.by_name("tnt_fuzzer")) == 2
+
+
+def test_cold_start():
+    history = History(costs={"cats": 1, "httpbin": 1, "cccatalog_api:Default": 6})
+    cells = [Cell(fuzzer="cats", target=target, iteration=1) for target in ("httpbin", "cccatalog_api:Default")]
+    # Without any history, cells with more containers to start are estimated to take longer
+    assert [history.estimate(cell) for cell in cells] == [DEFAULT_DURATION, DEFAULT_DURATION * 3.5]
+    assert [cell.target for cell in history.order(cells)] == ["cccatalog_api:Default", "httpbin"]
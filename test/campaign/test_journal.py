@@ -0,0 +1,73 @@
+import pytest
+
+from wafp.campaign import Cell, CellResult, CellState, Journal
+from wafp.campaign.journal import get_checksum
+
+
+@pytest.fixture
+def journal(tmp_path):
+    instance = Journal.in_directory(tmp_path)
+    yield instance
+    instance.close()
+
+
+def make_cell(iteration=1):
+    return Cell(fuzzer="schemathesis:Default", target="httpbin", iteration=iteration)
+
+
+def store_run(output_dir, cell):
+    directory = output_dir / cell.key
+    directory.mkdir()
+    (directory / "metadata.json").write_text("{}")
+
+
+def test_state_transitions(tmp_path, journal):
+    cell = make_cell()
+    assert journal.get_state(cell) is None
+    journal.record_start(cell)
+    assert journal.get_state(cell) == CellState.RUNNING
+    store_run(tmp_path, cell)
+    journal.record_finish(CellResult(cell=cell, returncode=1, duration=1.5, completed=True), tmp_path)
+    assert journal.get_state(cell) == CellState.FINISHED
+
+
+def test_resume(tmp_path, journal):
+    crashed, failed, finished, new = [make_cell(iteration) for iteration in range(1, 5)]
+    for cell in (crashed, failed, finished):
+        journal.record_start(cell)
+    journal.record_finish(CellResult(cell=failed, returncode=1, duration=1.0, completed=False), tmp_path)
+    store_run(tmp_path, finished)
+    journal.record_finish(CellResult(cell=finished, returncode=0, duration=1.0, completed=True), tmp_path)
+    # Only unfinished cells are pending
+    assert journal.filter_pending([crashed, failed, finished, new], tmp_path) == [crashed, failed, new]
+
+
+def test_resume_persisted(tmp_path):
+    cell = make_cell()
+    journal = Journal.in_directory(tmp_path)
+    journal.record_start(cell)
+    journal.close()
+    # When the journal is reopened after a crash
+    journal = Journal.in_directory(tmp_path)
+    # Then the cell state is restored
+    assert journal.get_state(cell) == CellState.RUNNING
+    journal.close()
+
+
+def test_legacy_directories(tmp_path, journal):
+    # When a run directory was created without a journal
+    complete, partial = make_cell(1), make_cell(2)
+    store_run(tmp_path, complete)
+    (tmp_path / partial.key).mkdir()
+    # Then only complete runs are considered finished
+    assert journal.filter_pending([complete, partial], tmp_path) == [partial]
+    assert journal.get_state(complete) == CellState.FINISHED
+
+
+def test_checksum(tmp_path):
+    (tmp_path / "fuzzer").mkdir()
+    (tmp_path / "fuzzer" / "stdout.txt").write_bytes(b"output")
+    first = get_checksum(tmp_path)
+    assert first == get_checksum(tmp_path)
+    (tmp_path / "fuzzer" / "stdout.txt").write_bytes(b"another output")
+    assert first != get_checksum(tmp_path)
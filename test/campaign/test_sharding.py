@@ -0,0 +1,104 @@
+import time
+
+import pytest
+
+from wafp.campaign import Cell, CellQueue, CellResult, Shard
+from wafp.campaign.sharding import partition
+
+DURATIONS = {"gitlab": 100.0, "httpbin": 10.0, "mailhog": 5.0}
+
+
+def estimate(cell):
+    return DURATIONS[cell.target]
+
+
+@pytest.fixture
+def cells():
+    return [
+        Cell(fuzzer="schemathesis", target=target, iteration=iteration)
+        for target in DURATIONS
+        for iteration in range(1, 5)
+    ]
+
+
+@pytest.mark.parametrize("value, expected", (("1/2", Shard(1, 2)), (" 3/3 ", Shard(3, 3))))
+def test_parse_shard(value, expected):
+    assert Shard.parse(value) == expected
+
+
+@pytest.mark.parametrize("value", ("1", "0/2", "3/2", "a/b"))
+def test_parse_invalid_shard(value):
+    with pytest.raises(ValueError):
+        Shard.parse(value)
+
+
+def test_partition(cells):
+    parts = partition(cells, 4, estimate)
+    # Every cell is assigned exactly once
+    assert sorted(cell.key for part in parts for cell in part) == sorted(cell.key for cell in cells)
+    # Slow cells are spread evenly
+    loads = [sum(map(estimate, part)) for part in parts]
+    assert max(loads) - min(loads) <= 10
+    # And the partitioning does not depend on the input order
+    assert partition(list(reversed(cells)), 4, estimate) == parts
+    assert Shard(2, 4).select(cells, estimate) == parts[1]
+
+
+@pytest.fixture
+def queue_path(tmp_path):
+    return tmp_path / "queue.db"
+
+
+def drain(queue):
+    claimed = []
+    for cell in queue.claim():
+        claimed.append(cell)
+        queue.record_finish(CellResult(cell=cell, returncode=0, duration=1.0, completed=cell.target != "mailhog"))
+    return claimed
+
+
+def test_queue(queue_path, cells):
+    first = CellQueue(queue_path, worker="first")
+    second = CellQueue(queue_path, worker="second")
+    first.populate(cells, estimate)
+    # Populating the queue from multiple workers does not duplicate cells
+    second.populate(cells, estimate)
+    claims = first.claim()
+    # The longest cells are claimed first
+    assert next(claims).target == "gitlab"
+    claimed = drain(second)
+    assert len(claimed) == len(cells) - 1
+    assert list(claims) == []
+    first.close()
+    second.close()
+
+
+def test_queue_release(queue_path, cells):
+    queue = CellQueue(queue_path, worker="first")
+    queue.populate(cells, estimate)
+    drain(queue)
+    assert list(queue.claim()) == []
+    # When the worker is restarted
+    queue.release()
+    # Then its failed cells are available again
+    assert {cell.target for cell in queue.claim()} == {"mailhog"}
+    queue.close()
+
+
+def test_queue_lease(queue_path, cells):
+    crashed = CellQueue(queue_path, worker="crashed", lease_timeout=0.2)
+    crashed.populate(cells, estimate)
+    # When a host claims a cell and never finishes it
+    claimed = next(crashed.claim())
+    crashed.close()
+    other = CellQueue(queue_path, worker="other", lease_timeout=0.2, heartbeat_interval=0.0)
+    running = next(other.claim())
+    assert running != claimed
+    time.sleep(0.3)
+    # Then the lease of a running cell is kept by its heartbeats
+    other.heartbeat()
+    # And the abandoned cell is returned to the queue once its lease expires
+    keys = {cell.key for cell in drain(other)}
+    assert claimed.key in keys
+    assert running.key not in keys
+    other.close()
@@ -0,0 +1,52 @@
+from types import SimpleNamespace
+
+from wafp import tracing
+from wafp.campaign import warm
+from wafp.campaign.warm import parse_args
+from wafp.targets import Isolation
+from wafp.targets.core import TargetContext
+
+
+def test_parse_args():
+    args = parse_args(["httpbin", "--port=8080", "--output-dir=/tmp", "--run", "cats", "1", "--run", "restler", "2"])
+    assert args.run == [["cats", "1"], ["restler", "2"]]
+
+
+def test_isolation_by_default(target_package):
+    # Targets have to explicitly declare that they can be reused
+    assert target_package.Default.reset_isolation == Isolation.NONE
+
+
+def test_trace_of_last_run(monkeypatch, tmp_path, target_package):
+    # When multiple runs share a target
+    class Reusable(target_package.Default):
+        reset_isolation = Isolation.FULL
+
+        def start(self, extra_env=None):
+            return TargetContext(base_url=self.get_base_url(), schema_location=self.get_schema_location(), headers={})
+
+        def reset(self):
+            with tracing.span("target.reset"):
+                return self.start()
+
+        def stop(self):
+            with tracing.span("target.stop"):
+                pass
+
+        def cleanup(self):
+            pass
+
+    traces = {}
+
+    def finish_run(cli_args, target, result, context):
+        traces[cli_args.fuzzer] = [item.name for item in tracing.tracer.spans]
+        tracing.tracer.clear()
+
+    monkeypatch.setattr(warm, "ensure_docker_version", lambda: None)
+    monkeypatch.setattr(warm.targets.loader, "by_name", lambda name: Reusable)
+    monkeypatch.setattr(warm, "fuzz", lambda *args: SimpleNamespace(completed_process=SimpleNamespace(returncode=0)))
+    monkeypatch.setattr(warm, "finish_run", finish_run)
+    tracing.tracer.clear()
+    warm.main(["httpbin", "--port=8080", f"--output-dir={tmp_path}", "--run", "cats", "1", "--run", "restler", "2"])
+    # Then the trace of the last run includes stopping the target
+    assert traces == {"cats": [], "restler": ["target.reset", "target.stop"]}
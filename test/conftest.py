@@ -2,6 +2,7 @@ import pytest
 
 from wafp.docker import ensure_docker_version
 
+from .sentry_api import make_server
 from .targets import targets_catalog
 
 
@@ -15,6 +16,14 @@ def check_setup():
     ensure_docker_version()
 
 
+@pytest.fixture
+def sentry_server():
+    server = make_server()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
 @pytest.fixture
 def artifacts_dir(tmp_path_factory):
     return tmp_path_factory.mktemp("artifacts")
@@ -0,0 +1,99 @@
+"""A stand-in for the Sentry events API."""
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from wafp.targets import sentry
+
+PAGE_SIZE = 100
+EVENTS_PATH = re.compile(r"/api/0/projects/(?P<organization>[^/]+)/(?P<project>[^/]+)/events/(?:(?P<id>\d+)/)?")
+
+
+def make_events(count, fuzzer="example"):
+    return [
+        {
+            "id": str(idx),
+            "eventID": f"{idx:032x}",
+            "tags": [{"key": "wafp.run-id", "value": str(idx % 3)}, {"key": "wafp.fuzzer-id", "value": fuzzer}],
+        }
+        for idx in range(count)
+    ]
+
+
+def matches(event, query):
+    match = re.fullmatch(r'has:(.+)|(.+?):"(.*)"', query)
+    if match.group(1) is not None:
+        return sentry.get_tag(event, match.group(1)) is not None
+    return sentry.has_tag(event, match.group(2), match.group(3))
+
+
+class SentryHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args, **kwargs):
+        pass
+
+    def send(self, status, body, headers=()):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        server = self.server
+        time.sleep(server.delay)
+        with server.lock:
+            server.requests += 1
+            if server.rate_limited > 0:
+                server.rate_limited -= 1
+                return self.send(429, {"detail": "Rate limited"}, [("Retry-After", "0")])
+        assert self.headers["Authorization"] == "Bearer TOKEN"
+        parsed = urlparse(self.path)
+        match = EVENTS_PATH.fullmatch(parsed.path)
+        if match is None or match.group("project") not in server.projects:
+            return self.send(404, {"detail": "Not found"})
+        events = server.projects[match.group("project")]
+        if match.group("id") is None:
+            return self.list_events(parsed.path, events, parse_qs(parsed.query))
+        event = events[int(match.group("id"))]
+        self.send(200, {**event, "entries": [{"type": "exception"}]})
+
+    def list_events(self, path, events, query):
+        server = self.server
+        if server.supports_query and "query" in query:
+            events = [event for event in events if matches(event, query["query"][0])]
+            server.filtered = True
+        cursor = int(query.get("cursor", ["0"])[0])
+        page = events[cursor : cursor + PAGE_SIZE]
+        has_next = cursor + PAGE_SIZE < len(events)
+        # Sentry keeps all query parameters in pagination links
+        next_query = urlencode({**{key: value[0] for key, value in query.items()}, "cursor": cursor + PAGE_SIZE})
+        link = (
+            f'<http://127.0.0.1:{server.server_port}{path}?{next_query}>; rel="next"; '
+            f'results="{str(has_next).lower()}"; cursor="{cursor + PAGE_SIZE}"'
+        )
+        summaries = [{"id": event["id"], "eventID": event["eventID"], "tags": event["tags"]} for event in page]
+        self.send(200, summaries, [("Link", link)])
+
+
+def make_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SentryHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.projects = {"project": make_events(3000)}
+    server.requests = 0
+    server.rate_limited = 0
+    # Seconds before every response
+    server.delay = 0.0
+    server.supports_query = True
+    server.filtered = False
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -22,7 +22,8 @@ class Default(BaseTarget):
     def is_ready(self, line: bytes) -> bool:
         return b"Uvicorn running on " in line
 
-    def get_metadata(self) -> Metadata:
+    @classmethod
+    def get_metadata(cls) -> Metadata:
         return Metadata(
             language=Language.PYTHON,
             framework=FAST_API,
@@ -38,7 +39,8 @@ class WithOpenAPI3File(Default):
     def get_schema_location(self) -> str:
         return str(self.path / "openapi.json")
 
-    def get_metadata(self) -> Metadata:
+    @classmethod
+    def get_metadata(cls) -> Metadata:
         return Metadata(
             language=Language.PYTHON,
             framework=FAST_API,
@@ -54,7 +56,8 @@ class WithOpenAPI2File(Default):
     def get_schema_location(self) -> str:
         return str(self.path / "swagger.json")
 
-    def get_metadata(self) -> Metadata:
+    @classmethod
+    def get_metadata(cls) -> Metadata:
         return Metadata(
             language=Language.PYTHON,
             framework=FAST_API,
@@ -62,3 +65,9 @@ class WithOpenAPI2File(Default):
             specification=Specification(name=SpecificationType.OPENAPI, version="2.0"),
             validation_from_schema=True,
         )
+
+
+class WithSnapshots(Default):
+    """Started from snapshots after the first start."""
+
+    supports_snapshots = True
@@ -1,9 +1,15 @@
+import socket
 import subprocess
+import threading
+import time
 from time import sleep
 
 import pytest
 
 from wafp.constants import COMPOSE_PROJECT_NAME_PREFIX
+from wafp.targets import BaseTarget
+from wafp.targets.core import exclude_lines
+from wafp.targets.network import unused_port
 
 
 @pytest.fixture
@@ -59,6 +65,31 @@ def test_compose_rm(target):
     assert f"Removing {COMPOSE_PROJECT_NAME_PREFIX}example_target_web_1 ... done".encode() in target.compose.rm().stdout
 
 
+@pytest.mark.usefixtures("running_target")
+def test_compose_restart(target):
+    assert (
+        f"Restarting {COMPOSE_PROJECT_NAME_PREFIX}example_target_web_1 ... done".encode()
+        in target.compose.restart().stdout
+    )
+
+
+def test_reset(target):
+    target.start()
+    # When the running target is reset
+    context = target.reset()
+    # Then it is ready to serve requests again
+    assert context.base_url == target.get_base_url()
+    assert_until(lambda: target.compose.logs().stdout.count(b"Uvicorn running on") == 2)
+    # And artifacts of the next run contain only logs printed since the reset
+    assert_until(lambda: target.collect_artifacts()[0].value.count(b"Uvicorn running on") == 1)
+
+
+def test_exclude_lines():
+    stdout = b"web_1  | 10:00 Started\nweb_1  | 10:05 Started\nweb_1  | 10:06 Ready"
+    assert exclude_lines(stdout, {b"web_1  | 10:00 Started"}) == b"web_1  | 10:05 Started\nweb_1  | 10:06 Ready"
+    assert exclude_lines(stdout, set()) == stdout
+
+
 def test_manually_removed_image(target):
     # Build the target first
     target.compose.up()
@@ -78,3 +109,54 @@ def test_run(target):
         assert_until(
             lambda: b"Uvicorn running on http://0.0.0.0:80 (Press CTRL+C to quit)\n" in target.compose.logs().stdout
         )
+
+
+class SlowLogs:
+    """Logs where the readiness line appears after a delay."""
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    def log_stream(self, deadline, seen=None):
+        yield b"web_1  | Starting"
+        sleep(self.delay)
+        yield b"web_1  | Ready"
+
+    def logs(self):
+        return subprocess.CompletedProcess([], 0, stdout=b"web_1  | Starting\nweb_1  | Ready")
+
+
+class Stub(BaseTarget):
+    compose = None
+
+    def get_base_url(self):
+        return f"http://127.0.0.1:{self.port}/"
+
+    def get_schema_location(self):
+        return f"http://127.0.0.1:{self.port}/openapi.json"
+
+    def is_ready(self, line):
+        return line.endswith(b"Ready")
+
+    @classmethod
+    def get_metadata(cls):
+        raise NotImplementedError
+
+
+def test_wait_until_ready_concurrently():
+    # When the target port is opened and the readiness is logged at about the same time
+    target = Stub(port=unused_port())
+    target.compose = SlowLogs(0.5)
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    timer = threading.Timer(0.5, lambda: (listener.bind(("127.0.0.1", target.port)), listener.listen()))
+    timer.start()
+    try:
+        start = time.perf_counter()
+        context = target.wait_until_ready(start, time.time() + 10)
+    finally:
+        timer.cancel()
+        listener.close()
+    # Then both signals are awaited at the same time
+    assert context.startup["duration"] < 0.9
+    assert 0.5 <= context.startup["ready"] <= context.startup["duration"]
+    assert 0.5 <= context.startup["available"] <= context.startup["duration"]
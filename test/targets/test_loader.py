@@ -2,8 +2,9 @@ import sys
 
 import pytest
 
+import wafp.loader
 from wafp.errors import AmbiguousItemNameError
-from wafp.targets import BaseTarget, loader
+from wafp.targets import BaseTarget, Language, Metadata, loader
 
 TARGET_WITH_ONE_VARIANT = """
 from wafp import targets
@@ -152,3 +153,47 @@ def test_exclude_by_attribute(target, catalog):
     # When there is a class that is explicitly excluded from collection
     # Then it should not be listed in available variants
     assert list(loader.get_all_variants(catalog=catalog)) == ["my_target"]
+
+
+def test_index(target, catalog, catalog_path, monkeypatch, tmp_path_factory):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path_factory.mktemp("cache")))
+    module_name = f"{catalog}.{target}"
+    assert list(loader.get_all_variants(catalog=catalog)) == ["my_target:Another", "my_target:Default"]
+    # When the index is already built
+    sys.modules.pop(module_name)
+    assert list(loader.get_all_variants(catalog=catalog)) == ["my_target:Another", "my_target:Default"]
+    # Then packages are not imported to list their variants
+    assert module_name not in sys.modules
+    # And loading a single variant imports only its package
+    assert loader.by_name(f"{target}:Default", catalog).__name__ == "Default"
+    assert module_name in sys.modules
+    # When the package changes
+    sys.modules.pop(module_name)
+    (catalog_path / target / "__init__.py").write_text(TARGET_WITH_ONE_VARIANT)
+    # Then the index is updated
+    assert list(loader.get_all_variants(catalog=catalog)) == ["my_target"]
+
+
+def test_memoized(target, catalog, catalog_path, mocker):
+    iter_children = mocker.spy(wafp.loader, "iter_children")
+    variant = loader.by_name(f"{target}:Default", catalog)
+    # Resolved names are memoized, and the package is scanned only once
+    assert loader.by_name(f"{target}:Default", catalog) is variant
+    assert loader.by_name(f"{target}:Another", catalog).__name__ == "Another"
+    assert len(loader.load_all_variants(target, catalog=catalog)) == 2
+    assert iter_children.call_count == 1
+    # When the package changes
+    sys.modules.pop(f"{catalog}.{target}")
+    (catalog_path / target / "__init__.py").write_text(TARGET_WITH_ONE_VARIANT)
+    # Then the old variants are returned until the registry is invalidated
+    assert loader.by_name(f"{target}:Another", catalog) is not None
+    wafp.loader.invalidate()
+    assert loader.by_name(f"{target}:Another", catalog) is None
+    assert loader.by_name(target, catalog).__name__ == "Default"
+
+
+def test_get_metadata(targets_catalog):
+    metadata = loader.get_metadata("example_target:Default", catalog=targets_catalog.__name__)
+    assert isinstance(metadata, Metadata)
+    assert metadata.language == Language.PYTHON
+    assert loader.get_metadata("unknown", catalog=targets_catalog.__name__) is None
@@ -1,5 +1,66 @@
-from wafp.targets.network import is_available
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from wafp.targets.errors import NoPortAvailable
+from wafp.targets.network import PortRegistry, is_available
+
+PROCESSES = 8
+RESERVATIONS = 50
 
 
 def test_is_available():
     assert not is_available("http://127.0.0.1:1")
+
+
+def test_reserve(tmp_path):
+    registry = PortRegistry(tmp_path)
+    port = registry.reserve()
+    assert registry.is_reserved(port)
+    # Another registry, e.g. in another process, can not reserve the same port
+    other = PortRegistry(tmp_path)
+    assert not other.try_reserve(port)
+    registry.release(port)
+    assert not registry.is_reserved(port)
+    assert other.try_reserve(port)
+    # Unknown ports are ignored
+    registry.release(port)
+    assert other.is_reserved(port)
+
+
+def test_no_port_available(tmp_path, mocker):
+    registry = PortRegistry(tmp_path)
+    port = registry.reserve()
+    mocker.patch("wafp.targets.network.unused_port", return_value=port)
+    with pytest.raises(NoPortAvailable):
+        PortRegistry(tmp_path).reserve()
+
+
+def reserve_many(directory, barrier, queue):
+    registry = PortRegistry(directory)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        ports = list(executor.map(lambda _: registry.reserve(), range(RESERVATIONS)))
+    queue.put(ports)
+    # Keep the reservations until all processes are done
+    barrier.wait()
+
+
+def test_concurrent_reservations(tmp_path):
+    # Hundreds of reservations from multiple processes & threads at the same time
+    context = multiprocessing.get_context("fork")
+    barrier = context.Barrier(PROCESSES)
+    queue = context.Queue()
+    processes = [context.Process(target=reserve_many, args=(tmp_path, barrier, queue)) for _ in range(PROCESSES)]
+    for process in processes:
+        process.start()
+    ports = [port for _ in processes for port in queue.get(timeout=60)]
+    for process in processes:
+        process.join(timeout=60)
+        assert process.exitcode == 0
+    # All ports are unique
+    assert len(ports) == PROCESSES * RESERVATIONS
+    assert len(set(ports)) == len(ports)
+    # Reservations are released when processes exit
+    registry = PortRegistry(tmp_path)
+    assert all(registry.try_reserve(port) for port in ports[:10])
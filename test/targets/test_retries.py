@@ -1,10 +1,87 @@
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
 import pytest
 
 from wafp.targets.errors import TargetNotAccessible
-from wafp.targets.retries import wait
+from wafp.targets.network import unused_port
+from wafp.targets.retries import is_healthy, wait
 
 
 def test_wait_not_available():
     url = "http://127.0.0.1:1"
     with pytest.raises(TargetNotAccessible, match=f"{url} is not accessible"):
         wait(url, retries=1, delay=0, jitter=(0, 0))
+
+
+def test_wait_timeout():
+    start = time.perf_counter()
+    with pytest.raises(TargetNotAccessible):
+        wait("http://127.0.0.1:1", timeout=0.3)
+    assert time.perf_counter() - start < 1.0
+
+
+def test_wait_stop():
+    stop = threading.Event()
+    stop.set()
+    with pytest.raises(TargetNotAccessible):
+        wait("http://127.0.0.1:1", delay=10, stop=stop)
+
+
+@pytest.fixture
+def delayed_listener():
+    # Starts accepting connections some time after the test starts
+    port = unused_port()
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    timer = threading.Timer(0.3, lambda: (server.bind(("127.0.0.1", port)), server.listen()))
+    timer.start()
+    yield f"http://127.0.0.1:{port}"
+    timer.cancel()
+    server.close()
+
+
+def test_wait_fast(delayed_listener):
+    start = time.perf_counter()
+    wait(delayed_listener)
+    # The target is noticed shortly after it becomes available
+    assert time.perf_counter() - start < 0.8
+
+
+class Handler(BaseHTTPRequestHandler):
+    # The first requests fail, like a service that is still starting behind an open port
+    failures = 2
+
+    def do_GET(self):
+        if Handler.failures > 0:
+            Handler.failures -= 1
+            self.send_response(503)
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def http_server():
+    Handler.failures = 2
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def test_health_check(http_server):
+    assert not is_healthy(f"{http_server}/openapi.json")
+    wait(http_server, health_url=f"{http_server}/openapi.json")
+    assert Handler.failures == 0
+    assert is_healthy(f"{http_server}/openapi.json")
+    assert not is_healthy("http://127.0.0.1:1/openapi.json")
@@ -0,0 +1,47 @@
+import pytest
+
+from wafp.targets import sentry
+
+
+def list_events(server, run_id):
+    return sentry.list_events(f"http://127.0.0.1:{server.server_port}/", "TOKEN", "org", "project", run_id)
+
+
+@pytest.mark.parametrize("supports_query", (True, False))
+def test_list_events(sentry_server, supports_query):
+    sentry_server.supports_query = supports_query
+    events = list_events(sentry_server, "1")
+    assert sentry_server.filtered is supports_query
+    # All events of the run are collected in order with their full payloads
+    assert [event["id"] for event in events] == [str(idx) for idx in range(1, 3000, 3)]
+    assert all(event["entries"] for event in events)
+    pages = 10 if supports_query else 30
+    assert sentry_server.requests == pages + 1000
+
+
+def test_rate_limit(sentry_server, mocker):
+    sleep = mocker.patch("wafp.targets.sentry.sleep")
+    sentry_server.rate_limited = 3
+    events = list_events(sentry_server, "2")
+    assert len(events) == 1000
+    # Rate-limited requests are retried after the delay given by Sentry
+    assert sleep.call_count == 3
+    assert sleep.call_args[0][0] == 0
+
+
+def test_rate_limit_exhausted(sentry_server, mocker):
+    mocker.patch("wafp.targets.sentry.sleep")
+    sentry_server.rate_limited = sentry.MAX_RETRIES + 1
+    with pytest.raises(sentry.requests.HTTPError):
+        list_events(sentry_server, "2")
+
+
+def test_no_events(sentry_server):
+    assert list_events(sentry_server, "unknown") == []
+
+
+def test_timeout(sentry_server, mocker):
+    mocker.patch("wafp.targets.sentry.REQUEST_TIMEOUT", 0.05)
+    sentry_server.delay = 0.2
+    with pytest.raises(sentry.requests.Timeout):
+        list_events(sentry_server, "1")
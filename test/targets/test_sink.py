@@ -0,0 +1,146 @@
+import gzip
+import http.client
+import json
+
+import pytest
+import requests
+import yaml
+
+from wafp.targets.sink import EventSink, normalize, parse_envelope
+
+EVENT = {
+    "event_id": "a" * 32,
+    "timestamp": "2022-01-01T00:00:00Z",
+    "platform": "python",
+    "transaction": "/api/items/{item_id}",
+    "tags": {"wafp.run-id": "1", "wafp.fuzzer-id": "example"},
+    "request": {"method": "GET", "url": "http://127.0.0.1/api/items/1"},
+    "exception": {
+        "values": [
+            {
+                "type": "ZeroDivisionError",
+                "value": "division by zero",
+                "stacktrace": {"frames": [{"filename": "app.py", "function": "get_item", "lineno": 42}]},
+            }
+        ]
+    },
+}
+
+
+@pytest.fixture
+def sink(tmp_path):
+    instance = EventSink(tmp_path / "target", host="127.0.0.1")
+    instance.start()
+    yield instance
+    instance.stop()
+
+
+def send(sink, endpoint, data, headers=None, key=None):
+    return requests.post(
+        f"http://127.0.0.1:{sink.port}/api/1/{endpoint}/",
+        data=data,
+        headers={"X-Sentry-Auth": f"Sentry sentry_version=7, sentry_key={key or sink.key}", **(headers or {})},
+    )
+
+
+def make_envelope(*items):
+    lines = [json.dumps({"event_id": EVENT["event_id"]}).encode()]
+    for header, payload in items:
+        lines.extend([json.dumps(header).encode(), payload])
+    return b"\n".join(lines)
+
+
+def test_parse_envelope():
+    event = json.dumps(EVENT).encode()
+    session = json.dumps({"sid": "1", "status": "ok"}).encode()
+    envelope = make_envelope(
+        ({"type": "session"}, session),
+        ({"type": "event", "length": len(event)}, event),
+        ({"type": "event"}, event),
+    )
+    assert parse_envelope(envelope) == [EVENT, EVENT]
+
+
+def test_normalize():
+    event = normalize(EVENT)
+    assert event["eventID"] == "a" * 32
+    assert event["title"] == "ZeroDivisionError: division by zero"
+    assert event["culprit"] == "/api/items/{item_id}"
+    assert {"key": "wafp.run-id", "value": "1"} in event["tags"]
+    assert event["metadata"] == {"type": "ZeroDivisionError", "value": "division by zero"}
+    exception, request = event["entries"]
+    assert exception["data"]["values"][0]["stacktrace"]["frames"][0]["lineNo"] == 42
+    assert request == {"type": "request", "data": EVENT["request"]}
+    # The same error is grouped together regardless of the event
+    assert normalize({**EVENT, "event_id": "b" * 32})["groupID"] == event["groupID"]
+    assert normalize({"event_id": "c" * 32, "message": "Oops"})["groupID"] != event["groupID"]
+
+
+def test_envelope(sink):
+    payload = json.dumps(EVENT).encode()
+    response = send(sink, "envelope", make_envelope(({"type": "event", "length": len(payload)}, payload)))
+    assert response.status_code == 200
+    # Stored as soon as it arrives
+    assert sink.count == 1
+    stored = json.loads((sink.output_dir / f"sentry_event_{'a' * 32}.json").read_text())
+    assert stored["title"] == "ZeroDivisionError: division by zero"
+
+
+def test_store_compressed(sink):
+    response = send(sink, "store", gzip.compress(json.dumps(EVENT).encode()), headers={"Content-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.json() == {"id": "a" * 32}
+    assert sink.count == 1
+
+
+def test_invalid_key(sink):
+    assert send(sink, "store", json.dumps(EVENT), key="unknown").status_code == 401
+    assert sink.count == 0
+    assert not sink.output_dir.exists()
+
+
+@pytest.mark.parametrize("content_length", (None, "invalid", "-1"))
+def test_invalid_content_length(sink, content_length):
+    connection = http.client.HTTPConnection("127.0.0.1", sink.port)
+    connection.putrequest("POST", "/api/1/store/")
+    connection.putheader("X-Sentry-Auth", f"Sentry sentry_version=7, sentry_key={sink.key}")
+    if content_length is not None:
+        connection.putheader("Content-Length", content_length)
+    connection.endheaders()
+    try:
+        assert connection.getresponse().status == 400
+    finally:
+        connection.close()
+    assert sink.count == 0
+
+
+@pytest.mark.parametrize(
+    "endpoint, data",
+    (
+        ("store", b"[]"),
+        ("store", b'"event"'),
+        ("envelope", make_envelope(({"type": "event"}, b"[]"))),
+        ("envelope", make_envelope(({"type": "event"}, b"null"))),
+        ("envelope", b"{}\n[1]\n{}"),
+        ("envelope", make_envelope(({"type": "event", "length": "2"}, b"{}"))),
+    ),
+)
+def test_invalid_payload(sink, endpoint, data):
+    # Payloads that are valid JSON, but not event objects
+    assert send(sink, endpoint, data).status_code == 400
+    assert sink.count == 0
+
+
+def test_target_integration(target_package, tmp_path):
+    target = target_package.Default(sentry_sink_dir=tmp_path / "target")
+    target.start_sentry_sink()
+    try:
+        # The target reports to the sink
+        dsn = target.get_environment_variables()["SENTRY_DSN"]
+        assert dsn == f"http://{target._sentry_sink.key}@host.docker.internal:{target._sentry_sink.port}/1"
+        # And the host is reachable from all services
+        override = yaml.safe_load(open(target.get_compose_overrides()[-1]))
+        assert override["services"]["web"]["extra_hosts"] == ["host.docker.internal:host-gateway"]
+        assert target.get_snapshot() is None
+    finally:
+        target._sentry_sink.stop()
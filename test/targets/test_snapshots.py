@@ -0,0 +1,63 @@
+import subprocess
+
+import pytest
+
+from wafp.docker import docker
+
+
+@pytest.fixture
+def snapshot_target(target_package):
+    instance = target_package.WithSnapshots()
+    yield instance
+    instance.stop()
+    instance.cleanup()
+    snapshot = instance.get_snapshot()
+    subprocess.run(["docker", "rmi", "-f", snapshot.get_image("web")], check=False)
+
+
+def test_get_snapshot(target):
+    # Snapshots are not used unless the target supports them
+    assert target.get_snapshot() is None
+
+
+def test_snapshot_image(snapshot_target):
+    snapshot = snapshot_target.get_snapshot()
+    assert snapshot.get_image("web") == f"wafp-snapshot/example_target/web:WithSnapshots-{snapshot.key}"
+
+
+def test_restore(snapshot_target):
+    snapshot = snapshot_target.get_snapshot()
+    assert snapshot.get_startup_duration() is None
+    # When the target is started for the first time
+    snapshot_target.start()
+    snapshot_target.stop()
+    snapshot_target.cleanup()
+    # Then the snapshot is taken
+    snapshot = snapshot_target.get_snapshot()
+    assert snapshot.get_startup_duration() > 0
+    # And the next start restores the target from it
+    context = snapshot_target.start()
+    assert context.base_url == snapshot_target.get_base_url()
+    assert snapshot.get_image("web").encode() in subprocess.check_output(["docker", "ps", "--format", "{{.Image}}"])
+
+
+def test_restore_after_start(snapshot_target, mocker):
+    # When the target changes its state in `after_start`, e.g. registers a user
+    def after_start(stdout, headers):
+        container = snapshot_target.compose.containers()["web"]
+        docker(["exec", container, "sh", "-c", "echo registered >> /tmp/users"])
+        headers["Authorization"] = "Bearer token"
+
+    mocker.patch.object(snapshot_target, "after_start", after_start)
+    snapshot_target.start()
+    snapshot_target.stop()
+    snapshot_target.cleanup()
+    # And it is restored from the snapshot
+    context = snapshot_target.start()
+    snapshot = snapshot_target.get_snapshot()
+    assert snapshot.get_image("web").encode() in subprocess.check_output(["docker", "ps", "--format", "{{.Image}}"])
+    # Then the snapshot does not contain changes made by `after_start`, and they are applied exactly once
+    container = snapshot_target.compose.containers()["web"]
+    assert subprocess.check_output(["docker", "exec", container, "cat", "/tmp/users"]) == b"registered\n"
+    # And headers are set on restore as well
+    assert context.headers == {"Authorization": "Bearer token"}
@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+from wafp.archive import RunArchive, get_archive_path, is_finished, iter_runs, main, pack
+
+
+@pytest.fixture
+def run_dir(tmp_path):
+    directory = tmp_path / "runs" / "schemathesis:Default-httpbin-1"
+    (directory / "fuzzer").mkdir(parents=True)
+    (directory / "fuzzer" / "stdout.txt").write_bytes(b"output")
+    (directory / "metadata.json").write_text(json.dumps({"fuzzer": "schemathesis:Default", "target": "httpbin"}))
+    return directory
+
+
+def test_pack(run_dir):
+    path = pack(run_dir)
+    # The directory is replaced with an archive
+    assert path == get_archive_path(run_dir)
+    assert not run_dir.exists()
+    assert is_finished(run_dir)
+    with RunArchive(path) as archive:
+        assert archive.name == "schemathesis:Default-httpbin-1"
+        assert archive.metadata["target"] == "httpbin"
+        # Metadata is the last member
+        assert archive.names() == ["fuzzer/stdout.txt", "metadata.json"]
+        with archive.open("fuzzer/stdout.txt") as fd:
+            assert fd.read() == b"output"
+
+
+def test_not_finished(run_dir):
+    (run_dir / "metadata.json").unlink()
+    assert not is_finished(run_dir)
+
+
+def test_iter_runs(run_dir, tmp_path):
+    pack(run_dir)
+    assert [archive.name for archive in iter_runs(tmp_path / "runs")] == ["schemathesis:Default-httpbin-1"]
+
+
+def test_extract(run_dir, tmp_path):
+    pack(run_dir)
+    main(["extract", str(tmp_path / "runs"), str(tmp_path / "extracted")])
+    assert (tmp_path / "extracted" / run_dir.name / "fuzzer" / "stdout.txt").read_bytes() == b"output"
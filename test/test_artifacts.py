@@ -0,0 +1,17 @@
+from wafp.artifacts import Artifact
+
+
+def test_stdout_bytes(tmp_path):
+    Artifact.stdout(b"output").save_to(tmp_path)
+    assert (tmp_path / "stdout.txt").read_bytes() == b"output"
+
+
+def test_stdout_file(tmp_path):
+    # When the output is stored in a file
+    source = tmp_path / "source.txt"
+    source.write_bytes(b"output" * 1024)
+    output_dir = tmp_path / "output"
+    output_dir.mkdir()
+    Artifact.stdout(source).save_to(output_dir)
+    # Then it is copied as is
+    assert (output_dir / "stdout.txt").read_bytes() == b"output" * 1024
@@ -0,0 +1,126 @@
+import pytest
+
+from wafp import build
+from wafp.build import (
+    get_compose_version,
+    get_context_hash,
+    get_images,
+    get_overrides_path,
+    get_service_images,
+    get_services,
+    interpolate,
+)
+
+
+@pytest.fixture
+def context(tmp_path):
+    (tmp_path / "docker-compose.yml").write_text("version: '3.7'\nservices: {}\n")
+    (tmp_path / "Dockerfile").write_text("FROM python:3.9")
+    return tmp_path
+
+
+def test_context_hash_changes(context):
+    before = get_context_hash(context, "docker-compose.yml")
+    (context / "app.py").write_text("print(1)")
+    assert get_context_hash(context, "docker-compose.yml") != before
+
+
+def test_context_hash_ignores_bytecode(context):
+    before = get_context_hash(context, "docker-compose.yml")
+    (context / "__pycache__").mkdir()
+    (context / "__pycache__" / "app.cpython-39.pyc").write_bytes(b"\x00")
+    assert get_context_hash(context, "docker-compose.yml") == before
+
+
+def test_context_hash_compose_file(context):
+    assert get_context_hash(context, "docker-compose.yml") != get_context_hash(context, "docker-compose-new.yml")
+
+
+@pytest.mark.parametrize(
+    "content, expected",
+    (
+        ("version: '3.7'\nservices: {}\n", "3.7"),
+        ('version: "3"\nservices: {}\n', "3"),
+        ("services: {}\n", "3"),
+    ),
+)
+def test_compose_version(tmp_path, content, expected):
+    path = tmp_path / "docker-compose.yml"
+    path.write_text(content)
+    assert get_compose_version(path) == expected
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    (
+        ("${EXTRA}", "extra.txt"),
+        ("$EXTRA", "extra.txt"),
+        ("${MISSING}", ""),
+        ("${MISSING:-default.txt}", "default.txt"),
+        ("${EMPTY:-default.txt}", "default.txt"),
+        ("${EMPTY-default.txt}", ""),
+    ),
+)
+def test_interpolate(value, expected):
+    assert interpolate(value, {"EXTRA": "extra.txt", "EMPTY": ""}) == expected
+
+
+COMPOSE_FILE = """version: '3'
+services:
+  fuzzer:
+    build:
+      context: .
+      args:
+        - EXTRA_REQUIREMENTS=${EXTRA_REQUIREMENTS}
+  remote:
+    build:
+      context: https://github.com/example/api.git#abc
+  database:
+    image: postgres:13
+"""
+
+
+@pytest.fixture
+def component(tmp_path):
+    (tmp_path / "docker-compose.yml").write_text(COMPOSE_FILE)
+    (tmp_path / "Dockerfile").write_text("FROM python:3.9")
+    return tmp_path
+
+
+def test_images(component):
+    images = get_images("example", component, "docker-compose.yml", {"EXTRA_REQUIREMENTS": "a.txt"})
+    # Only services that are built from sources get content-addressed images
+    assert set(images) == {"fuzzer", "remote"}
+    assert images["fuzzer"].startswith("wafp-build/example-fuzzer:")
+    # Build arguments are a part of the image identity
+    other = get_images("example", component, "docker-compose.yml", {"EXTRA_REQUIREMENTS": "b.txt"})
+    assert other["fuzzer"] != images["fuzzer"]
+    assert other["remote"] == images["remote"]
+
+
+def test_service_images(component):
+    images = get_service_images("example", component, "docker-compose.yml", {})
+    # Services with `image` use it as is, and built services get content-addressed images
+    assert images["database"] == "postgres:13"
+    assert images["fuzzer"] == get_images("example", component, "docker-compose.yml", {})["fuzzer"]
+    assert set(images) == {"fuzzer", "remote", "database"}
+
+
+def test_services(component):
+    assert get_services(component, "docker-compose.yml") == ("fuzzer", "remote", "database")
+
+
+def test_images_sources(component):
+    before = get_images("example", component, "docker-compose.yml", {})
+    (component / "Dockerfile").write_text("FROM python:3.10")
+    build._get_images.cache_clear()
+    after = get_images("example", component, "docker-compose.yml", {})
+    assert before["fuzzer"] != after["fuzzer"]
+    assert before["remote"] == after["remote"]
+
+
+def test_overrides_path(tmp_path, component):
+    images = {"fuzzer": "wafp-build/example-fuzzer:abc"}
+    path = get_overrides_path(tmp_path / "cache", component, "docker-compose.yml", images)
+    assert path == get_overrides_path(tmp_path / "cache", component, "docker-compose.yml", images)
+    assert '"image": "wafp-build/example-fuzzer:abc"' in open(path).read()
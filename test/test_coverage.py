@@ -0,0 +1,141 @@
+import functools
+import json
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+import yaml
+
+from wafp import proxy
+from wafp.coverage import Coverage, Router, from_log, get_base_path, load_schema
+
+SCHEMA = {
+    "openapi": "3.0.2",
+    "servers": [{"url": "http://127.0.0.1/api"}],
+    "paths": {
+        "/users": {"get": {}, "post": {}},
+        "/users/{user_id}": {"get": {}, "delete": {}, "parameters": []},
+        "/users/me": {"get": {}},
+        "/users/{user_id}/avatar.{ext}": {"get": {}},
+        "/files/{name}.json": {"get": {}},
+    },
+}
+
+
+@pytest.fixture
+def router():
+    return Router.from_schema(SCHEMA)
+
+
+def operation(router, method, path):
+    index = router.match(method, path)
+    if index is None:
+        return None
+    found = router.operations[index]
+    return found.method, found.path
+
+
+@pytest.mark.parametrize(
+    "method, path, expected",
+    (
+        ("GET", "/api/users", ("GET", "/users")),
+        ("post", "/api/users/", ("POST", "/users")),
+        ("GET", "/api/users/42", ("GET", "/users/{user_id}")),
+        ("DELETE", "/api/users/me", ("DELETE", "/users/{user_id}")),
+        # Static segments take precedence over parameters
+        ("GET", "/api/users/me", ("GET", "/users/me")),
+        ("GET", "/api/users/42/avatar.png", ("GET", "/users/{user_id}/avatar.{ext}")),
+        ("GET", "/api/files/report.json", ("GET", "/files/{name}.json")),
+        ("GET", "/api/users/a%20b", ("GET", "/users/{user_id}")),
+        # Templates recorded by the proxy are matched too
+        ("GET", "/api/users/{id}", ("GET", "/users/{user_id}")),
+        ("PUT", "/api/users/42", None),
+        ("GET", "/users", None),
+        ("GET", "/api/unknown", None),
+        ("GET", "/api/files/report.xml", None),
+    ),
+)
+def test_match(router, method, path, expected):
+    assert operation(router, method, path) == expected
+
+
+def test_backtracking():
+    # `/a/b/c` is only reachable via the parameter, even though `/a/b` is a static prefix
+    router = Router.from_schema({"paths": {"/a/b": {"get": {}}, "/a/{x}/c": {"get": {}}}})
+    assert operation(router, "GET", "/a/b/c") == ("GET", "/a/{x}/c")
+
+
+def test_base_paths():
+    router = Router.from_schema(SCHEMA, ["/", "/v1/"])
+    for prefix in ("", "/api", "/v1"):
+        assert operation(router, "GET", f"{prefix}/users/1") == ("GET", "/users/{user_id}")
+
+
+@pytest.mark.parametrize(
+    "schema, expected",
+    (
+        ({"swagger": "2.0", "basePath": "/v2", "paths": {}}, "/v2"),
+        ({"openapi": "3.0.0", "servers": [{"url": "/api/v3"}], "paths": {}}, "/api/v3"),
+        ({"openapi": "3.0.0", "servers": [{"url": "{scheme}://example.com/{version}"}], "paths": {}}, "/x"),
+        ({"openapi": "3.0.0", "paths": {}}, ""),
+    ),
+)
+def test_get_base_path(schema, expected):
+    assert get_base_path(schema) == expected
+
+
+def test_coverage(router):
+    coverage = Coverage(router)
+    assert coverage.get_template("GET", "/api/users/42") == "/api/users/{user_id}"
+    assert coverage.get_template("GET", "/api/users/43") == "/api/users/{user_id}"
+    assert coverage.get_template("POST", "/api/users") == "/api/users"
+    # Falls back to the approximation
+    assert coverage.get_template("GET", "/api/unknown/42") == "/api/unknown/{id}"
+    summary = coverage.summary()
+    assert summary["operations"] == 7
+    assert summary["covered"] == 2
+    assert summary["unmatched"] == 1
+    # Operations 1 (POST /users) and 2 (GET /users/{user_id})
+    assert summary["bitmap"] == "06"
+    hits = {(item["method"], item["path"]): item["hits"] for item in coverage.report()["hits"]}
+    assert hits[("GET", "/users/{user_id}")] == 2
+    assert hits[("GET", "/users")] == 0
+
+
+def test_from_log(router, tmp_path):
+    log = proxy.RequestLog(tmp_path / "requests.bin")
+    log.open()
+    entries = [("GET", "/api/users/{id}")] * 3 + [("GET", "/api/users/me"), ("PATCH", "/api/users")]
+    for method, template in entries:
+        log.add(timestamp=0, method=method, template=template, status=200, request_bytes=1, response_bytes=1, latency=0)
+    log.close()
+    coverage = from_log(router, log.path)
+    assert list(coverage.hits) == [0, 0, 3, 0, 1, 0, 0]
+    assert coverage.unmatched == 1
+
+
+@pytest.fixture
+def schema_server(tmp_path):
+    directory = tmp_path / "static"
+    directory.mkdir()
+    (directory / "openapi.json").write_text(json.dumps(SCHEMA))
+    handler = functools.partial(SimpleHTTPRequestHandler, directory=str(directory))
+    handler.log_message = lambda *args, **kwargs: None
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_load_schema(tmp_path, schema_server):
+    path = tmp_path / "schema.yaml"
+    path.write_text(yaml.safe_dump(SCHEMA))
+    assert load_schema(str(path)) == SCHEMA
+    assert load_schema(f"{schema_server}/openapi.json") == SCHEMA
+    with pytest.raises(requests.HTTPError):
+        load_schema(f"{schema_server}/unknown.json")
+    path.write_text(json.dumps({"openapi": "3.0.0"}))
+    with pytest.raises(ValueError):
+        load_schema(str(path))
@@ -1,6 +1,7 @@
 import pytest
 from packaging import version
 
+from wafp import docker
 from wafp.constants import MINIMUM_DOCKER_COMPOSE_VERSION, MINIMUM_DOCKER_VERSION
 from wafp.docker import ensure_docker_version
 from wafp.errors import VersionError
@@ -15,7 +16,7 @@ def test_incompatible_docker_version(mocker):
         match=f"Docker {installed_version} is not supported. You need to have at least {MINIMUM_DOCKER_VERSION}",
     ):
         # Then an error should be risen
-        ensure_docker_version()
+        ensure_docker_version(cached=False)
 
 
 def test_incompatible_docker_compose_version(mocker):
@@ -28,4 +29,34 @@ def test_incompatible_docker_compose_version(mocker):
         f"You need to have at least {MINIMUM_DOCKER_COMPOSE_VERSION}",
     ):
         # Then an error should be risen
+        ensure_docker_version(cached=False)
+
+
+@pytest.fixture
+def version_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    monkeypatch.setattr(docker, "_verified", [])
+    return tmp_path / "wafp" / "docker-version.json"
+
+
+def test_cached_version_check(mocker, version_cache):
+    ensure_docker_version()
+    assert version_cache.exists()
+    # When the check was already done
+    docker._verified.clear()
+    get_version = mocker.patch("wafp.docker.get_compose_version")
+    ensure_docker_version()
+    # Then versions are not requested again
+    get_version.assert_not_called()
+
+
+def test_expired_version_check(mocker, version_cache):
+    ensure_docker_version()
+    docker._verified.clear()
+    # When the cached check is expired
+    mocker.patch("wafp.docker.VERSION_CACHE_TTL", 0)
+    get_version = mocker.patch("wafp.docker.get_compose_version", return_value=version.parse("1.25.0"))
+    # Then the check is repeated
+    with pytest.raises(VersionError):
         ensure_docker_version()
+    get_version.assert_called_once()
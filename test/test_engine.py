@@ -0,0 +1,112 @@
+import json
+import socketserver
+import struct
+import subprocess
+import threading
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+from wafp import engine
+from wafp.base import get_log_prefix
+from wafp.engine import NUMBER_LABEL, PROJECT_LABEL, SERVICE_LABEL, EngineClient, demultiplex
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    connections = set()
+
+    def address_string(self):
+        return "unix"
+
+    def log_message(self, *args, **kwargs):
+        pass
+
+    def send(self, status, body):
+        self.connections.add(id(self.connection))
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.startswith("/v1.41/containers/json"):
+            self.send(200, json.dumps([{"Id": "abc"}]).encode())
+        else:
+            self.send(404, json.dumps({"message": "No such container: xyz"}).encode())
+
+    def do_DELETE(self):
+        self.send(404, json.dumps({"message": "network wafp_default not found"}).encode())
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+@pytest.fixture
+def client(tmp_path):
+    path = str(tmp_path / "docker.sock")
+    server = Server(path, Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield EngineClient(socket_path=path)
+    server.shutdown()
+    server.server_close()
+
+
+def test_connection_reuse(client):
+    Handler.connections.clear()
+    for _ in range(5):
+        assert client.containers("wafp_example") == [{"Id": "abc"}]
+    # All requests are sent over the same connection
+    assert len(Handler.connections) == 1
+    assert client.requests == 5
+
+
+def test_error(client):
+    with pytest.raises(subprocess.CalledProcessError) as exc:
+        client.remove_network("wafp_default")
+    # The same message as `docker network rm` prints
+    assert exc.value.stdout == b"Error response from daemon: network wafp_default not found\n"
+
+
+def test_demultiplex():
+    frames = struct.pack(">BxxxL", 1, 6) + b"first\n" + struct.pack(">BxxxL", 2, 7) + b"second\n"
+    assert demultiplex(frames) == b"first\nsecond\n"
+
+
+def test_demultiplex_tty():
+    assert demultiplex(b"raw output\n") == b"raw output\n"
+
+
+@pytest.mark.parametrize("returncode", (1, None))
+def test_spawn_overhead_failure(monkeypatch, returncode):
+    # When `docker-compose` fails or is not installed
+    def run(*args, **kwargs):
+        if returncode is None:
+            raise FileNotFoundError("docker-compose")
+        return subprocess.CompletedProcess(args, returncode)
+
+    monkeypatch.setattr(subprocess, "run", run)
+    engine.get_spawn_overhead.cache_clear()
+    try:
+        # Then the overhead is unknown
+        assert engine.get_spawn_overhead() == 0.0
+    finally:
+        engine.get_spawn_overhead.cache_clear()
+
+
+@pytest.mark.parametrize(
+    "name, expected",
+    (
+        ("/wafp_example_web_1", b"web_1       | "),
+        # Containers with custom names keep them
+        ("/example-web", b"example-web | "),
+    ),
+)
+def test_log_prefix(name, expected):
+    container = {
+        "Names": [name],
+        "Labels": {PROJECT_LABEL: "wafp_example", SERVICE_LABEL: "web", NUMBER_LABEL: "1"},
+    }
+    # The same padding as `docker-compose logs` uses for a project with `web` & `database` services
+    assert get_log_prefix(container, len("database") + 3) == expected
@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+from wafp.__main__ import apply_limits
+from wafp.limits import Limits, format_cpuset, parse_cpuset
+
+COMPOSE_FILE = """version: '3'
+services:
+  web:
+    image: example:latest
+  database:
+    image: postgres:13
+"""
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    (("0", [0]), ("0-3", [0, 1, 2, 3]), ("0-2,5", [0, 1, 2, 5]), ("4,1-2,2", [1, 2, 4])),
+)
+def test_parse_cpuset(value, expected):
+    assert parse_cpuset(value) == expected
+
+
+@pytest.mark.parametrize("value", ("", "a", "3-1", "-1", "1,,2"))
+def test_parse_invalid_cpuset(value):
+    with pytest.raises(ValueError, match="Invalid CPU set"):
+        parse_cpuset(value)
+
+
+@pytest.mark.parametrize("cpus, expected", (([0], "0"), ([3, 0, 1, 2], "0-3"), ([0, 1, 2, 5, 7, 8], "0-2,5,7-8")))
+def test_format_cpuset(cpus, expected):
+    assert format_cpuset(cpus) == expected
+    assert parse_cpuset(expected) == sorted(cpus)
+
+
+def test_to_service():
+    assert Limits().to_service() == {}
+    assert Limits(cpuset="0-1", cpus=1.5, memory=1024).to_service() == {
+        "cpuset": "0-1",
+        "cpus": 1.5,
+        "mem_limit": 1024,
+        "memswap_limit": 1024,
+    }
+
+
+def test_split():
+    assert Limits(cpuset="0-1", cpus=1.5, memory=1024).split(3) == Limits(cpuset="0-1", cpus=0.5, memory=341)
+    assert Limits(cpuset="0").split(2) == Limits(cpuset="0")
+
+
+def test_apply_limits(target_package, fuzzer_package):
+    target = target_package.Default(port=0)
+    fuzzer = fuzzer_package.Default()
+    apply_limits(Limits(cpus=2.0, memory=2048), target, [fuzzer])
+    # The target & the fuzzer have a single container each, and together they stay within the budget
+    assert target.limits == fuzzer.limits == Limits(cpus=1.0, memory=1024)
+    apply_limits(None, target, [fuzzer])
+    assert target.limits == Limits(cpus=1.0, memory=1024)
+
+
+def test_to_args():
+    assert Limits(cpuset="2-3", memory=1024).to_args() == ["--cpuset=2-3", "--memory=1024"]
+
+
+def test_overrides_path(tmp_path):
+    (tmp_path / "docker-compose.yml").write_text(COMPOSE_FILE)
+    limits = Limits(cpuset="0", cpus=1.0)
+    path = limits.get_overrides_path(tmp_path / "cache", tmp_path, "docker-compose.yml")
+    assert path == limits.get_overrides_path(tmp_path / "cache", tmp_path, "docker-compose.yml")
+    # All services are limited
+    assert json.loads(open(path).read()) == {
+        "version": "3",
+        "services": {"web": {"cpuset": "0", "cpus": 1.0}, "database": {"cpuset": "0", "cpus": 1.0}},
+    }
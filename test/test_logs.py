@@ -0,0 +1,43 @@
+import sys
+import time
+
+from wafp.logs import LogFollower
+
+
+def printer(*lines, sleep=0.0):
+    script = f"import sys, time\nfor line in {lines!r}:\n    print(line, flush=True)\ntime.sleep({sleep})"
+    return [sys.executable, "-c", script]
+
+
+def test_follow():
+    follower = LogFollower(printer("first", "second"))
+    # Lines are yielded as they appear, and repeated output of a re-spawned process is skipped
+    assert list(follower.follow(deadline=time.time() + 1)) == [b"first", b"second"]
+
+
+def test_follow_streamed():
+    streamed = {b"first"}
+    follower = LogFollower(printer("first", "second", "third"))
+    assert list(follower.follow(deadline=time.time() + 1, streamed=streamed)) == [b"second", b"third"]
+    assert streamed == {b"first", b"second", b"third"}
+
+
+def test_follow_stops_process():
+    follower = LogFollower(printer("first", sleep=60))
+    for line in follower.follow(deadline=time.time() + 10):
+        assert line == b"first"
+        break
+    # The process is terminated as soon as the consumer does not need more lines
+    assert follower._process.poll() is not None
+
+
+def test_follow_deadline():
+    follower = LogFollower(printer(sleep=60))
+    start = time.perf_counter()
+    assert list(follower.follow(deadline=time.time() + 0.5)) == []
+    assert time.perf_counter() - start < 5
+
+
+def test_follow_bounded_buffer():
+    follower = LogFollower(printer(*map(str, range(100))), buffer_size=1)
+    assert len(list(follower.follow(deadline=time.time() + 2))) == 100
@@ -0,0 +1,176 @@
+import json
+
+import pytest
+
+from wafp import monitor
+from wafp.monitor import CgroupSource, ResourceMonitor, from_stats, get_project_label
+
+TARGET_ID = "a" * 64
+FUZZER_ID = "b" * 64
+NET_DEV = """Inter-|   Receive                                                |  Transmit
+ face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls carrier compressed
+    lo: {lo} 10 0 0 0 0 0 0 {lo} 10 0 0 0 0 0 0
+  eth0: {received} 10 0 0 0 0 0 0 {sent} 10 0 0 0 0 0 0
+"""
+
+
+def write_v2(root, container_id, *, cpu_usec, anon, rbytes, wbytes):
+    directory = root / "system.slice" / f"docker-{container_id}.scope"
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / "cpu.stat").write_text(f"usage_usec {cpu_usec}\nuser_usec 1\nsystem_usec 1\n")
+    (directory / "memory.stat").write_text(f"anon {anon}\nfile 4096\n")
+    (directory / "io.stat").write_text(f"8:0 rbytes={rbytes} wbytes={wbytes} rios=1 wios=1\n")
+
+
+def write_net(proc, pid, *, received, sent):
+    directory = proc / str(pid) / "net"
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / "dev").write_text(NET_DEV.format(lo=999, received=received, sent=sent))
+
+
+@pytest.fixture
+def cgroup_v2(tmp_path):
+    root = tmp_path / "cgroup"
+    root.mkdir()
+    (root / "cgroup.controllers").write_text("cpu io memory\n")
+    return root
+
+
+@pytest.fixture
+def proc(tmp_path):
+    return tmp_path / "proc"
+
+
+def test_cgroup_v2(cgroup_v2, proc):
+    write_v2(cgroup_v2, TARGET_ID, cpu_usec=1500, anon=2048, rbytes=10, wbytes=20)
+    write_net(proc, 42, received=100, sent=200)
+    source = CgroupSource.find(TARGET_ID, 42, cgroup_v2, proc)
+    assert source.read() == (1_500_000, 2048, 100, 200, 10, 20)
+    # Containers in the host network have no network counters of their own
+    assert CgroupSource.find(TARGET_ID, None, cgroup_v2, proc).read() == (1_500_000, 2048, None, None, 10, 20)
+    assert CgroupSource.find(FUZZER_ID, None, cgroup_v2, proc) is None
+
+
+def test_cgroup_v1(tmp_path, proc):
+    root = tmp_path / "cgroup"
+    for controller in ("cpu,cpuacct", "memory", "blkio"):
+        (root / controller / "docker" / TARGET_ID).mkdir(parents=True)
+    directory = root / "cpu,cpuacct" / "docker" / TARGET_ID
+    (directory / "cpuacct.usage").write_text("123456\n")
+    (root / "memory" / "docker" / TARGET_ID / "memory.stat").write_text("cache 1\nrss 512\ntotal_rss 1024\n")
+    (root / "blkio" / "docker" / TARGET_ID / "blkio.throttle.io_service_bytes").write_text(
+        "8:0 Read 30\n8:0 Write 40\n8:0 Sync 70\n8:0 Total 70\nTotal 70\n"
+    )
+    source = CgroupSource.find(TARGET_ID, None, root, proc)
+    assert source.read() == (123456, 1024, None, None, 30, 40)
+    # The container is removed
+    (directory / "cpuacct.usage").unlink()
+    assert source.read() is None
+
+
+def test_from_stats():
+    stats = {
+        "cpu_stats": {"cpu_usage": {"total_usage": 5000}},
+        "memory_stats": {"usage": 9999, "stats": {"anon": 4096}},
+        "networks": {"eth0": {"rx_bytes": 10, "tx_bytes": 20}, "eth1": {"rx_bytes": 1, "tx_bytes": 2}},
+        "blkio_stats": {"io_service_bytes_recursive": [{"op": "read", "value": 7}, {"op": "write", "value": 8}]},
+    }
+    assert from_stats(stats) == (5000, 4096, 11, 22, 7, 8)
+    # Host network & no block I/O
+    assert from_stats({"cpu_stats": {"cpu_usage": {"total_usage": 1}}, "memory_stats": {"usage": 5}}) == (
+        1,
+        5,
+        None,
+        None,
+        0,
+        0,
+    )
+    # Stopped container
+    assert from_stats({"cpu_stats": {"cpu_usage": {}}, "memory_stats": {}}) is None
+
+
+class Client:
+    def __init__(self):
+        self.containers_by_project = {}
+
+    def containers(self, project):
+        return self.containers_by_project.get(project, [])
+
+    def inspect(self, container_id):
+        if container_id == FUZZER_ID:
+            return {"HostConfig": {"NetworkMode": "host"}, "State": {"Pid": 43}}
+        return {"HostConfig": {"NetworkMode": "wafp_example_default"}, "State": {"Pid": 42}}
+
+
+def make_container(container_id, name, service):
+    return {
+        "Id": container_id,
+        "Names": [f"/{name}"],
+        "State": "running",
+        "Labels": {"com.docker.compose.service": service},
+    }
+
+
+def test_monitor(cgroup_v2, proc, tmp_path, monkeypatch):
+    monkeypatch.setattr(monitor, "DISCOVERY_INTERVAL", 0)
+    client = Client()
+    client.containers_by_project["wafp_example"] = [make_container(TARGET_ID, "wafp_example_web_1", "web")]
+    write_v2(cgroup_v2, TARGET_ID, cpu_usec=1_000_000, anon=100, rbytes=0, wbytes=0)
+    write_net(proc, 42, received=1000, sent=1000)
+    instance = ResourceMonitor(
+        {"wafp_Example": "target", "wafp_fuzzer": "fuzzer"},
+        client=client,
+        cgroup_root=cgroup_v2,
+        proc_root=proc,
+    )
+    instance.sample()
+    # The fuzzer starts later
+    client.containers_by_project["wafp_fuzzer"] = [make_container(FUZZER_ID, "wafp_fuzzer_run_1", "fuzzer")]
+    write_v2(cgroup_v2, FUZZER_ID, cpu_usec=0, anon=50, rbytes=0, wbytes=0)
+    write_v2(cgroup_v2, TARGET_ID, cpu_usec=3_500_000, anon=300, rbytes=10, wbytes=4096)
+    write_net(proc, 42, received=1500, sent=3000)
+    instance.sample()
+    write_v2(cgroup_v2, FUZZER_ID, cpu_usec=2_000_000, anon=80, rbytes=0, wbytes=0)
+    write_v2(cgroup_v2, TARGET_ID, cpu_usec=4_000_000, anon=200, rbytes=10, wbytes=4096)
+    instance.sample()
+    assert instance.summary() == {
+        "target": {
+            "containers": 1,
+            "cpu_seconds": 3.0,
+            "peak_memory": 300,
+            "read": 10,
+            "written": 4096,
+            "received": 500,
+            "sent": 2000,
+        },
+        # No network counters for the host network
+        "fuzzer": {"containers": 1, "cpu_seconds": 2.0, "peak_memory": 80, "read": 0, "written": 0},
+    }
+    path = tmp_path / "run" / "resources.json"
+    instance.store(path)
+    data = json.loads(path.read_text())
+    target, fuzzer = data["containers"]
+    assert target["name"] == "wafp_example_web_1"
+    assert target["service"] == "web"
+    assert len(target["t"]) == 3
+    assert target["cpu"] == [0, 2_500_000_000, 3_000_000_000]
+    assert target["memory"] == [100, 300, 200]
+    assert fuzzer["role"] == "fuzzer"
+    assert "received" not in fuzzer
+
+
+def test_background(cgroup_v2, proc):
+    client = Client()
+    client.containers_by_project["wafp_example"] = [make_container(TARGET_ID, "wafp_example_web_1", "web")]
+    write_v2(cgroup_v2, TARGET_ID, cpu_usec=1, anon=1, rbytes=0, wbytes=0)
+    write_net(proc, 42, received=0, sent=0)
+    instance = ResourceMonitor(
+        {"wafp_example": "target"}, interval=0.01, client=client, cgroup_root=cgroup_v2, proc_root=proc
+    )
+    instance.start()
+    instance.stop()
+    assert instance.summary()["target"]["containers"] == 1
+
+
+def test_project_label():
+    assert get_project_label("wafp_c1_2_Example.API") == "wafp_c1_2_exampleapi"
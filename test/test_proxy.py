@@ -0,0 +1,142 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from wafp.proxy import MeteringProxy, get_template, percentile, read_log
+from wafp.targets.network import get_registry, unused_port
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args, **kwargs):
+        pass
+
+    def do_GET(self):
+        if self.path.endswith("/chunked"):
+            self.send_response(200)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for chunk in (b"Hello, ", b"world"):
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.write(b"0\r\n\r\n")
+            return
+        if self.path.endswith("/empty"):
+            self.send_response(204)
+            self.end_headers()
+            return
+        status = 404 if self.path.endswith("/missing") else 200
+        payload = json.dumps({"path": self.path, "host": self.headers["Host"]}).encode()
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(201)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def upstream():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def proxy(upstream, tmp_path):
+    instance = MeteringProxy(f"{upstream}/api", tmp_path / "proxy" / "requests.bin", host="127.0.0.1")
+    instance.start()
+    yield instance
+    instance.stop()
+
+
+def test_forward(proxy, upstream):
+    assert proxy.base_url == f"http://127.0.0.1:{proxy.port}/api"
+    with requests.Session() as session:
+        response = session.get(f"{proxy.base_url}/users/42?page=1")
+        assert response.status_code == 200
+        # `Host` points to the target
+        assert response.json() == {"path": "/api/users/42?page=1", "host": upstream[len("http://") :]}
+        assert session.get(f"{proxy.base_url}/chunked").text == "Hello, world"
+        assert session.get(f"{proxy.base_url}/empty").status_code == 204
+        assert session.get(f"{proxy.base_url}/missing").status_code == 404
+        response = session.post(f"{proxy.base_url}/users", json={"name": "test"})
+        assert response.status_code == 201
+        assert response.json() == {"name": "test"}
+    proxy.stop()
+    summary = proxy.log.summary()
+    assert summary["requests"] == 5
+    assert summary["statuses"] == {"200": 2, "201": 1, "204": 1, "404": 1}
+    assert summary["throughput"] > 0
+    assert 0 < summary["latency"]["p50"] <= summary["latency"]["p99"] <= summary["latency"]["max"]
+    data = read_log(proxy.log_path)
+    columns = data["columns"]
+    assert list(columns["status"]) == [200, 200, 204, 404, 201]
+    assert [data["templates"][idx] for idx in columns["template"]] == [
+        "/api/users/{id}",
+        "/api/chunked",
+        "/api/empty",
+        "/api/missing",
+        "/api/users",
+    ]
+    assert [data["methods"][idx] for idx in columns["method"]] == ["GET"] * 4 + ["POST"]
+    assert sum(columns["response_bytes"]) == summary["response_bytes"]
+
+
+def test_unavailable_target(tmp_path):
+    proxy = MeteringProxy(f"http://127.0.0.1:{unused_port()}", tmp_path / "requests.bin", host="127.0.0.1")
+    proxy.start()
+    try:
+        assert requests.get(f"{proxy.base_url}/").status_code == 502
+    finally:
+        proxy.stop()
+    assert proxy.log.summary()["statuses"] == {"error": 1}
+
+
+def test_reserved_port(proxy):
+    # The proxy port is not given to containers of concurrent runs
+    assert get_registry().is_reserved(proxy.port)
+    proxy.stop()
+    assert not get_registry().is_reserved(proxy.port)
+
+
+def test_many_chunks(proxy, monkeypatch):
+    monkeypatch.setattr("wafp.proxy.CHUNK_SIZE", 3)
+    with requests.Session() as session:
+        for idx in range(10):
+            session.get(f"{proxy.base_url}/users/{idx}")
+    proxy.stop()
+    columns = read_log(proxy.log_path)["columns"]
+    assert len(columns["latency"]) == 10
+    assert set(columns["template"]) == {0}
+
+
+@pytest.mark.parametrize(
+    "path, expected",
+    (
+        ("/users/42", "/users/{id}"),
+        ("/users/3fa85f64-5717-4562-b3fc-2c963f66afa6/posts", "/users/{id}/posts"),
+        ("/users/me", "/users/me"),
+    ),
+)
+def test_get_template(path, expected):
+    assert get_template("GET", path) == expected
+
+
+def test_percentile():
+    values = [float(value) for value in range(1, 101)]
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([], 50) == 0
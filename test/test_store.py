@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+from wafp.store import ArtifactStore, list_artifacts, main, open_artifact
+
+
+def make_run(directory, stdout):
+    (directory / "fuzzer").mkdir(parents=True)
+    (directory / "fuzzer" / "stdout.txt").write_bytes(stdout)
+    (directory / "target" / "sentry_events").mkdir(parents=True)
+    (directory / "target" / "sentry_events" / "sentry_event_1.json").write_text('{"eventID": "1"}')
+    (directory / "metadata.json").write_text(json.dumps({"fuzzer": "a", "target": "b"}))
+    return directory
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ArtifactStore(tmp_path / ".blobs")
+
+
+def test_pack(tmp_path, store):
+    first = make_run(tmp_path / "first", b"first output")
+    second = make_run(tmp_path / "second", b"second output")
+    store.pack(first)
+    store.pack(second)
+    # Only metadata & manifest are left in run directories
+    assert sorted(path.name for path in first.iterdir()) == ["manifest.json", "metadata.json"]
+    # Identical Sentry events are stored once
+    assert len(list(store.root.rglob("*.gz"))) == 3
+    assert list_artifacts(first) == ["fuzzer/stdout.txt", "target/sentry_events/sentry_event_1.json"]
+    with open_artifact(second, "fuzzer/stdout.txt") as fd:
+        assert fd.read() == b"second output"
+
+
+def test_open_not_packed(tmp_path):
+    run = make_run(tmp_path / "run", b"output")
+    assert list_artifacts(run) == ["fuzzer/stdout.txt", "target/sentry_events/sentry_event_1.json"]
+    with open_artifact(run, "fuzzer/stdout.txt") as fd:
+        assert fd.read() == b"output"
+
+
+def test_open_missing(tmp_path, store):
+    run = make_run(tmp_path / "run", b"output")
+    store.pack(run)
+    with pytest.raises(FileNotFoundError):
+        open_artifact(run, "fuzzer/unknown.txt")
+
+
+def test_export(tmp_path, store):
+    run = make_run(tmp_path / "runs" / "run", b"output")
+    store.pack(run)
+    main(["export", str(tmp_path / "runs"), str(tmp_path / "exported")])
+    exported = tmp_path / "exported" / "run"
+    assert (exported / "fuzzer" / "stdout.txt").read_bytes() == b"output"
+    assert (exported / "metadata.json").exists()
@@ -0,0 +1,74 @@
+import json
+import threading
+
+import pytest
+
+from wafp.tracing import Tracer, traced, tracer
+
+
+def test_nested():
+    instance = Tracer()
+    with instance.span("outer", component="example") as outer:
+        with instance.span("inner") as inner:
+            pass
+        with instance.span("sibling") as sibling:
+            pass
+    assert [span.name for span in instance.spans] == ["inner", "sibling", "outer"]
+    assert outer.parent_id is None
+    assert inner.parent_id == sibling.parent_id == outer.id
+    assert outer.duration >= inner.duration + sibling.duration
+    assert outer.attributes == {"component": "example"}
+
+
+def test_error():
+    instance = Tracer()
+    with pytest.raises(ZeroDivisionError):
+        with instance.span("failing"):
+            1 / 0
+    assert instance.spans[0].attributes == {"error": "ZeroDivisionError"}
+
+
+def test_threads():
+    # Spans started in other threads are not children of the current one
+    instance = Tracer()
+    with instance.span("main"):
+
+        def run():
+            with instance.span("background"):
+                pass
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+    background, main = instance.spans
+    assert background.parent_id is None
+    assert background.thread_id != main.thread_id
+
+
+def test_flush(tmp_path):
+    instance = Tracer()
+    with instance.span("outer"):
+        with instance.span("inner", status=200):
+            pass
+    path = tmp_path / "run" / "trace.json"
+    instance.flush(path)
+    assert instance.spans == []
+    data = json.loads(path.read_text())
+    outer, inner = data["traceEvents"]
+    assert outer["name"] == "outer"
+    assert outer["ph"] == inner["ph"] == "X"
+    # Children are within their parents
+    assert outer["ts"] <= inner["ts"]
+    assert inner["ts"] + inner["dur"] <= outer["ts"] + outer["dur"] + 1
+    assert inner["args"] == {"status": 200, "span_id": inner["args"]["span_id"], "parent_id": outer["args"]["span_id"]}
+
+
+def test_traced():
+    @traced("example")
+    def example(value):
+        return value * 2
+
+    tracer.clear()
+    assert example(21) == 42
+    assert [span.name for span in tracer.spans] == ["example"]
+    tracer.clear()
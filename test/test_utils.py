@@ -0,0 +1,41 @@
+import signal
+import subprocess
+import sys
+
+import pytest
+
+from wafp.utils import parse_size
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    (("512", 512), ("1K", 1024), ("2G", 2 * 1024**3), ("1.5GiB", 1536 * 1024**2), ("4mb", 4194304)),
+)
+def test_parse_size(value, expected):
+    assert parse_size(value) == expected
+
+
+def test_parse_invalid_size():
+    with pytest.raises(ValueError, match="Invalid size: lots"):
+        parse_size("lots")
+
+
+def test_exit_on_sigterm(tmp_path):
+    # When a worker is terminated
+    marker = tmp_path / "cleaned"
+    code = f"""
+import pathlib, sys, time
+from wafp.utils import exit_on_sigterm
+exit_on_sigterm()
+try:
+    print("started", flush=True)
+    time.sleep(60)
+finally:
+    pathlib.Path({str(marker)!r}).touch()
+"""
+    process = subprocess.Popen([sys.executable, "-c", code], stdout=subprocess.PIPE)
+    assert process.stdout.readline() == b"started\n"
+    process.terminate()
+    # Then its cleanup code runs
+    assert process.wait(timeout=10) == 128 + signal.SIGTERM
+    assert marker.exists()